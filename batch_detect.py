@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Headless: only the OpenCV/Tesseract stack, never PyQt6, so this starts fast on servers without a display
+from key_detector import KeyDetector, OCR_MODES
+from ocr_cache import OCRCache
+from layout_io import write_keys_ndjson
+from batch_paths import collect_files, output_paths_for
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+_worker_detector = None # One KeyDetector per worker process, built by init_worker
+
+
+def build_worker_detector(detector_settings, ocr_cache_path):
+    """
+    Builds a worker process's KeyDetector from the pool's settings dict (ocr_mode, pyramid_level,
+    tile_size) and its own connection to the shared OCR cache. Also used by detection_server.
+    """
+    ocr_cache = OCRCache(ocr_cache_path) if ocr_cache_path else None
+    detector = KeyDetector(ocr_mode=detector_settings["ocr_mode"], ocr_cache=ocr_cache)
+    detector.detection_pyramid_level = detector_settings["pyramid_level"]
+    detector.detection_tile_size = detector_settings.get("tile_size", 0)
+    return detector
+
+
+def init_worker(detector_settings, ocr_cache_path):
+    global _worker_detector
+    _worker_detector = build_worker_detector(detector_settings, ocr_cache_path)
+
+
+def detect_image(image_path, output_path, output_format="json"):
+    """
+    Runs detect + refine on one image and writes its layout, either as a JSON array or as
+    NDJSON streamed key by key while OCR runs (so the worker never holds the whole layout).
+
+    Returns:
+        dict: Summary entry with key counts and per-stage timings in seconds.
+    """
+    detector = _worker_detector
+    result = {"image": image_path, "output": None, "bboxes": 0, "keys": 0, "error": None}
+    start = time.perf_counter()
+
+    # Read and hash only; the image is decoded on the first detection-cache miss, if any
+    image = detector.open_image(image_path)
+    loaded = time.perf_counter()
+    bboxes = detector.detect_keys_in_image(image) if image is not None else []
+    detected = time.perf_counter()
+    if image is None or image.decode_failed:
+        result["error"] = "could not load image"
+        result["timing"] = {"load": loaded - start, "detect": detected - loaded, "total": detected - start}
+        return result
+
+    if output_format == "ndjson":
+        with open(output_path, "w") as f:
+            key_count = write_keys_ndjson(detector.iter_identified_keys(image, bboxes), f)
+        written = time.perf_counter()
+        timing = {"refine_and_write": written - detected}
+    else:
+        keys = detector.refine_and_identify_keys(image, bboxes) if bboxes else []
+        refined = time.perf_counter()
+        # Same schema as File > Export Key Layout (JSON), indented for reading
+        with open(output_path, "w") as f:
+            json.dump(keys, f, indent=4)
+        written = time.perf_counter()
+        key_count = len(keys)
+        timing = {"refine": refined - detected, "write": written - refined}
+
+    result.update(output=output_path, bboxes=len(bboxes), keys=key_count)
+    result["timing"] = dict({"load": loaded - start, "detect": detected - loaded}, **timing, total=written - start)
+    return result
+
+
+def run_batch(image_paths, output_dir, workers=None, ocr_mode="serial", pyramid_level=0, ocr_cache_path=None,
+              output_format="json", tile_size=0):
+    """
+    Detects keys in every image using a process pool (one image per task).
+
+    Returns:
+        dict: Batch summary with per-image results (in input order) and overall timing.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = output_paths_for(image_paths, output_dir, "." + output_format)
+    settings = {"ocr_mode": ocr_mode, "pyramid_level": pyramid_level, "tile_size": tile_size,
+                "output_format": output_format}
+
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(settings, ocr_cache_path)) as executor:
+        futures = {executor.submit(detect_image, path, outputs[path], output_format): path for path in image_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e: # Keep going; one bad image shouldn't sink the batch
+                results[path] = {"image": path, "output": None, "bboxes": 0, "keys": 0, "error": repr(e)}
+            entry = results[path]
+            status = entry["error"] or f"{entry['keys']} keys in {entry['timing']['total']:.2f}s"
+            print(f"[{len(results)}/{len(image_paths)}] {path}: {status}")
+    elapsed = time.perf_counter() - start
+
+    ordered = [results[path] for path in image_paths]
+    return {
+        "images": len(image_paths),
+        "failed": sum(1 for entry in ordered if entry["error"]),
+        "total_keys": sum(entry["keys"] for entry in ordered),
+        "wall_seconds": elapsed,
+        "images_per_second": len(image_paths) / elapsed if elapsed > 0 else None,
+        "settings": dict(settings, workers=workers or os.cpu_count()),
+        "results": ordered,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect keyboard layouts in a batch of images without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="Image directories, files or glob patterns (quote globs).")
+    parser.add_argument("-o", "--output-dir", default="detected_layouts", help="Where layout JSON files are written.")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--ocr-mode", default="serial", choices=OCR_MODES,
+                        help="OCR mode inside each worker (images are already processed in parallel).")
+    parser.add_argument("--pyramid-level", type=int, default=0, help="KeyDetector.detection_pyramid_level.")
+    parser.add_argument("--tile-size", type=int, default=0,
+                        help="KeyDetector.detection_tile_size (threshold in tiles to bound memory on huge images).")
+    parser.add_argument("--ocr-cache", default=None, help="Optional OCRCache SQLite file shared by all workers.")
+    parser.add_argument("--format", dest="output_format", default="json", choices=("json", "ndjson"),
+                        help="json: one array per image (export schema); ndjson: one key per line, streamed during OCR.")
+    parser.add_argument("--summary", default=None, help="Summary JSON path (default: <output-dir>/batch_summary.json).")
+    args = parser.parse_args(argv)
+
+    image_paths = collect_files(args.inputs, IMAGE_EXTENSIONS)
+    if not image_paths:
+        print("No images found.")
+        return 1
+
+    summary = run_batch(image_paths, args.output_dir, args.workers, args.ocr_mode, args.pyramid_level, args.ocr_cache,
+                        args.output_format, args.tile_size)
+    summary_path = args.summary or os.path.join(args.output_dir, "batch_summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=4)
+
+    print(f"Processed {summary['images']} images ({summary['failed']} failed), {summary['total_keys']} keys "
+          f"in {summary['wall_seconds']:.2f}s. Summary written to {summary_path}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,42 @@
+import glob
+import os
+
+# Input expansion and output naming shared by the batch CLIs (batch_detect, overlay_renderer).
+# Standard library only, so importing it never pulls in OpenCV or PyQt6.
+
+
+def collect_files(inputs, extensions):
+    """
+    Expands directories and glob patterns into a sorted, de-duplicated list of files whose names end
+    with one of the extensions (case-insensitive).
+
+    Args:
+        inputs (list): Directories, file paths or glob patterns (** recurses).
+        extensions (tuple): Lower-case extensions including the dot, e.g. (".png", ".jpg").
+
+    Returns:
+        list: Matching file paths.
+    """
+    extensions = tuple(extensions)
+    paths = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            candidates = [os.path.join(entry, name) for name in os.listdir(entry)]
+        else:
+            candidates = glob.glob(entry, recursive=True)
+        paths.extend(p for p in candidates if os.path.isfile(p) and p.lower().endswith(extensions))
+    return sorted(set(paths))
+
+
+def output_paths_for(paths, output_dir, extension):
+    # <stem><extension> per input; inputs sharing a stem in different folders get a numeric suffix
+    outputs, used = {}, set()
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name, counter = stem, 1
+        while name in used:
+            counter += 1
+            name = f"{stem}_{counter}"
+        used.add(name)
+        outputs[path] = os.path.join(output_dir, name + extension)
+    return outputs
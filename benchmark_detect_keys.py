@@ -0,0 +1,84 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from key_detector import KeyDetector, contour_bounding_rects
+
+
+def make_noisy_keyboard_image(width, height, seed=0):
+    """
+    Draws a grid of key-sized rectangles plus speckle noise, which produces tens of thousands
+    of tiny contours after adaptive thresholding (like a noisy high-resolution photo).
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 200, dtype=np.uint8)
+    key_size = max(min(width, height) // 12, 60)
+    for y in range(key_size // 4, height - key_size, key_size + key_size // 8):
+        for x in range(key_size // 4, width - key_size, key_size + key_size // 8):
+            cv2.rectangle(image, (x, y), (x + key_size, y + key_size), (40, 40, 40), 3)
+    noise = rng.random((height, width)) < 0.02
+    image[noise] = rng.integers(0, 255, (int(noise.sum()), 3), dtype=np.uint8)
+    return image
+
+
+def legacy_filter(detector, contours):
+    # The per-contour loop detect_keys used before the vectorized filter
+    bboxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w == 0 or h == 0:
+            continue
+        area = w * h
+        aspect_ratio = w / h
+        if (area >= detector.contour_min_area and
+            area <= detector.contour_max_area and
+            aspect_ratio >= detector.contour_min_aspect_ratio and
+            aspect_ratio <= detector.contour_max_aspect_ratio):
+            bboxes.append((x, y, w, h))
+    return bboxes
+
+
+def best_of(repeats, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark(sizes, repeats=3):
+    detector = KeyDetector()
+    for width, height in sizes:
+        image = make_noisy_keyboard_image(width, height)
+        gray = cv2.GaussianBlur(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), detector.gaussian_blur_ksize, 0)
+        thresholded = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
+                                            detector.adaptive_thresh_block_size, detector.adaptive_thresh_c)
+        contours = cv2.findContours(thresholded, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+        loop_time, loop_bboxes = best_of(repeats, legacy_filter, detector, contours)
+        vector_time, vector_bboxes = best_of(repeats, lambda c: detector.filter_key_rects(contour_bounding_rects(c)), contours)
+
+        detector.detection_method = "contours"
+        contours_time, contours_bboxes = best_of(repeats, detector.find_key_bboxes, image)
+        detector.detection_method = "components"
+        components_time, components_bboxes = best_of(repeats, detector.find_key_bboxes, image)
+        detector.detection_method = "contours"
+
+        print(f"{width}x{height}: {len(contours)} contours, {len(loop_bboxes)} keys")
+        print(f"  filter   loop {loop_time * 1000:8.2f} ms | vectorized {vector_time * 1000:8.2f} ms "
+              f"| x{loop_time / vector_time:.1f} | identical: {loop_bboxes == vector_bboxes}")
+        print(f"  detect   contours {contours_time * 1000:8.2f} ms | components {components_time * 1000:8.2f} ms "
+              f"| components found {len(components_bboxes)} keys "
+              f"(same set: {sorted(components_bboxes) == sorted(contours_bboxes)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark KeyDetector contour filtering on large noisy images.")
+    parser.add_argument("--sizes", nargs="+", default=["2000x700", "4000x1400", "6000x4000"],
+                        help="Image sizes as WIDTHxHEIGHT.")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    benchmark([tuple(int(v) for v in size.split("x")) for size in args.sizes], args.repeats)
@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import pytesseract
+
+from key_detector import KeyDetector, OCR_MODES
+from ocr_cache import OCRCache
+from detection_cache import DetectionCache
+from synthetic_keyboard import make_synthetic_keyboard, match_boxes
+
+# Synthetic scenes: resolution grows with key_size, key count with the grid dimensions
+SCENES = {
+    "qwerty_64": {"layout": "qwerty", "key_size": 64},
+    "qwerty_128": {"layout": "qwerty", "key_size": 128},
+    "grid_10x20_64": {"layout": "grid", "rows": 10, "columns": 20, "key_size": 64},
+    "grid_20x40_80": {"layout": "grid", "rows": 20, "columns": 40, "key_size": 80},
+}
+
+# Detection configurations (KeyDetector attributes)
+DETECTION_CONFIGS = {
+    "contours": {"detection_method": "contours"},
+    "components": {"detection_method": "components"},
+    "pyramid_1": {"detection_pyramid_level": 1},
+    "tiled_257": {"detection_tile_size": 257},
+}
+
+DEFAULT_RESULTS_DIR = "benchmark_results"
+SAMPLE_IMAGE = "Keyboard_white.jpg"
+CONSISTENCY_TILE_SIZES = (64, 100, 257, 500)
+
+
+def tesseract_available():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_runs(repeats, fn):
+    # Returns (best, median, last result); each run gets fresh state from fn itself
+    times, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), result
+
+
+def label_accuracy(keys, ground_truth):
+    # Fraction of ground-truth keys whose matched detected key has the same label (case-insensitive)
+    boxes = [(k["position"]["x"], k["position"]["y"], k["position"]["width"], k["position"]["height"]) for k in keys]
+    matches = match_boxes(boxes, ground_truth)["matches"]
+    correct = sum(1 for d, t in matches if str(keys[d]["label"]).upper() == ground_truth[t]["label"].upper())
+    return correct / len(ground_truth) if ground_truth else 0.0
+
+
+def make_detector(work_dir, cached, ocr_mode="serial", **settings):
+    detector = KeyDetector(
+        ocr_mode=ocr_mode,
+        ocr_cache=OCRCache(os.path.join(work_dir, "ocr_cache.sqlite")) if cached else None,
+        detection_cache=DetectionCache(os.path.join(work_dir, "detection_cache.sqlite")) if cached else None,
+    )
+    for name, value in settings.items():
+        setattr(detector, name, value)
+    return detector
+
+
+def close_detector(detector):
+    for cache in (detector.ocr_cache, detector.detection_cache):
+        if cache is not None:
+            cache.close()
+
+
+def make_concave_scene(width=1600, height=1200, seed=0):
+    """
+    Draws open "C" outlines with key-sized boxes in their mouths (inside the outline's bbox but not
+    enclosed, so "contours" reports them) and closed rings with boxes inside (enclosed, so it does
+    not), at positions that straddle tile borders.
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 235, dtype=np.uint8)
+    for _ in range(12):
+        w, h = int(rng.integers(180, 420)), int(rng.integers(160, 320))
+        x, y = int(rng.integers(10, width - w - 10)), int(rng.integers(10, height - h - 10))
+        if rng.random() < 0.5: # Ring
+            cv2.rectangle(image, (x, y), (x + w, y + h), (30, 30, 30), 5)
+        else: # "C", open to the right
+            cv2.polylines(image, [np.array([(x + w, y), (x, y), (x, y + h), (x + w, y + h)], dtype=np.int32)], False, (30, 30, 30), 5)
+        for _ in range(int(rng.integers(1, 4))):
+            kw, kh = int(rng.integers(55, 90)), int(rng.integers(55, 90))
+            kx, ky = int(rng.integers(x + 15, x + w - kw - 15)), int(rng.integers(y + 15, y + h - kh - 15))
+            cv2.rectangle(image, (kx, ky), (kx + kw, ky + kh), (60, 60, 60), 3)
+    return image
+
+
+def make_noise_scene(width=2000, height=1500, seed=0):
+    # Uniform gray noise: thresholding yields many irregular, concave regions cut by every tile seam
+    noise = np.random.default_rng(seed).integers(0, 256, (height, width), dtype=np.uint8)
+    return cv2.cvtColor(noise, cv2.COLOR_GRAY2BGR)
+
+
+def check_tiled_consistency(name, image, check_sub_roi=True):
+    """
+    Checks that tiled and ROI-restricted detection return exactly the find_key_bboxes boxes, for
+    both detection methods and several tile sizes (serial and threaded tiles).
+
+    An ROI covering the middle of the image is only compared on the boxes lying strictly inside
+    it, and only when check_sub_roi is set: an ROI that cuts an enclosing outline (such as a
+    keyboard frame) open legitimately reports the keys inside it.
+
+    Returns:
+        list: Human-readable mismatch descriptions (empty if consistent).
+    """
+    image_h, image_w = image.shape[:2]
+    roi = (image_w // 4, image_h // 4, image_w // 2, image_h // 2)
+
+    def strictly_inside(boxes):
+        return sorted(b for b in boxes if b[0] > roi[0] and b[1] > roi[1] and
+                      b[0] + b[2] < roi[0] + roi[2] and b[1] + b[3] < roi[1] + roi[3])
+
+    mismatches = []
+    for method in ("contours", "components"):
+        detector = KeyDetector()
+        detector.detection_method = method
+        expected = sorted(detector.find_key_bboxes(image))
+        checks = [("roi=image", sorted(detector.find_key_bboxes(image, (0, 0, image_w, image_h))))]
+        if check_sub_roi:
+            checks.append(("roi=center", strictly_inside(detector.find_key_bboxes(image, roi))))
+        for tile_size in CONSISTENCY_TILE_SIZES:
+            for workers in (1, 4):
+                detector.detection_tile_size, detector.detection_tile_workers = tile_size, workers
+                checks.append((f"tile={tile_size} workers={workers}", sorted(detector.find_key_bboxes(image))))
+        detector.detection_tile_size, detector.detection_tile_workers = 0, 1
+        for label, boxes in checks:
+            reference = strictly_inside(expected) if label == "roi=center" else expected
+            if boxes != reference:
+                mismatches.append(f"{name}/{method}/{label}: {len(boxes)} boxes, full frame has {len(reference)}")
+    return mismatches
+
+
+def run_consistency_checks(scene_names=None):
+    # Tiled/ROI detection against full-frame detection on every scene plus the bundled sample image
+    mismatches = []
+    for scene_name in scene_names or SCENES:
+        scene = SCENES[scene_name]
+        image, _ = make_synthetic_keyboard(scene["layout"], scene.get("rows"), scene.get("columns"), scene["key_size"])
+        mismatches.extend(check_tiled_consistency(scene_name, image))
+    # Concave and nested regions, where a stitched region's bbox is not its outline
+    mismatches.extend(check_tiled_consistency("concave", make_concave_scene(), check_sub_roi=False))
+    mismatches.extend(check_tiled_consistency("noise", make_noise_scene(), check_sub_roi=False))
+    if os.path.exists(SAMPLE_IMAGE):
+        sample, _ = KeyDetector().load_image(SAMPLE_IMAGE)
+        if sample is not None:
+            mismatches.extend(check_tiled_consistency(SAMPLE_IMAGE, sample, check_sub_roi=False))
+    return mismatches
+
+
+def benchmark_scene(scene_name, scene, work_dir, ocr_modes, repeats, run_refine):
+    """
+    Times detect_keys for every DETECTION_CONFIGS entry and refine_and_identify_keys for every
+    OCR mode, cold (empty caches, every repeat) and cached (caches warmed by a previous run).
+
+    Returns:
+        list: Result dicts keyed by scene/stage/config with timings and quality metrics.
+    """
+    image, ground_truth = make_synthetic_keyboard(scene["layout"], scene.get("rows"), scene.get("columns"),
+                                                  scene["key_size"])
+    image_path = os.path.join(work_dir, f"{scene_name}.png")
+    cv2.imwrite(image_path, image)
+    base = {"scene": scene_name, "width": image.shape[1], "height": image.shape[0], "keys": len(ground_truth)}
+    results = []
+
+    def cache_dir(name):
+        path = os.path.join(work_dir, f"{scene_name}_{name}")
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    for config_name, settings in DETECTION_CONFIGS.items():
+        detector = make_detector(work_dir, cached=False, **settings)
+        best, median, bboxes = time_runs(repeats, lambda: detector.detect_keys(image_path))
+        quality = match_boxes(bboxes, ground_truth)
+        quality.pop("matches")
+        results.append(dict(base, stage="detect", config=config_name, cache="cold",
+                            best_s=best, median_s=median, detected=len(bboxes), **quality))
+
+    path = cache_dir("detect")
+    warm = make_detector(path, cached=True)
+    warm.detect_keys(image_path)
+    best, median, bboxes = time_runs(repeats, lambda: warm.detect_keys(image_path))
+    close_detector(warm)
+    results.append(dict(base, stage="detect", config="contours", cache="warm", best_s=best, median_s=median,
+                        detected=len(bboxes)))
+
+    if not run_refine:
+        return results
+
+    bboxes = KeyDetector().detect_keys(image_path)
+    for ocr_mode in ocr_modes:
+        detector = make_detector(work_dir, cached=False, ocr_mode=ocr_mode)
+        best, median, keys = time_runs(repeats, lambda: detector.refine_and_identify_keys(image, list(bboxes)))
+        results.append(dict(base, stage="refine", config=ocr_mode, cache="cold", best_s=best, median_s=median,
+                            identified=len(keys), label_accuracy=label_accuracy(keys, ground_truth)))
+
+        path = cache_dir(f"refine_{ocr_mode}")
+        warm = make_detector(path, cached=True, ocr_mode=ocr_mode)
+        warm.refine_and_identify_keys(image, list(bboxes)) # OCR cache only, no image_hash: still runs preprocessing
+        best, median, keys = time_runs(repeats, lambda: warm.refine_and_identify_keys(image, list(bboxes)))
+        close_detector(warm)
+        results.append(dict(base, stage="refine", config=ocr_mode, cache="warm", best_s=best, median_s=median,
+                            identified=len(keys), label_accuracy=label_accuracy(keys, ground_truth)))
+    return results
+
+
+def run_suite(scene_names=None, ocr_modes=("serial", "thread"), repeats=3, run_refine=None):
+    """
+    Runs the benchmark over the selected SCENES. Refinement is skipped when Tesseract is not
+    installed (run_refine=None), since timings without it are meaningless.
+
+    Returns:
+        dict: {"meta": environment/version info, "results": [...]}, ready to store as JSON.
+    """
+    has_tesseract = tesseract_available()
+    if run_refine is None:
+        run_refine = has_tesseract
+    meta = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "tesseract": has_tesseract,
+        "repeats": repeats,
+        "ocr_modes": list(ocr_modes) if run_refine else [],
+    }
+    results = []
+    with tempfile.TemporaryDirectory(prefix="kbd_bench_") as work_dir:
+        for scene_name in scene_names or SCENES:
+            scene_results = benchmark_scene(scene_name, SCENES[scene_name], work_dir, ocr_modes, repeats, run_refine)
+            for entry in scene_results:
+                print(format_result(entry))
+            results.extend(scene_results)
+    return {"meta": meta, "results": results}
+
+
+def format_result(entry):
+    quality = ""
+    if "recall" in entry:
+        quality = f" | P {entry['precision']:.3f} R {entry['recall']:.3f}"
+    elif "label_accuracy" in entry:
+        quality = f" | labels {entry['label_accuracy']:.3f}"
+    return (f"{entry['scene']:<15} {entry['stage']:<7} {entry['config']:<11} {entry['cache']:<5} "
+            f"best {entry['best_s'] * 1000:9.2f} ms | median {entry['median_s'] * 1000:9.2f} ms{quality}")
+
+
+def result_key(entry):
+    return entry["scene"], entry["stage"], entry["config"], entry["cache"]
+
+
+def compare_results(current, baseline, time_tolerance=0.25, quality_tolerance=0.005):
+    """
+    Compares two run_suite() outputs entry by entry.
+
+    A regression is a median time more than time_tolerance (relative) slower than the baseline,
+    or precision/recall/label accuracy more than quality_tolerance lower. Entries missing from
+    either side are ignored.
+
+    Returns:
+        list: Human-readable regression descriptions (empty if none).
+    """
+    baseline_entries = {result_key(entry): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in current["results"]:
+        old = baseline_entries.get(result_key(entry))
+        if old is None:
+            continue
+        name = "/".join(result_key(entry))
+        if entry["median_s"] > old["median_s"] * (1 + time_tolerance):
+            regressions.append(f"{name}: median {old['median_s'] * 1000:.2f} ms -> {entry['median_s'] * 1000:.2f} ms")
+        for metric in ("precision", "recall", "label_accuracy"):
+            if metric in entry and metric in old and entry[metric] < old[metric] - quality_tolerance:
+                regressions.append(f"{name}: {metric} {old[metric]:.3f} -> {entry[metric]:.3f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark KeyDetector on synthetic keyboards with known layouts.")
+    parser.add_argument("--scenes", nargs="+", choices=sorted(SCENES), default=None, help="Default: all scenes.")
+    parser.add_argument("--ocr-modes", nargs="+", choices=OCR_MODES, default=["serial", "thread"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-refine", action="store_true", help="Only benchmark detection.")
+    parser.add_argument("--output", default=None,
+                        help=f"Results JSON (default: {DEFAULT_RESULTS_DIR}/<timestamp>-<revision>.json).")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to check for regressions.")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="Allowed relative slowdown.")
+    args = parser.parse_args(argv)
+
+    mismatches = run_consistency_checks(args.scenes)
+    print(f"Tiled/ROI detection consistency: {len(mismatches)} mismatch(es)")
+    for mismatch in mismatches:
+        print(f"  {mismatch}")
+
+    suite = run_suite(args.scenes, args.ocr_modes, args.repeats, False if args.no_refine else None)
+    suite["consistency_mismatches"] = mismatches
+    if not suite["meta"]["tesseract"] and not args.no_refine:
+        print("Tesseract not found; refine_and_identify_keys was not benchmarked.")
+
+    output = args.output
+    if output is None:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(DEFAULT_RESULTS_DIR, f"{stamp}-{suite['meta']['revision'] or 'unknown'}.json")
+    with open(output, "w") as f:
+        json.dump(suite, f, indent=4)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(suite, baseline, args.time_tolerance)
+        print(f"Compared against {args.baseline} (revision {baseline['meta'].get('revision')}): "
+              f"{len(regressions)} regression(s)")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1 if regressions or mismatches else 0
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import json
+import random
+import time
+
+from key_layout import KeyLayout
+from typing_replay import HeadlessKeyboard, ReplayEngine, text_to_events
+
+
+def make_text(key_layout, length, seed=0):
+    # Random text over every character the layout can type
+    characters = sorted(c for c in key_layout.character_index().characters() if len(c) == 1 and c not in "{}")
+    rng = random.Random(seed)
+    return "".join(rng.choice(characters) for _ in range(length))
+
+
+def replay_headless(events, key_layout, speed):
+    keyboard = HeadlessKeyboard(key_layout)
+    return ReplayEngine(events, keyboard.press_key, keyboard.release_key, speed).run()
+
+
+def replay_gui(events, speed):
+    """
+    Replays on a MainWindow (use QT_QPA_PLATFORM=offscreen on a headless machine). Each event
+    also processes pending Qt events, so the coalesced frame ticks and repaints that fall due
+    are included in the latencies, not just the press-state bookkeeping.
+    """
+    from PyQt6.QtWidgets import QApplication
+    from keyboard_simulator import MainWindow
+
+    app = QApplication.instance() or QApplication([])
+    window = MainWindow()
+    window.show()
+    app.processEvents()
+
+    def press(key_id):
+        window.press_key(key_id)
+        app.processEvents()
+
+    def release(key_id):
+        window.release_key(key_id)
+        app.processEvents()
+
+    summary = ReplayEngine(events, press, release, speed).run()
+    window.close()
+    return summary
+
+
+def linear_scan_lookup(layout, character):
+    # What text simulation had to do before CharacterIndex: scan every key's characters list
+    for key_data in layout:
+        if character in key_data.get("characters", ()):
+            return key_data["key_id"]
+    return None
+
+
+def benchmark_encoding(layout, key_layout, length):
+    """
+    Compares per-character linear scans, CharacterIndex.resolve() and the vectorized encode()
+    on random text, reporting characters per second (and MB/s of UTF-8 input for encode).
+    """
+    text = make_text(key_layout, length)
+    character_index = key_layout.character_index()
+    sample = text[:min(length, 100000)]
+
+    start = time.perf_counter()
+    [linear_scan_lookup(layout, c) for c in sample]
+    scan_rate = len(sample) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    [character_index.resolve(c) for c in sample]
+    resolve_rate = len(sample) / (time.perf_counter() - start)
+    character_index.encode("") # Build the lookup table outside the timing
+    start = time.perf_counter()
+    key_indices, _ = character_index.encode(text)
+    encode_time = time.perf_counter() - start
+
+    print(f"encoding {length} chars: linear scan {scan_rate:,.0f} chars/s | resolve {resolve_rate:,.0f} chars/s | "
+          f"encode {length / encode_time:,.0f} chars/s ({len(text.encode()) / encode_time / 1e6:.0f} MB/s), "
+          f"unmapped {int((key_indices < 0).sum())}")
+    return {"linear_scan_chars_per_second": scan_rate, "resolve_chars_per_second": resolve_rate,
+            "encode_chars_per_second": length / encode_time}
+
+
+def format_summary(name, summary):
+    return (f"{name:<22} {summary['events']:>7} events | {summary['events_per_second']:>10.0f} events/s | "
+            f"p50 {summary['p50_ms']:7.3f} ms | p90 {summary['p90_ms']:7.3f} ms | "
+            f"p99 {summary['p99_ms']:7.3f} ms | max {summary['max_ms']:7.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the simulator's typing replay throughput and latency.")
+    parser.add_argument("--layout", default=None, help="Layout JSON (default: MANUAL_LAYOUT).")
+    parser.add_argument("--length", type=int, default=20000, help="Characters of random text to type.")
+    parser.add_argument("--wpm", type=float, default=120.0, help="Typing speed for the real-time runs.")
+    parser.add_argument("--speeds", nargs="+", type=float, default=[0.0, 100.0],
+                        help="Replay speeds; 0 = as fast as possible (throughput ceiling).")
+    parser.add_argument("--gui", action="store_true", help="Also replay on a MainWindow.")
+    parser.add_argument("--encode-length", type=int, default=20000000,
+                        help="Characters for the bulk encoding benchmark (0 to skip).")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the results as JSON.")
+    args = parser.parse_args()
+
+    if args.layout:
+        with open(args.layout) as f:
+            layout = json.load(f)
+    else:
+        from manual_keyboard_layout import MANUAL_LAYOUT as layout
+    key_layout = KeyLayout.from_dicts(layout)
+    events, _ = text_to_events(make_text(key_layout, args.length), key_layout, wpm=args.wpm)
+
+    results = {}
+    if args.encode_length:
+        results["encoding"] = benchmark_encoding(layout, key_layout, args.encode_length)
+    for speed in args.speeds:
+        name = f"headless x{speed:g}" if speed else "headless max"
+        results[name] = replay_headless(events, key_layout, speed)
+        print(format_summary(name, results[name]))
+        if args.gui:
+            name = f"gui x{speed:g}" if speed else "gui max"
+            results[name] = replay_gui(events, speed)
+            print(format_summary(name, results[name]))
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,304 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from key_layout import KeyLayout
+
+# File layout (all little-endian):
+#   header          MAGIC, version, key count and the offset/length of every section below
+#   key table       KEY_RECORD_DTYPE x key_count (fixed width, 64-byte aligned)
+#   list offsets    uint32 x (list_count + 1) into the list pool
+#   list pool       uint32 string indices (characters lists and field-order lists)
+#   string offsets  uint64 x (string_count + 1) into the string blob
+#   string blob     UTF-8 bytes of all distinct strings
+# Everything is addressed by offset, so a reader only maps the file and wraps numpy views over it.
+MAGIC = b"KBLAYOUT"
+VERSION = 1
+NONE_INDEX = 0xFFFFFFFF
+BINARY_LAYOUT_EXTENSION = ".kbl"
+
+HEADER = struct.Struct("<8sHHIIIQQQQQQ")
+
+KEY_RECORD_DTYPE = np.dtype([
+    ("x", "<i4"), ("y", "<i4"), ("width", "<i4"), ("height", "<i4"),
+    ("font_rgba", "<u4"), ("background_rgba", "<u4"),
+    ("key_id", "<u4"), ("label", "<u4"), ("type", "<u4"), ("group", "<u4"),
+    ("font_color", "<u4"), ("background_color", "<u4"),
+    ("extras", "<u4"), # JSON-encoded dict of fields that don't fit the fixed columns, or NONE_INDEX
+    ("characters", "<u4"), ("field_order", "<u4"), # List indices
+])
+
+STRING_COLUMNS = ("key_ids", "labels", "types", "groups", "font_colors", "background_colors")
+STRING_FIELDS = ("key_id", "label", "type", "group", "font_color", "background_color")
+
+
+class _Interner:
+    def __init__(self):
+        self.index = {}
+        self.items = []
+
+    def add(self, value):
+        if value is None:
+            return NONE_INDEX
+        if value not in self.index:
+            self.index[value] = len(self.items)
+            self.items.append(value)
+        return self.index[value]
+
+
+def _align(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _indices_valid(indices, limit, allow_none=True):
+    # Returns a plain bool so no view into the mapping outlives the call (a raised exception's
+    # traceback would keep it alive and block mmap.close())
+    valid = indices < limit
+    if allow_none:
+        valid |= indices == NONE_INDEX
+    return bool(valid.all())
+
+
+def save_layout_binary(layout, path):
+    """
+    Writes a layout (KeyLayout or list of key dicts) in the binary .kbl format.
+
+    Fields whose values aren't strings (or lists of strings, for characters) are stored in the
+    per-key JSON extras, so any layout the JSON exporter accepts round-trips exactly.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    key_layout = layout if isinstance(layout, KeyLayout) else KeyLayout.from_dicts(layout)
+    count = len(key_layout)
+    strings, lists = _Interner(), _Interner()
+
+    records = np.zeros(count, dtype=KEY_RECORD_DTYPE)
+    if count:
+        records["x"], records["y"], records["width"], records["height"] = key_layout.geometry.T
+        records["font_rgba"] = key_layout.font_rgba
+        records["background_rgba"] = key_layout.background_rgba
+
+    for i in range(count):
+        extras = dict(key_layout.extras[i] or {})
+        for column, field in zip(STRING_COLUMNS, STRING_FIELDS):
+            value = getattr(key_layout, column)[i]
+            if value is not None and not isinstance(value, str) and field not in extras:
+                extras[field] = value # e.g. a numeric label
+                value = None
+            records[field][i] = strings.add(value)
+
+        characters = key_layout.characters[i]
+        if characters is not None and not all(isinstance(c, str) for c in characters) and "characters" not in extras:
+            extras["characters"] = list(characters)
+            characters = None
+        records["characters"][i] = NONE_INDEX if characters is None else lists.add(tuple(strings.add(c) for c in characters))
+        records["field_order"][i] = lists.add(tuple(strings.add(f) for f in key_layout.field_orders[i]))
+        records["extras"][i] = strings.add(json.dumps(extras)) if extras else NONE_INDEX
+
+    list_offsets = np.zeros(len(lists.items) + 1, dtype="<u4")
+    np.cumsum([len(items) for items in lists.items], out=list_offsets[1:])
+    list_pool = np.fromiter((s for items in lists.items for s in items), dtype="<u4", count=int(list_offsets[-1]))
+
+    encoded = [s.encode("utf-8") for s in strings.items]
+    string_offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in encoded], out=string_offsets[1:])
+    string_blob = b"".join(encoded)
+
+    sections = [records.tobytes(), list_offsets.tobytes(), list_pool.tobytes(), string_offsets.tobytes(), string_blob]
+    offsets, cursor = [], _align(HEADER.size)
+    for section in sections:
+        offsets.append(cursor)
+        cursor = _align(cursor + len(section))
+
+    header = HEADER.pack(MAGIC, VERSION, 0, count, len(lists.items), len(strings.items),
+                         offsets[0], offsets[1], offsets[2], offsets[3], offsets[4], len(string_blob))
+    with open(path, "wb") as f:
+        f.write(header)
+        for offset, section in zip(offsets, sections):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(section)
+    return os.path.getsize(path)
+
+
+class BinaryLayout:
+    def __init__(self, path):
+        """
+        Memory-maps a .kbl layout. Geometry and colors are numpy views straight into the mapping,
+        and strings are decoded only when accessed; opening only validates the header, section
+        bounds and index columns (vectorized), and raises ValueError on a corrupt file.
+
+        Use as a context manager (or call close()) to release the mapping; copy any arrays you
+        keep beyond that (to_key_layout() does).
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty file
+            self._file.close()
+            raise ValueError(f"{path} is not a binary key layout (empty file)")
+
+        try:
+            self._map_sections()
+        except BaseException: # Never leak the mapping or the file handle on a bad file
+            self.close()
+            raise
+
+    def _map_sections(self):
+        # Validates the header and every section's extent against the file size, then wraps views
+        path, size = self.path, len(self._map)
+        if size < HEADER.size:
+            raise ValueError(f"{path} is not a binary key layout (truncated header)")
+        (magic, version, _, self.key_count, list_count, string_count,
+         records_at, list_offsets_at, list_pool_at, string_offsets_at, blob_at, blob_size) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary key layout (bad magic)")
+        if version != VERSION:
+            raise ValueError(f"{path} uses unsupported binary layout version {version}")
+
+        def check_section(name, offset, length):
+            if offset < HEADER.size or offset + length > size:
+                raise ValueError(f"{path} is truncated or corrupt ({name} section out of bounds)")
+
+        check_section("key table", records_at, self.key_count * KEY_RECORD_DTYPE.itemsize)
+        check_section("list offsets", list_offsets_at, (list_count + 1) * 4)
+        check_section("string offsets", string_offsets_at, (string_count + 1) * 8)
+        check_section("string blob", blob_at, blob_size)
+
+        self.records = np.frombuffer(self._map, dtype=KEY_RECORD_DTYPE, count=self.key_count, offset=records_at)
+        # x, y, width, height are the first four record fields, so geometry is a strided (N, 4) view
+        self.geometry = np.ndarray((self.key_count, 4), dtype="<i4", buffer=self._map, offset=records_at,
+                                   strides=(KEY_RECORD_DTYPE.itemsize, 4))
+        self._list_offsets = np.frombuffer(self._map, dtype="<u4", count=list_count + 1, offset=list_offsets_at)
+        check_section("list pool", list_pool_at, int(self._list_offsets[-1]) * 4)
+        self._list_pool = np.frombuffer(self._map, dtype="<u4", count=int(self._list_offsets[-1]), offset=list_pool_at)
+        self._string_offsets = np.frombuffer(self._map, dtype="<u8", count=string_count + 1, offset=string_offsets_at)
+        if int(self._string_offsets[-1]) > blob_size:
+            raise ValueError(f"{path} is truncated or corrupt (string offsets past the string blob)")
+        if np.any(np.diff(self._list_offsets.astype(np.int64)) < 0) or np.any(np.diff(self._string_offsets) < 0):
+            raise ValueError(f"{path} is corrupt (decreasing list or string offsets)")
+
+        # Every index a record or list can hold is checked once here, so string()/to_key_layout() can't
+        # raise IndexError on a corrupted file
+        for field in STRING_FIELDS + ("extras",):
+            if not _indices_valid(self.records[field], string_count):
+                raise ValueError(f"{path} is corrupt ({field} string index out of range)")
+        for field in ("characters", "field_order"):
+            if not _indices_valid(self.records[field], list_count):
+                raise ValueError(f"{path} is corrupt ({field} list index out of range)")
+        if not _indices_valid(self._list_pool, string_count, allow_none=False):
+            raise ValueError(f"{path} is corrupt (list pool string index out of range)")
+        self._blob_at = blob_at
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.key_count
+
+    def string(self, index):
+        if index == NONE_INDEX:
+            return None
+        start, end = int(self._string_offsets[index]), int(self._string_offsets[index + 1])
+        return self._map[self._blob_at + start:self._blob_at + end].decode("utf-8")
+
+    def string_list(self, list_index):
+        if list_index == NONE_INDEX:
+            return None
+        start, end = int(self._list_offsets[list_index]), int(self._list_offsets[list_index + 1])
+        return tuple(self.string(int(s)) for s in self._list_pool[start:end])
+
+    def key_id(self, index):
+        return self.string(int(self.records["key_id"][index]))
+
+    def label(self, index):
+        return self.string(int(self.records["label"][index]))
+
+    def to_key_layout(self):
+        """
+        Copies the mapped data into a KeyLayout (no JSON parsing except per-key extras).
+        """
+        strings = [self.string(i) for i in range(len(self._string_offsets) - 1)]
+        strings_or_none = lambda column: [None if s == NONE_INDEX else strings[s] for s in self.records[column].tolist()]
+        lists = {}
+
+        def string_list(list_index):
+            if list_index == NONE_INDEX:
+                return None
+            if list_index not in lists:
+                start, end = int(self._list_offsets[list_index]), int(self._list_offsets[list_index + 1])
+                lists[list_index] = tuple(strings[s] for s in self._list_pool[start:end].tolist())
+            return lists[list_index]
+
+        key_layout = KeyLayout()
+        key_layout.geometry = np.array(self.geometry, dtype=np.int32)
+        key_layout.font_rgba = np.array(self.records["font_rgba"], dtype=np.uint32)
+        key_layout.background_rgba = np.array(self.records["background_rgba"], dtype=np.uint32)
+        for column, field in zip(STRING_COLUMNS, STRING_FIELDS):
+            setattr(key_layout, column, strings_or_none(field))
+        key_layout.characters = [string_list(i) for i in self.records["characters"].tolist()]
+        key_layout.field_orders = [string_list(i) for i in self.records["field_order"].tolist()]
+        key_layout.extras = [None if s == NONE_INDEX else json.loads(strings[s]) for s in self.records["extras"].tolist()]
+        key_layout.rebuild_indexes()
+        return key_layout
+
+    def to_dicts(self):
+        return self.to_key_layout().to_dicts()
+
+    def close(self):
+        # Drop numpy views first; an mmap can't close while buffers still reference it
+        self.records = self.geometry = self._list_offsets = self._list_pool = self._string_offsets = None
+        if getattr(self, "_map", None) is not None and not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+
+def load_layout_binary(path):
+    """
+    Loads a .kbl file as a list of key dictionaries (MANUAL_LAYOUT schema).
+    """
+    with BinaryLayout(path) as binary_layout:
+        return binary_layout.to_dicts()
+
+
+def load_key_layout_binary(path):
+    """
+    Loads a .kbl file straight into a KeyLayout.
+    """
+    with BinaryLayout(path) as binary_layout:
+        return binary_layout.to_key_layout()
+
+
+def json_to_binary(json_path, binary_path):
+    with open(json_path) as f:
+        layout = json.load(f)
+    return save_layout_binary(layout, binary_path)
+
+
+def binary_to_json(binary_path, json_path):
+    layout = load_layout_binary(binary_path)
+    with open(json_path, "w") as f:
+        json.dump(layout, f, indent=4) # Indented for reading; File > Export Key Layout (JSON) writes compact JSON
+    return len(layout)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert key layouts between JSON and the binary .kbl format.")
+    parser.add_argument("source", help="Input .json or .kbl file.")
+    parser.add_argument("destination", help="Output file; the direction is chosen from the source extension.")
+    args = parser.parse_args()
+
+    if args.source.lower().endswith(BINARY_LAYOUT_EXTENSION):
+        count = binary_to_json(args.source, args.destination)
+        print(f"Wrote {count} keys to {args.destination}")
+    else:
+        size = json_to_binary(args.source, args.destination)
+        print(f"Wrote {args.destination} ({size} bytes)")
@@ -0,0 +1,157 @@
+import numpy as np
+
+# Modifier bitmask values for encoded characters
+MODIFIER_NONE = 0
+MODIFIER_SHIFT = 1
+MODIFIER_NAMES = {MODIFIER_SHIFT: "shift"} # Bit -> the "characters" name of the key that provides it
+
+# Control characters that are typed as named keys (the names used in MANUAL_LAYOUT "characters")
+NAMED_CHARACTERS = {"\n": "enter", "\t": "tab", "\b": "backspace", "\x1b": "escape"}
+
+NO_KEY = -1
+
+
+def modifier_names(mask):
+    return tuple(name for bit, name in MODIFIER_NAMES.items() if mask & bit)
+
+
+def key_characters(characters):
+    """
+    Yields (character, modifier mask) for one key's "characters" list. By the MANUAL_LAYOUT
+    convention the first single character is typed unshifted and the second needs shift
+    (["`", "~"], ["q", "Q"]); multi-character entries ("escape", "f1") name the key itself.
+    """
+    position = 0
+    for character in characters or ():
+        if not isinstance(character, str):
+            continue
+        if len(character) == 1:
+            yield character, MODIFIER_SHIFT if position == 1 else MODIFIER_NONE
+            position += 1
+        else:
+            yield character, MODIFIER_NONE
+
+
+class CharacterIndex:
+    def __init__(self, key_layout=None):
+        """
+        Reverse index from typed character (or key name) to (key index, modifier mask).
+
+        When several keys produce the same character the lowest key index wins, matching a linear
+        scan of the layout. Every candidate is kept, so replacing a key can fall back to the next
+        one. The numpy lookup table used by encode() is rebuilt lazily after changes.
+        """
+        self.key_layout = key_layout
+        self._candidates = {} # character -> sorted list of (key index, modifier mask)
+        self._entries = {} # character -> (key index, modifier mask) of the winning candidate
+        self._characters_by_key = {} # key index -> characters it was indexed under
+        self._lut_keys = None # code point -> key index (NO_KEY if unmapped)
+        self._lut_modifiers = None # code point -> modifier mask
+        if key_layout is not None:
+            for index in range(len(key_layout)):
+                self.add_key(index, key_layout.characters[index])
+
+    def _set_entry(self, character):
+        candidates = self._candidates.get(character)
+        if candidates:
+            self._entries[character] = candidates[0]
+        else:
+            self._candidates.pop(character, None)
+            self._entries.pop(character, None)
+        self._lut_keys = None
+
+    def add_key(self, index, characters):
+        indexed = []
+        for character, mask in key_characters(characters):
+            candidates = self._candidates.setdefault(character, [])
+            candidates.append((index, mask))
+            candidates.sort()
+            self._set_entry(character)
+            indexed.append(character)
+        self._characters_by_key[index] = indexed
+
+    def remove_key(self, index):
+        for character in self._characters_by_key.pop(index, ()):
+            self._candidates[character] = [c for c in self._candidates[character] if c[0] != index]
+            self._set_entry(character)
+
+    def replace_key(self, index, characters):
+        self.remove_key(index)
+        self.add_key(index, characters)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, character):
+        return self.resolve(character) is not None
+
+    def characters(self):
+        return self._entries.keys()
+
+    def resolve(self, character):
+        """
+        Returns:
+            tuple: (key index, modifier mask), or None if no key produces the character.
+        """
+        return self._entries.get(NAMED_CHARACTERS.get(character, character))
+
+    def lookup(self, character):
+        """
+        Returns:
+            tuple: (key_id, modifier names) such as ("key_grave", ("shift",)), or None.
+        """
+        entry = self.resolve(character)
+        if entry is None:
+            return None
+        return self.key_layout.key_ids[entry[0]], modifier_names(entry[1])
+
+    def modifier_key_ids(self, mask):
+        # key_ids that provide each modifier in mask, for keys the layout actually has
+        key_ids = []
+        for bit, name in MODIFIER_NAMES.items():
+            entry = self._entries.get(name) if mask & bit else None
+            if entry is not None:
+                key_ids.append(self.key_layout.key_ids[entry[0]])
+        return key_ids
+
+    def _build_lut(self):
+        single = {ord(c): entry for c, entry in self._entries.items() if len(c) == 1}
+        for control, name in NAMED_CHARACTERS.items():
+            if name in self._entries and ord(control) not in single:
+                single[ord(control)] = self._entries[name]
+        size = max(max(single, default=-1) + 1, 256) # ASCII text indexes the table with raw bytes, no clamping
+        self._lut_keys = np.full(size + 1, NO_KEY, dtype=np.int32) # Last slot catches every code point >= size
+        self._lut_modifiers = np.zeros(size + 1, dtype=np.uint8)
+        if single:
+            codes = np.fromiter(single.keys(), dtype=np.int64, count=len(single))
+            self._lut_keys[codes] = [entry[0] for entry in single.values()]
+            self._lut_modifiers[codes] = [entry[1] for entry in single.values()]
+
+    def encode(self, text):
+        """
+        Encodes a whole string into key indices and modifier masks with one table lookup per
+        character (no per-character Python work), for simulating large corpora.
+
+        Returns:
+            tuple: (key_indices, modifiers) as int32/uint8 arrays, one entry per character;
+                key index is NO_KEY for characters no key produces.
+        """
+        if self._lut_keys is None:
+            self._build_lut()
+        if text.isascii(): # O(1) check in CPython; one byte per character, always inside the table
+            codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        else:
+            codes = np.minimum(np.frombuffer(text.encode("utf-32-le"), dtype="<u4"), len(self._lut_keys) - 1)
+        return self._lut_keys[codes], self._lut_modifiers[codes]
+
+    def encode_file(self, path, chunk_chars=1 << 22, encoding="utf-8"):
+        """
+        Yields encode() results for a text file in chunks of about chunk_chars characters, so
+        corpora larger than memory can be streamed.
+        """
+        with open(path, encoding=encoding, newline="") as f:
+            while True:
+                chunk = f.read(chunk_chars)
+                if not chunk:
+                    return
+                yield self.encode(chunk)
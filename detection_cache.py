@@ -0,0 +1,39 @@
+import hashlib
+import json
+import os
+
+from sqlite_lru_store import SQLiteLRUStore
+
+DEFAULT_DETECTION_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".keyboard_simulator", "detection_cache.sqlite")
+
+
+def make_detection_key(kind, image_hash, params):
+    """
+    Builds a cache key from the result kind ("bboxes" or "keys"), the image content hash and
+    every parameter that influences the result.
+    """
+    encoded = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f"{kind}|{image_hash}|{encoded}".encode()).hexdigest()
+
+
+class DetectionCache(SQLiteLRUStore):
+    TABLE = "detections"
+
+    def __init__(self, path=DEFAULT_DETECTION_CACHE_PATH, max_entries=1000):
+        """
+        Persistent cache of whole-image detection results (raw bboxes and identified keys).
+
+        Values are stored as JSON, keyed by make_detection_key(). Storage, LRU eviction and
+        thread safety come from SQLiteLRUStore; every write is committed immediately.
+
+        Args:
+            path (str): SQLite file. Use ":memory:" for a non-persistent cache.
+            max_entries (int): Size cap; the oldest-used entries beyond it are evicted.
+        """
+        super().__init__(path, max_entries, commit_every=1)
+
+    def encode_value(self, value):
+        return json.dumps(value)
+
+    def decode_value(self, stored):
+        return json.loads(stored)
@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Headless: the OpenCV/Tesseract stack (and batch_detect, which imports it) is only imported by the
+# worker processes
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_IMAGE_BYTES = 64 * 1024 * 1024
+
+_worker_detector = None # One warm KeyDetector per worker process, built by init_worker
+
+
+class ServerOverloaded(Exception):
+    """Raised by DetectionBatcher.submit when the pending-request queue is full."""
+
+
+class ServerClosed(Exception):
+    """Raised by DetectionBatcher.submit after close(), and set on requests close() found still queued."""
+
+
+def init_worker(detector_settings, ocr_cache_path):
+    """
+    Builds the worker's KeyDetector and pays the cold-start costs (OpenCV/Tesseract imports,
+    first tesseract launch) before any request arrives.
+    """
+    global _worker_detector
+    import numpy as np
+    import pytesseract
+    from batch_detect import build_worker_detector
+
+    _worker_detector = build_worker_detector(detector_settings, ocr_cache_path)
+    _worker_detector.find_key_bboxes(np.full((64, 64, 3), 255, dtype=np.uint8))
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e: # Requests will report the real error
+        print(f"Warning: tesseract is not usable in worker {os.getpid()}: {e}")
+
+
+def ping():
+    # Submitted once per worker at startup so every process is spawned and initialized up front
+    return os.getpid()
+
+
+def detect_batch(image_payloads):
+    """
+    Detects keys in several encoded images inside one worker: detection runs per image, then the
+    ROIs of all images share one OCR pass (KeyDetector.identify_keys_batch).
+
+    Returns:
+        list: Per image, {"keys": [...]} in the layout JSON schema or {"error": message}.
+    """
+    from key_detector import EncodedImage
+    detector = _worker_detector
+    detected, results = [], [None] * len(image_payloads)
+    for index, image_bytes in enumerate(image_payloads):
+        image = EncodedImage(image_bytes) # Decoded only on a detection-cache miss
+        bboxes = detector.detect_keys_in_image(image)
+        if image.decode_failed:
+            results[index] = {"error": "could not decode image"}
+            continue
+        detected.append((index, (image, bboxes, None)))
+
+    layouts = detector.identify_keys_batch([item for _, item in detected])
+    for (index, _), keys in zip(detected, layouts):
+        results[index] = {"keys": keys}
+    return results
+
+
+class DetectionBatcher:
+    def __init__(self, executor, workers, max_batch=8, batch_window=0.01, max_pending=64):
+        """
+        Groups concurrent detection requests into batches for a pool of warm worker processes.
+
+        A dispatcher thread takes the first waiting request, then keeps collecting for up to
+        batch_window seconds or max_batch requests, and sends the batch to one worker. At most
+        `workers` batches are in flight; further requests wait in a queue of max_pending entries,
+        beyond which submit() raises ServerOverloaded (backpressure instead of unbounded memory).
+
+        Args:
+            executor (ProcessPoolExecutor): Pool whose workers were set up by init_worker.
+            workers (int): Pool size; bounds the batches in flight.
+            max_batch (int): Most requests per batch.
+            batch_window (float): Seconds to wait for more requests after the first one.
+            max_pending (int): Queue size before requests are rejected.
+        """
+        self.executor = executor
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._slots = threading.Semaphore(workers)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "rejected": 0, "batches": 0, "batched_requests": 0, "failed": 0}
+        self._closed = False
+        self._thread = threading.Thread(target=self._dispatch, name="detection-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image_bytes):
+        """
+        Queues one encoded image.
+
+        Returns:
+            Future: Resolves to {"keys": [...]} or, for an image that can't be decoded, {"error": message}.
+                result() raises the worker's exception when the whole batch failed, and ServerClosed
+                when the batcher closed before the request was dispatched.
+
+        Raises:
+            ServerOverloaded: When max_pending requests are already waiting.
+            ServerClosed: After close().
+        """
+        future = Future()
+        with self._lock: # close() flips _closed under the lock, so nothing is queued after its drain
+            if self._closed:
+                raise ServerClosed()
+            try:
+                self._queue.put_nowait((image_bytes, future))
+            except queue.Full:
+                self.stats["rejected"] += 1
+                raise ServerOverloaded()
+            self.stats["requests"] += 1
+        return future
+
+    def snapshot_stats(self):
+        with self._lock:
+            return dict(self.stats, pending=self._queue.qsize())
+
+    def close(self):
+        """
+        Stops the dispatcher. Batches already sent to workers still complete; every request still
+        queued fails with ServerClosed.
+        """
+        with self._lock:
+            self._closed = True
+        self._fail_pending()
+        self._queue.put((None, None)) # Wakes a dispatcher waiting for requests (the queue was just emptied)
+        self._slots.release() # Wakes a dispatcher waiting for a worker slot
+        self._thread.join()
+        self._fail_pending()
+
+    def _fail_pending(self):
+        while True:
+            try:
+                _, future = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if future is not None:
+                future.set_exception(ServerClosed())
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire() # Only pull requests when a worker can take them
+            if self._closed:
+                return
+            image_bytes, future = self._queue.get()
+            if future is None:
+                return
+            if self._closed: # Taken after close() drained the queue
+                future.set_exception(ServerClosed())
+                return
+            batch = [(image_bytes, future)]
+            closing = False
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item[1] is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["batched_requests"] += len(batch)
+            try:
+                work = self.executor.submit(detect_batch, [payload for payload, _ in batch])
+            except Exception as e: # Pool broken or shut down: fail this batch and free its slot
+                self._slots.release()
+                self._fail_batch(batch, e)
+            else:
+                work.add_done_callback(lambda work, batch=batch: self._finish(work, batch))
+            if closing:
+                return
+
+    def _fail_batch(self, batch, error):
+        with self._lock:
+            self.stats["failed"] += len(batch)
+        for _, future in batch:
+            future.set_exception(error)
+
+    def _finish(self, work, batch):
+        self._slots.release()
+        try:
+            results = work.result()
+        except Exception as e: # Worker crash or pickling error: fail the whole batch
+            self._fail_batch(batch, e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+class DetectionRequestHandler(BaseHTTPRequestHandler):
+    # POST /detect with the encoded image as the body returns the layout JSON (same schema as
+    # File > Export Key Layout); GET /health returns batching stats.
+    server_version = "KeyboardDetection/1.0"
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": "not found"})
+            return
+        self.send_json(200, dict(self.server.batcher.snapshot_stats(), workers=self.server.workers))
+
+    def do_POST(self):
+        if self.path != "/detect":
+            self.send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_IMAGE_BYTES:
+            self.send_json(400 if length <= 0 else 413, {"error": "expected an encoded image body"})
+            return
+        image_bytes = self.rfile.read(length)
+
+        try:
+            future = self.server.batcher.submit(image_bytes)
+            result = future.result(timeout=self.server.request_timeout)
+        except (ServerOverloaded, ServerClosed):
+            self.send_json(503, {"error": "server busy, retry later"}, {"Retry-After": "1"})
+            return
+        except FutureTimeoutError:
+            self.send_json(504, {"error": "detection timed out"})
+            return
+        except Exception as e: # The worker batch failed
+            self.send_json(500, {"error": repr(e)})
+            return
+        if "error" in result:
+            self.send_json(422, result)
+        else:
+            self.send_json(200, result["keys"])
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, ocr_mode="mosaic", pyramid_level=0, tile_size=0,
+                ocr_cache_path=None, max_batch=8, batch_window=0.01, max_pending=64, request_timeout=120.0,
+                verbose=False):
+    """
+    Starts the warm worker pool and returns a ThreadingHTTPServer ready for serve_forever().
+    Call shutdown_server() afterwards to stop the batcher and the pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    settings = {"ocr_mode": ocr_mode, "pyramid_level": pyramid_level, "tile_size": tile_size}
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(settings, ocr_cache_path))
+    # Spawn and initialize every worker now, so the first requests don't pay the cold start
+    for future in [executor.submit(ping) for _ in range(workers)]:
+        future.result()
+
+    server = ThreadingHTTPServer((host, port), DetectionRequestHandler)
+    server.daemon_threads = True
+    server.executor = executor
+    server.batcher = DetectionBatcher(executor, workers, max_batch, batch_window, max_pending)
+    server.workers = workers
+    server.request_timeout = request_timeout
+    server.verbose = verbose
+    return server
+
+
+def shutdown_server(server):
+    server.server_close()
+    server.batcher.close()
+    server.executor.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve key detection over local HTTP with a warm KeyDetector pool.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Bind address (default: localhost only).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--ocr-mode", default="mosaic", choices=("serial", "thread", "mosaic"),
+                        help="OCR mode inside each worker; mosaic packs a whole batch's ROIs into shared OCR calls.")
+    parser.add_argument("--pyramid-level", type=int, default=0, help="KeyDetector.detection_pyramid_level.")
+    parser.add_argument("--tile-size", type=int, default=0, help="KeyDetector.detection_tile_size.")
+    parser.add_argument("--ocr-cache", default=None, help="Optional OCRCache SQLite file shared by all workers.")
+    parser.add_argument("--max-batch", type=int, default=8, help="Most requests combined into one worker task.")
+    parser.add_argument("--batch-window-ms", type=float, default=10.0, help="How long to wait for a batch to fill.")
+    parser.add_argument("--max-pending", type=int, default=64, help="Queued requests before answering 503.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.workers, args.ocr_mode, args.pyramid_level, args.tile_size,
+                         args.ocr_cache, args.max_batch, args.batch_window_ms / 1000, args.max_pending, args.timeout,
+                         args.verbose)
+    print(f"Detection server on http://{args.host}:{args.port} with {server.workers} warm workers "
+          f"(POST /detect, GET /health).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_server(server)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
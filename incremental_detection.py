@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+
+from key_clustering import row_major_order
+from key_detector import merge_overlapping_rects, clip_roi
+from instrumentation import instrumentation
+
+
+def changed_block_mask(previous_image, image, block_size=32, pixel_threshold=25, min_changed_pixels=4):
+    """
+    Compares two same-sized color images block by block.
+
+    A block counts as changed when at least min_changed_pixels of its pixels differ by more than
+    pixel_threshold gray levels, so JPEG re-encoding noise does not mark the whole board dirty.
+
+    Returns:
+        numpy.ndarray: Boolean (ceil(h / block_size), ceil(w / block_size)) mask of changed blocks.
+    """
+    diff = cv2.absdiff(cv2.cvtColor(previous_image, cv2.COLOR_BGR2GRAY), cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    changed = (diff > pixel_threshold).astype(np.int32)
+    h, w = changed.shape
+    blocks_y, blocks_x = -(-h // block_size), -(-w // block_size)
+    padded = np.zeros((blocks_y * block_size, blocks_x * block_size), dtype=np.int32)
+    padded[:h, :w] = changed
+    counts = padded.reshape(blocks_y, block_size, blocks_x, block_size).sum(axis=(1, 3))
+    return counts >= min_changed_pixels
+
+
+def changed_regions(block_mask, block_size, image_shape):
+    """
+    Groups 8-connected changed blocks into (x, y, w, h) pixel regions, clipped to the image.
+    """
+    count, _, stats, _ = cv2.connectedComponentsWithStats(block_mask.astype(np.uint8), connectivity=8)
+    regions = []
+    for bx, by, bw, bh, _ in stats[1:count].tolist(): # Label 0 is the unchanged background
+        regions.append(clip_roi((bx * block_size, by * block_size, bw * block_size, bh * block_size), image_shape))
+    return regions
+
+
+def rects_intersect(rects, rect):
+    # Boolean mask of the (N, 4) rects that overlap rect
+    x, y, w, h = rect
+    return ((rects[:, 0] < x + w) & (rects[:, 0] + rects[:, 2] > x) &
+            (rects[:, 1] < y + h) & (rects[:, 1] + rects[:, 3] > y))
+
+
+def redetect_changed_keys(detector, previous_image, image, previous_layout, image_hash=None, progress_callback=None,
+                          cancel_check=None, block_size=32, pixel_threshold=25, min_changed_pixels=4):
+    """
+    Updates a layout detected on previous_image for a new revision of the same keyboard image,
+    re-running detection and OCR only around the blocks that changed.
+
+    Keys that overlap a changed region are dropped and re-detected inside a window covering the
+    region, those keys and a one-key margin; every other entry of previous_layout is reused as-is.
+    New boxes are only kept if they overlap a changed region, so unchanged neighbours in the margin
+    are not detected twice. With detector.cluster_keys the merged layout is put back in row-major
+    order and row/column indices are reassigned.
+
+    Falls back to a full detect + refine when there is no previous image or its size differs.
+
+    Args:
+        detector (KeyDetector): Configured detector; its caches are used as usual.
+        previous_image: Color image the previous layout was detected on, or None.
+        image: New color image.
+        previous_layout (list): Key dictionaries detected on previous_image.
+        image_hash (str, optional): Content hash of image, for the detection cache.
+        progress_callback, cancel_check: As in KeyDetector.refine_and_identify_keys (re-detected keys only).
+        block_size (int): Side of the diff blocks in pixels.
+        pixel_threshold (int), min_changed_pixels (int): See changed_block_mask.
+
+    Returns:
+        tuple: (layout, stats) where stats counts changed blocks, re-detected regions and reused,
+            removed and re-detected keys, and "full" tells whether the fallback ran.
+    """
+    stats = {"full": False, "changed_blocks": 0, "regions": 0, "reused": 0, "removed": 0, "redetected": 0}
+    if previous_image is None or previous_image.shape != image.shape:
+        stats["full"] = True
+        bboxes = detector.detect_keys_in_image(image, image_hash)
+        keys = detector.refine_and_identify_keys(image, bboxes, progress_callback, cancel_check, image_hash) if bboxes else []
+        stats["redetected"] = len(keys)
+        return keys, stats
+
+    with instrumentation.span("incremental.diff"):
+        block_mask = changed_block_mask(previous_image, image, block_size, pixel_threshold, min_changed_pixels)
+        regions = changed_regions(block_mask, block_size, image.shape)
+    stats["changed_blocks"] = int(block_mask.sum())
+    if not regions:
+        stats["reused"] = len(previous_layout)
+        return list(previous_layout), stats
+
+    positions = np.array([[key["position"][field] for field in ("x", "y", "width", "height")] for key in previous_layout],
+                         dtype=np.int64).reshape(-1, 4)
+    margin = int(np.median(positions[:, 3])) if len(positions) else block_size
+    dirty = np.zeros(len(positions), dtype=bool)
+    windows = []
+    for region in regions:
+        touched = rects_intersect(positions, region)
+        dirty |= touched
+        # Window = region plus every key it touches, padded so keys crossing its edge are found whole
+        covered = np.concatenate([np.array([region], dtype=np.int64), positions[touched]])
+        x0, y0 = covered[:, 0].min() - margin, covered[:, 1].min() - margin
+        x1, y1 = (covered[:, 0] + covered[:, 2]).max() + margin, (covered[:, 1] + covered[:, 3]).max() + margin
+        windows.append((x0, y0, x1 - x0, y1 - y0))
+    windows = [clip_roi(window, image.shape) for window in merge_overlapping_rects(windows).tolist()]
+    stats["regions"] = len(windows)
+
+    region_rects = np.array(regions, dtype=np.int64)
+    image_h, image_w = image.shape[:2]
+    bboxes, seen = [], set()
+    with instrumentation.span("incremental.detect", windows=len(windows)):
+        for wx, wy, ww, wh in windows:
+            for bbox in detector.detect_keys_in_image(image, image_hash, roi=(wx, wy, ww, wh)):
+                x, y, w, h = bbox
+                # Boxes on a window edge (other than the image edge) were clipped by the window
+                clipped = ((x == wx and wx > 0) or (y == wy and wy > 0) or
+                           (x + w == wx + ww and wx + ww < image_w) or (y + h == wy + wh and wy + wh < image_h))
+                if clipped or bbox in seen or not rects_intersect(region_rects, bbox).any():
+                    continue
+                seen.add(bbox)
+                bboxes.append(bbox)
+
+    new_keys = detector.refine_and_identify_keys(image, bboxes, progress_callback, cancel_check) if bboxes else []
+    kept_keys = [key for key, is_dirty in zip(previous_layout, dirty.tolist()) if not is_dirty]
+    stats.update(reused=len(kept_keys), removed=int(dirty.sum()), redetected=len(new_keys))
+
+    layout = kept_keys + new_keys
+    if detector.cluster_keys and layout:
+        merged_positions = np.array([[key["position"][field] for field in ("x", "y", "width", "height")] for key in layout],
+                                    dtype=np.int64)
+        order, rows, columns = row_major_order(merged_positions, detector.row_gap_factor)
+        layout = [dict(layout[i], row=row, column=column) if "row" in layout[i] else layout[i]
+                  for i, row, column in zip(order.tolist(), rows.tolist(), columns.tolist())]
+    return layout, stats
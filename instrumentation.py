@@ -0,0 +1,209 @@
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds in microseconds: 1us, 2us, 4us ... ~67s, then overflow
+HISTOGRAM_BOUNDS_US = [1 << i for i in range(27)]
+
+PROFILE_ENV_VAR = "KEYBOARD_SIMULATOR_PROFILE" # Set to 1 to start with instrumentation enabled
+
+
+class Histogram:
+    def __init__(self):
+        """
+        Fixed log2 buckets of durations plus exact count/total/min/max. Percentiles are estimated
+        from the buckets (upper bound of the bucket holding the rank), so memory stays constant.
+        """
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_US) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        bucket = max(math.ceil(seconds * 1e6) - 1, 0).bit_length() # Smallest i with duration <= 2**i us
+        self.counts[min(bucket, len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        rank, seen = fraction * self.count, 0
+        for bound, bucket_count in zip(HISTOGRAM_BOUNDS_US, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else None,
+            "min_ms": self.min * 1000 if self.min is not None else None,
+            "max_ms": self.max * 1000 if self.max is not None else None,
+            "p50_ms": self.percentile(0.5) * 1000 if self.count else None,
+            "p90_ms": self.percentile(0.9) * 1000 if self.count else None,
+            "p99_ms": self.percentile(0.99) * 1000 if self.count else None,
+            "buckets_us": {str(bound): n for bound, n in zip(HISTOGRAM_BOUNDS_US + ["inf"], self.counts) if n},
+        }
+
+
+class _NullSpan:
+    # Shared no-op context manager returned while instrumentation is disabled
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("instrumentation", "name", "args", "start")
+
+    def __init__(self, instrumentation, name, args):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start, self.start, self.args)
+        return False
+
+
+class Instrumentation:
+    def __init__(self, enabled=False, max_trace_events=200000):
+        """
+        Collects named timing spans into per-name histograms, counters, and (bounded) trace events
+        for Chrome's about://tracing / Perfetto.
+
+        Disabled, span() returns a shared no-op context manager and count() returns immediately,
+        so instrumented hot paths cost one attribute check. Toggle at runtime with enable()/disable().
+        Spans recorded inside worker processes (the "process" OCR mode, batch_detect) stay in
+        those processes and are not collected here.
+        """
+        self.enabled = enabled
+        self.max_trace_events = max_trace_events
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.trace_events = []
+            self.dropped_trace_events = 0
+
+    def span(self, name, **args):
+        """
+        Context manager timing the enclosed block under name, e.g.
+        `with instrumentation.span("detect.threshold"):`. Keyword args are attached to the trace event.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args or None)
+
+    def timed(self, name):
+        # Decorator form of span(); checks the toggle on every call
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Span(self, name, None):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds, start=None, args=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+            if start is not None:
+                if len(self.trace_events) < self.max_trace_events:
+                    self.trace_events.append((name, start, seconds, threading.get_ident(), args))
+                else:
+                    self.dropped_trace_events += 1
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {"histograms": {name: stats}, "counters": {name: value}, ...}, JSON-serializable.
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "histograms": {name: h.to_dict() for name, h in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "trace_events": len(self.trace_events),
+                "dropped_trace_events": self.dropped_trace_events,
+            }
+
+    def chrome_trace(self):
+        """
+        Returns the recorded spans in Chrome trace event format ("X" complete events, microseconds).
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                dict({"name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+                      "ts": (start - self._origin) * 1e6, "dur": seconds * 1e6},
+                     **({"args": args} if args else {}))
+                for name, start, seconds, tid, args in self.trace_events
+            ]
+            counters = dict(self.counters)
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": counters}}
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+    def export_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary_lines(self):
+        # One line per histogram, slowest total first, for printing
+        lines = []
+        for name, h in sorted(self.histograms.items(), key=lambda item: -item[1].total):
+            stats = h.to_dict()
+            lines.append(f"{name:<32} n={stats['count']:<7} total {stats['total_ms']:10.2f} ms | "
+                         f"mean {stats['mean_ms']:8.3f} ms | p99 {stats['p99_ms']:8.3f} ms | max {stats['max_ms']:8.3f} ms")
+        lines.extend(f"{name:<32} {value}" for name, value in sorted(self.counters.items()))
+        return lines
+
+
+# Process-wide instance used by key_detector and keyboard_simulator
+instrumentation = Instrumentation(enabled=os.environ.get(PROFILE_ENV_VAR) == "1")
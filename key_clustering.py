@@ -0,0 +1,147 @@
+import numpy as np
+
+
+def overlapping_pairs(boxes):
+    """
+    Finds every pair of (x, y, w, h) boxes whose rectangles intersect, with a sort-and-sweep on x:
+    after sorting by left edge, each box is only compared with the boxes that start before its
+    right edge, so keyboard-like inputs cost about O(n log n) instead of O(n^2).
+
+    Returns:
+        tuple: (first, second) int arrays of box indices with first != second, each pair once.
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    order = np.argsort(boxes[:, 0], kind="stable")
+    x1 = boxes[order, 0]
+    x2 = x1 + boxes[order, 2]
+    y1 = boxes[order, 1]
+    y2 = y1 + boxes[order, 3]
+    ends = np.searchsorted(x1, x2, side="left") # Boxes [i+1, ends[i]) start before box i ends
+    first, second = [], []
+    for i in range(len(order)):
+        if ends[i] <= i + 1:
+            continue
+        j = np.arange(i + 1, ends[i])
+        hit = j[(y1[j] < y2[i]) & (y2[j] > y1[i])]
+        first.append(np.full(len(hit), order[i]))
+        second.append(order[hit])
+    if not first:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def dedupe_boxes(boxes, iou_threshold=0.6, containment_threshold=0.9):
+    """
+    Drops boxes that duplicate a larger box: IoU >= iou_threshold, or at least
+    containment_threshold of the smaller box lies inside the larger (nested detections such as
+    a keycap's inner face inside its outline).
+
+    Returns:
+        numpy.ndarray: Boolean keep mask over the input boxes.
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    keep = np.ones(len(boxes), dtype=bool)
+    first, second = overlapping_pairs(boxes)
+    if not len(first):
+        return keep
+
+    area = boxes[:, 2] * boxes[:, 3]
+    a, b = boxes[first], boxes[second]
+    iw = np.minimum(a[:, 0] + a[:, 2], b[:, 0] + b[:, 2]) - np.maximum(a[:, 0], b[:, 0])
+    ih = np.minimum(a[:, 1] + a[:, 3], b[:, 1] + b[:, 3]) - np.maximum(a[:, 1], b[:, 1])
+    intersection = iw * ih
+    iou = intersection / (area[first] + area[second] - intersection)
+    containment = intersection / np.minimum(area[first], area[second])
+    duplicate = (iou >= iou_threshold) | (containment >= containment_threshold)
+
+    # Larger box wins (ties: lower index), decided greedily from the largest down
+    first, second = first[duplicate], second[duplicate]
+    rank = np.lexsort((np.arange(len(boxes)), -area)) # Position of each box in largest-first order
+    priority = np.empty(len(boxes), dtype=np.int64)
+    priority[rank] = np.arange(len(boxes))
+    winner = np.where(priority[first] < priority[second], first, second)
+    loser = np.where(priority[first] < priority[second], second, first)
+    beaten_by = {}
+    for w, l in zip(winner.tolist(), loser.tolist()):
+        beaten_by.setdefault(l, []).append(w)
+    for index in rank.tolist():
+        if any(keep[w] for w in beaten_by.get(index, ())):
+            keep[index] = False # Only boxes that are still kept can suppress others
+    return keep
+
+
+def cluster_rows(y_centers, eps):
+    """
+    1-D density clustering: sorted centers closer than eps to their neighbour share a row
+    (single linkage, i.e. DBSCAN with min_samples=1 on a line).
+
+    Returns:
+        numpy.ndarray: Row label per center, 0 for the top row, increasing downwards.
+    """
+    y_centers = np.asarray(y_centers, dtype=np.float64)
+    if not len(y_centers):
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(y_centers, kind="stable")
+    new_row = np.concatenate([[0], np.diff(y_centers[order]) > eps])
+    labels = np.empty(len(y_centers), dtype=np.int64)
+    labels[order] = np.cumsum(new_row)
+    return labels
+
+
+def row_major_order(boxes, row_gap_factor=0.5, median_height=None):
+    """
+    Clusters (x, y, w, h) boxes into rows on their y-centers and orders each row by x.
+
+    Returns:
+        tuple: (order, rows, columns) where order is the row-major permutation of the input boxes
+            and rows/columns are the indices of the boxes in that order.
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    if not len(boxes):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    if median_height is None:
+        median_height = float(np.median(boxes[:, 3]))
+    rows = cluster_rows(boxes[:, 1] + boxes[:, 3] / 2, row_gap_factor * median_height)
+    order = np.lexsort((boxes[:, 1], boxes[:, 0], rows)) # Row, then x (then y for stacked boxes)
+    rows = rows[order]
+    row_starts = np.concatenate([[0], np.flatnonzero(np.diff(rows)) + 1])
+    columns = np.arange(len(rows)) - np.repeat(row_starts, np.diff(np.append(row_starts, len(rows))))
+    return order, rows, columns
+
+
+def organize_key_boxes(bboxes, iou_threshold=0.6, containment_threshold=0.9, row_gap_factor=0.5,
+                       height_range=(0.5, 2.5)):
+    """
+    Turns raw detections into a row/column grid before OCR: removes duplicate and nested boxes,
+    drops height outliers, clusters the rest into rows on their y-centers and orders each row by x.
+
+    Args:
+        bboxes (list): (x, y, w, h) tuples from detect_keys.
+        row_gap_factor (float): Centers further apart than this many median key heights start a new row.
+        height_range (tuple): Boxes shorter/taller than these multiples of the median height are outliers.
+
+    Returns:
+        tuple: (organized, stats) where organized is a list of (bbox, row, column) in row-major
+            order and stats counts input boxes, duplicates, outliers and rows.
+    """
+    stats = {"input": len(bboxes), "duplicates": 0, "outliers": 0, "rows": 0}
+    if not bboxes:
+        return [], stats
+    boxes = np.asarray(bboxes, dtype=np.int64).reshape(-1, 4)
+
+    keep = dedupe_boxes(boxes, iou_threshold, containment_threshold)
+    stats["duplicates"] = int((~keep).sum())
+    boxes = boxes[keep]
+
+    median_height = float(np.median(boxes[:, 3]))
+    inlier = (boxes[:, 3] >= median_height * height_range[0]) & (boxes[:, 3] <= median_height * height_range[1])
+    stats["outliers"] = int((~inlier).sum())
+    boxes = boxes[inlier]
+
+    order, rows, columns = row_major_order(boxes, row_gap_factor, median_height)
+    boxes = boxes[order]
+    stats["rows"] = int(rows[-1]) + 1 if len(rows) else 0
+
+    organized = [(tuple(box), int(row), int(column)) for box, row, column in zip(boxes.tolist(), rows.tolist(), columns.tolist())]
+    return organized, stats
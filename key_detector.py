@@ -1,14 +1,545 @@
 import cv2
 import numpy as np
 import os # Added for checking file existence in main
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor # Added for parallel OCR
 import pytesseract # Added for OCR
 from PIL import Image # Added for OCR
+from ocr_cache import OCRCache
+from detection_cache import make_detection_key
+import hashlib # Added for image content hashing
+from instrumentation import instrumentation # Timing spans/counters, no-ops unless enabled
+from key_clustering import organize_key_boxes, overlapping_pairs
+
+OCR_MODES = ("serial", "thread", "process", "mosaic")
+
+# Returned by ocr_key_roi when Tesseract itself failed (missing binary, bad config, crash), as opposed
+# to reading no text. A string so it survives the "process" mode's pickling; never cached, shown as "Unknown".
+OCR_FAILED = "\0ocr-failed"
+
+# PSM 6: Assume a single uniform block of text.
+# PSM 7: Treat the image as a single text line.
+# PSM 10: Treat the image as a single character. (Often good for single keycaps)
+# Let's try PSM 10 for individual keys, or PSM 7 if that's too restrictive.
+# PSM 6 is often better for blocks of text.
+OCR_CONFIG_PSM10 = r'--oem 3 --psm 10 -c tessedit_char_whitelist=0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ`~!@#$%^&*()-_=+[]{};:\'",<.>/?\| '
+OCR_CONFIG_PSM7 = r'--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ`~!@#$%^&*()-_=+[]{};:\'",<.>/?\| '
+# PSM 11: Sparse text, find as much text as possible in no particular order. Used for mosaics.
+OCR_CONFIG_MOSAIC = r'--oem 3 --psm 11 -c tessedit_char_whitelist=0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ`~!@#$%^&*()-_=+[]{};:\'",<.>/?\| '
+
+
+@instrumentation.timed("ocr.preprocess")
+def preprocess_key_roi(image_cv, bbox):
+    """
+    Crops a key's bounding box out of the color image and thresholds it for OCR.
+
+    Args:
+        image_cv: The original color image loaded by OpenCV.
+        bbox (tuple): (x, y, w, h) of the key.
+
+    Returns:
+        numpy.ndarray: The thresholded grayscale ROI, or None if the ROI is empty.
+    """
+    x, y, w, h = bbox
+
+    # Extract ROI from the original color image
+    roi = image_cv[y:y+h, x:x+w]
+
+    if roi.size == 0: # Check if ROI is empty
+        print(f"Warning: Empty ROI at x={x}, y={y}, w={w}, h={h}. Skipping.")
+        return None
+
+    # Preprocess ROI for OCR
+    gray_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    # Apply Otsu's thresholding
+    _, thresholded_roi = cv2.threshold(gray_roi, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU) # Invert for white text on black bg if needed
+                                                                                            # Or THRESH_BINARY if black text on white.
+                                                                                            # For typical keyboard images (dark text on light keys),
+                                                                                            # THRESH_BINARY or THRESH_BINARY_INV + bitwise_not might be better.
+                                                                                            # Let's assume keys are lighter than text, so THRESH_BINARY_INV
+
+    # Optional: Invert if text is white on dark keys (common for some keyboard designs)
+    # if np.mean(gray_roi) < 128: # Heuristic for dark background
+    #    thresholded_roi = cv2.bitwise_not(thresholded_roi)
+
+    return thresholded_roi
+
+
+@instrumentation.timed("ocr.roi")
+def ocr_key_roi(thresholded_roi):
+    """
+    Runs Tesseract on one thresholded key ROI (PSM 10, retried with PSM 7 if nothing is found).
+
+    Module-level so it can be shipped to worker processes by the "process" OCR mode.
+
+    Args:
+        thresholded_roi (numpy.ndarray): Output of preprocess_key_roi.
+
+    Returns:
+        str: The recognized label ("" if nothing was recognized), OCR_FAILED if Tesseract failed, or
+             None if the ROI could not be converted to a PIL image.
+    """
+    # Convert processed ROI to PIL Image
+    try:
+        pil_image = Image.fromarray(thresholded_roi)
+    except Exception as e:
+        print(f"Error converting ROI to PIL Image: {e}. ROI shape: {thresholded_roi.shape}, dtype: {thresholded_roi.dtype}")
+        return None
+
+    # Perform OCR
+    try:
+        with instrumentation.span("ocr.tesseract_psm10"):
+            label_text = pytesseract.image_to_string(pil_image, config=OCR_CONFIG_PSM10).strip()
+    except pytesseract.TesseractError as e:
+        print(f"Pytesseract error during OCR: {e}")
+        label_text = OCR_FAILED
+    except Exception as e: # Catch any other pytesseract/PIL issues
+        print(f"Unexpected error during OCR: {e}")
+        label_text = OCR_FAILED
+
+    # Clean up common OCR misinterpretations for single characters or typical key labels
+    if len(label_text) > 3 and label_text not in ["Shift", "Enter", "Space", "Ctrl", "Alt", "Tab", "Caps", "Backspace"]: # Arbitrary length for 'too long'
+        # If it's a long string and not a known multi-char key, maybe it's noise.
+        # Or, try a different PSM mode if PSM 10 is too restrictive.
+        # For now, we'll just take it or leave it based on PSM 10.
+        pass
+
+    # If label_text is empty (or PSM 10 failed), maybe try PSM 7
+    if not label_text or label_text == OCR_FAILED:
+        instrumentation.count("ocr.psm7_retries")
+        try:
+            with instrumentation.span("ocr.tesseract_psm7"):
+                label_text = pytesseract.image_to_string(pil_image, config=OCR_CONFIG_PSM7).strip()
+        except Exception as e: # Only a genuine "no text" may be cached as such
+            print(f"Error during PSM 7 OCR retry: {e}")
+            label_text = OCR_FAILED
+
+    return label_text
+
+
+def build_roi_mosaics(thresholded_rois, padding=20, max_width=4000, max_height=4000):
+    """
+    Packs thresholded key ROIs into one or more mosaic images, row by row, with known padding.
+
+    Each ROI is normalized to dark text on a white background so a single Tesseract pass sees
+    consistent polarity across keys.
+
+    Args:
+        thresholded_rois (list): Output of preprocess_key_roi for each key (None entries are skipped).
+        padding (int): White margin in pixels around every ROI.
+        max_width (int): Maximum mosaic width before a new row is started.
+        max_height (int): Maximum mosaic height before a new mosaic is started.
+
+    Returns:
+        list: (mosaic_image, placements) tuples, where placements is a list of
+              (roi_index, x, y, w, h) giving each ROI's position inside that mosaic.
+    """
+    pages = []
+    placements = []
+    cursor_x, cursor_y, row_height = 0, 0, 0
+
+    for index, roi in enumerate(thresholded_rois):
+        if roi is None:
+            continue
+        h, w = roi.shape[:2]
+        cell_w, cell_h = w + 2 * padding, h + 2 * padding
+
+        if cursor_x > 0 and cursor_x + cell_w > max_width: # Next row
+            cursor_x, cursor_y, row_height = 0, cursor_y + row_height, 0
+        if cursor_y > 0 and cursor_y + cell_h > max_height: # Next mosaic
+            pages.append(placements)
+            placements = []
+            cursor_x, cursor_y, row_height = 0, 0, 0
+
+        placements.append((index, cursor_x + padding, cursor_y + padding, w, h))
+        cursor_x += cell_w
+        row_height = max(row_height, cell_h)
+    if placements:
+        pages.append(placements)
+
+    mosaics = []
+    for placements in pages:
+        width = max(x + w + padding for _, x, _, w, _ in placements)
+        height = max(y + h + padding for _, _, y, _, h in placements)
+        mosaic = np.full((height, width), 255, dtype=np.uint8)
+        for index, x, y, w, h in placements:
+            roi = thresholded_rois[index]
+            border = np.concatenate([roi[0, :], roi[-1, :], roi[:, 0], roi[:, -1]])
+            if np.mean(border) < 128: # Background is dark after thresholding, flip to dark-on-white
+                roi = cv2.bitwise_not(roi)
+            mosaic[y:y+h, x:x+w] = roi
+        mosaics.append((mosaic, placements))
+    return mosaics
+
+
+def map_mosaic_words(ocr_data, placements, padding):
+    """
+    Assigns words from pytesseract.image_to_data output back to the ROIs they were read from.
+
+    A word belongs to a ROI when its box lies entirely inside that ROI's padded cell. Words that
+    straddle cells, and cells that received no words, are reported as ambiguous.
+
+    Returns:
+        tuple: (labels, ambiguous) where labels maps roi_index -> text and ambiguous is a set of roi_index.
+    """
+    cells = [(index, x - padding, y - padding, x + w + padding, y + h + padding) for index, x, y, w, h in placements]
+    words = {index: [] for index, *_ in cells}
+    ambiguous = set()
+
+    for i, text in enumerate(ocr_data["text"]):
+        text = text.strip()
+        if not text:
+            continue
+        left, top = ocr_data["left"][i], ocr_data["top"][i]
+        right, bottom = left + ocr_data["width"][i], top + ocr_data["height"][i]
+
+        touched = [c for c in cells if left < c[3] and c[1] < right and top < c[4] and c[2] < bottom]
+        if len(touched) == 1 and touched[0][1] <= left and right <= touched[0][3] and touched[0][2] <= top and bottom <= touched[0][4]:
+            words[touched[0][0]].append((ocr_data["block_num"][i], ocr_data["par_num"][i], ocr_data["line_num"][i], left, text))
+        else:
+            ambiguous.update(c[0] for c in touched)
+
+    labels = {}
+    for index, found in words.items():
+        if not found:
+            ambiguous.add(index) # PSM 11 can miss lone symbols; let the per-key PSM 10/7 path decide
+        elif index not in ambiguous:
+            labels[index] = " ".join(text for *_, text in sorted(found))
+    return labels, ambiguous
+
+
+def ocr_key_rois_mosaic(thresholded_rois, padding=20, max_width=4000, max_height=4000):
+    """
+    Batch OCR: one Tesseract invocation per mosaic instead of one (or two) per key.
+
+    ROIs whose words cannot be mapped unambiguously are re-read with ocr_key_roi.
+
+    Returns:
+        tuple: (labels, stats) where labels is a list parallel to thresholded_rois (None where the
+               input ROI was None) and stats counts mosaics, ROIs and per-key fallbacks.
+    """
+    labels = [None] * len(thresholded_rois)
+    stats = {"mosaics": 0, "rois": 0, "fallbacks": 0}
+
+    for mosaic, placements in build_roi_mosaics(thresholded_rois, padding, max_width, max_height):
+        stats["mosaics"] += 1
+        stats["rois"] += len(placements)
+        try:
+            with instrumentation.span("ocr.mosaic", rois=len(placements)):
+                ocr_data = pytesseract.image_to_data(Image.fromarray(mosaic), config=OCR_CONFIG_MOSAIC,
+                                                     output_type=pytesseract.Output.DICT)
+            mosaic_labels, ambiguous = map_mosaic_words(ocr_data, placements, padding)
+        except Exception as e:
+            print(f"Error during mosaic OCR, falling back to per-key OCR: {e}")
+            mosaic_labels, ambiguous = {}, {index for index, *_ in placements}
+
+        for index, text in mosaic_labels.items():
+            labels[index] = text
+        for index in ambiguous:
+            labels[index] = ocr_key_roi(thresholded_rois[index])
+            stats["fallbacks"] += 1
+        instrumentation.count("ocr.mosaic_fallbacks", len(ambiguous))
+    return labels, stats
+
+
+def contour_bounding_rects(contours):
+    """
+    Vectorized equivalent of [cv2.boundingRect(c) for c in contours].
+
+    All contour points are stacked once and reduced per contour with np.minimum/maximum.reduceat.
+
+    Returns:
+        numpy.ndarray: int64 array of shape (N, 4) with (x, y, w, h) per contour.
+    """
+    if len(contours) == 0:
+        return np.zeros((0, 4), dtype=np.int64)
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.int64, count=len(contours))
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+    starts = np.zeros(len(contours), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+
+    x_min = np.minimum.reduceat(points[:, 0], starts)
+    y_min = np.minimum.reduceat(points[:, 1], starts)
+    x_max = np.maximum.reduceat(points[:, 0], starts)
+    y_max = np.maximum.reduceat(points[:, 1], starts)
+    return np.stack([x_min, y_min, x_max - x_min + 1, y_max - y_min + 1], axis=1)
+
+
+def merge_overlapping_rects(rects):
+    """
+    Replaces every group of (transitively) overlapping (x, y, w, h) rects with their union.
+    """
+    rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+    parent = list(range(len(rects)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in zip(*(pairs.tolist() for pairs in overlapping_pairs(rects))):
+        parent[find(a)] = find(b)
+    roots = np.array([find(i) for i in range(len(rects))], dtype=np.int64)
+    merged = []
+    for root in np.unique(roots).tolist():
+        group = rects[roots == root]
+        x0, y0 = group[:, 0].min(), group[:, 1].min()
+        merged.append((x0, y0, (group[:, 0] + group[:, 2]).max() - x0, (group[:, 1] + group[:, 3]).max() - y0))
+    return np.array(merged, dtype=np.int64).reshape(-1, 4)
+
+
+OUTSIDE = -2 # Witness of a component whose top row lies on the ROI border (nothing can enclose it)
+NO_WITNESS = -1 # Top row on an inner tile border: the tile above holds the witness
+
+
+def seam_label_pairs(pieces, columns, offsets, prefix=""):
+    """
+    Finds the labels of neighbouring tiles that meet on a shared seam pixel (see tile_grid).
+
+    Args:
+        pieces (list): Per tile in row-major order, None or a dict holding label arrays (0 = none)
+            on its inner edges under prefix + "left"/"top"/"right"/"bottom".
+        columns (int): Tiles per row.
+        offsets (list): Per tile, the first global node id; a label's node id is offset + label.
+        prefix (str): Edge key prefix ("" for key regions, "bg_" for background).
+
+    Returns:
+        numpy.ndarray: (N, 2) unique pairs of global node ids to join.
+    """
+    first, second = [], []
+    for tile_index, tile_pieces in enumerate(pieces):
+        if tile_pieces is None:
+            continue
+        neighbours = [("right", "left", tile_index + 1)] if (tile_index + 1) % columns else []
+        neighbours.append(("bottom", "top", tile_index + columns))
+        for edge, other_edge, other_index in neighbours:
+            other = pieces[other_index] if other_index < len(pieces) else None
+            if prefix + edge not in tile_pieces or other is None or prefix + other_edge not in other:
+                continue # A neighbour without pieces has nothing on the shared seam either
+            a, b = tile_pieces[prefix + edge], other[prefix + other_edge]
+            both = (a > 0) & (b > 0)
+            first.append(a[both].astype(np.int64) + offsets[tile_index])
+            second.append(b[both].astype(np.int64) + offsets[other_index])
+    if not first:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.stack([np.concatenate(first), np.concatenate(second)], axis=1), axis=0)
+
+
+def union_find(pairs):
+    """
+    Joins the (a, b) node pairs and returns find(node) -> root; nodes never joined are their own root.
+    """
+    parent = {}
+
+    def find(i):
+        parent.setdefault(i, i)
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs.tolist():
+        parent[find(a)] = find(b)
+    return find
+
+
+def stitch_border_pieces(pieces, columns):
+    """
+    Joins the regions that touch inner tile borders into whole-image regions.
+
+    Neighbouring tiles share one pixel column/row (see tile_grid), so two pieces belong to the same
+    8-connected region exactly when their labels meet on a shared seam pixel; every 8-neighbour pair
+    of pixels lies inside a single tile, so nothing connected is missed and nothing else is joined.
+
+    Args:
+        pieces (list): Per tile in row-major order, None or a dict with the tile's component label
+            "rects" (row 0 is the background), its label arrays on the inner "left"/"top"/"right"/"bottom"
+            edges and optionally "witness", the global background node above each label's top row.
+        columns (int): Tiles per row.
+
+    Returns:
+        tuple: (rects, witnesses): (N, 4) bounding rects of the stitched regions and, when the pieces
+            carry witnesses, each region's witness taken from a piece holding its top row (else None).
+    """
+    # Global node id = offset of the tile + its label
+    offsets, total = [], 0
+    for tile_pieces in pieces:
+        offsets.append(total)
+        total += len(tile_pieces["rects"]) if tile_pieces is not None else 0
+
+    pairs = seam_label_pairs(pieces, columns, offsets)
+    if not len(pairs):
+        return np.zeros((0, 4), dtype=np.int64), None
+    find = union_find(pairs)
+    nodes = np.unique(pairs)
+    roots = np.array([find(i) for i in nodes.tolist()], dtype=np.int64)
+    # Tiles without pieces add nothing to the offsets, so node ids index the concatenated arrays directly
+    present = [tile_pieces for tile_pieces in pieces if tile_pieces is not None]
+    order = np.argsort(roots, kind="stable")
+    roots, nodes = roots[order], nodes[order]
+    group_rects = np.concatenate([tile_pieces["rects"] for tile_pieces in present])[nodes]
+    starts = np.flatnonzero(np.concatenate([[True], roots[1:] != roots[:-1]]))
+    x0 = np.minimum.reduceat(group_rects[:, 0], starts)
+    y0 = np.minimum.reduceat(group_rects[:, 1], starts)
+    x1 = np.maximum.reduceat(group_rects[:, 0] + group_rects[:, 2], starts)
+    y1 = np.maximum.reduceat(group_rects[:, 1] + group_rects[:, 3], starts)
+    rects = np.stack([x0, y0, x1 - x0, y1 - y0], axis=1)
+    if "witness" not in present[0]:
+        return rects, None
+
+    # A region's witness comes from a piece whose top row is the region's top row and not a seam
+    group_witness = np.concatenate([tile_pieces["witness"] for tile_pieces in present])[nodes]
+    group_index = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(nodes))))
+    valid = np.flatnonzero((group_rects[:, 1] == y0[group_index]) & (group_witness != NO_WITNESS))
+    witnesses = np.full(len(rects), NO_WITNESS, dtype=np.int64)
+    regions, first = np.unique(group_index[valid], return_index=True)
+    witnesses[regions] = group_witness[valid[first]]
+    return rects, witnesses
+
+
+def clip_roi(roi, image_shape):
+    """
+    Clips an (x, y, w, h) region to the image, returning None when nothing of it is left.
+    """
+    x, y, w, h = (int(v) for v in roi)
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, image_shape[1]), min(y + h, image_shape[0])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def tile_grid(roi, tile_size):
+    """
+    Splits an (x, y, w, h) region into tiles of at most tile_size x tile_size pixels.
+
+    Each tile reaches one pixel into its right and bottom neighbours, so the two pieces of a
+    component cut by a tile border share a pixel column/row and their rects overlap.
+
+    Returns:
+        list: (x0, y0, x1, y1) tiles (exclusive ends) in row-major order.
+    """
+    x, y, w, h = roi
+    tiles = []
+    for ty in range(y, y + h, tile_size):
+        for tx in range(x, x + w, tile_size):
+            tiles.append((tx, ty, min(tx + tile_size + 1, x + w), min(ty + tile_size + 1, y + h)))
+    return tiles
+
+
+def make_key_data(bbox, label_text, row=None, column=None):
+    """
+    Builds the MANUAL_LAYOUT-schema dictionary for one detected key.
+    """
+    x, y, w, h = bbox
+    key_data = {
+        "key_id": f"detected_{x}_{y}_{w}_{h}", # Unique ID based on geometry
+        "label": label_text if label_text else "Unknown",
+        "position": {"x": x, "y": y, "width": w, "height": h},
+        "type": "detected", 
+        "font_color": "#FF0000", # Red text for detected
+        "background_color": "#00FF00", # Green background for detected
+        "group": "detected_group", 
+        "characters": [label_text.lower()] if label_text else ["unknown"]
+    }
+    if row is not None:
+        key_data["row"] = row
+        key_data["column"] = column
+    return key_data
+
+
+def best_overlap_indices(boxes, rects, chunk_size=256):
+    """
+    For each (x, y, w, h) box, the index of the rect with the highest IoU, or -1 when no rect
+    overlaps it. The IoU matrix is built chunk_size boxes at a time.
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    rects = np.asarray(rects, dtype=np.int64).reshape(1, -1, 4)
+    best = np.full(len(boxes), -1, dtype=np.int64)
+    if rects.shape[1] == 0:
+        return best
+    for start in range(0, len(boxes), chunk_size):
+        chunk = boxes[start:start + chunk_size, None, :]
+        iw = np.minimum(chunk[..., 0] + chunk[..., 2], rects[..., 0] + rects[..., 2]) - np.maximum(chunk[..., 0], rects[..., 0])
+        ih = np.minimum(chunk[..., 1] + chunk[..., 3], rects[..., 1] + rects[..., 3]) - np.maximum(chunk[..., 1], rects[..., 1])
+        intersection = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+        union = chunk[..., 2] * chunk[..., 3] + rects[..., 2] * rects[..., 3] - intersection
+        iou = intersection / np.maximum(union, 1)
+        best[start:start + chunk_size] = np.where(iou.max(axis=1) > 0, iou.argmax(axis=1), -1)
+    return best
+
+
+class EncodedImage:
+    def __init__(self, image_bytes):
+        """
+        Encoded image bytes plus their content hash, decoded only when pixels are needed.
+
+        Hashing is much cheaper than decoding, so a detection-cache hit never pays for the decode.
+        KeyDetector.detect_keys_in_image, refine_and_identify_keys, iter_identified_keys and
+        identify_keys_batch accept an EncodedImage wherever they take a decoded image.
+        """
+        self.image_bytes = image_bytes
+        with instrumentation.span("detect.hash"):
+            self.image_hash = hashlib.sha256(image_bytes).hexdigest()
+        self.image = None
+        self.decode_failed = False
+
+    def decode(self):
+        # Decodes on the first call; returns None (and sets decode_failed) for undecodable bytes
+        if self.image is None and not self.decode_failed:
+            with instrumentation.span("detect.decode"):
+                self.image = cv2.imdecode(np.frombuffer(self.image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            self.decode_failed = self.image is None
+        return self.image
+
+
+def decoded_image(image):
+    # Pixels for a decoded image or an EncodedImage (decoding it on first use); None if undecodable
+    return image.decode() if isinstance(image, EncodedImage) else image
+
+
+def image_hash_for(image, image_hash=None):
+    # An explicit hash wins; an EncodedImage carries its own
+    if image_hash is None and isinstance(image, EncodedImage):
+        return image.image_hash
+    return image_hash
+
+
+def pyramid_level_for(image_shape, max_dimension=2000):
+    """
+    Returns the smallest pyramid level at which the image's longer side fits in max_dimension.
+    """
+    level, longest = 0, max(image_shape[:2])
+    while longest > max_dimension:
+        longest /= 2
+        level += 1
+    return level
+
 
 class KeyDetector:
-    def __init__(self):
+    def __init__(self, ocr_mode="serial", ocr_workers=None, ocr_cache=None, detection_cache=None):
         """
         Initializes the KeyDetector.
+
+        Args:
+            ocr_mode (str): How refine_and_identify_keys runs Tesseract: "serial" (one ROI at a time),
+                            "thread" (thread pool; each call is a tesseract subprocess, so threads
+                            parallelize well), "process" (process pool) or "mosaic" (all ROIs tiled
+                            into a few images and read with one call each, see ocr_key_rois_mosaic).
+            ocr_workers (int, optional): Pool size for the "thread"/"process" modes. Defaults to os.cpu_count().
+            ocr_cache (OCRCache, optional): Persistent label cache; ROIs already in it skip Tesseract.
+            detection_cache (DetectionCache, optional): Whole-image result cache for bboxes and identified
+                keys, keyed by image content hash plus detection_params() (and the OCR config for keys).
         """
+        if ocr_mode not in OCR_MODES:
+            raise ValueError(f"Unknown OCR mode '{ocr_mode}'. Expected one of {OCR_MODES}.")
+        self.ocr_mode = ocr_mode
+        self.ocr_workers = ocr_workers
+        self.ocr_cache = ocr_cache
+        self.detection_cache = detection_cache
+        self.mosaic_padding = 20
+        self.last_ocr_stats = {} # Filled by the "mosaic" mode (mosaics, rois, fallbacks)
+
         # Parameters for blurring and thresholding
         self.gaussian_blur_ksize = (5, 5)
         self.adaptive_thresh_block_size = 11
@@ -20,6 +551,106 @@ class KeyDetector:
         self.contour_min_aspect_ratio = 0.2
         self.contour_max_aspect_ratio = 5.0
 
+        # "contours" (external contours, the original behaviour) or "components"
+        # (cv2.connectedComponentsWithStats, faster on very noisy images but also keeps nested regions)
+        self.detection_method = "contours"
+
+        # 0 = detect at full resolution. N > 0 = find candidates at 1/2**N scale with proportionally
+        # scaled thresholds, then refine each candidate at full resolution (see find_key_bboxes_multiscale)
+        self.detection_pyramid_level = 0
+        self.detection_refine_full_res = True # False returns the upscaled candidates as-is (accurate to ~2**N px)
+        self.detection_refine_max_fraction = 0.5 # Above this candidate-window coverage, detect at full resolution
+
+        # 0 = threshold the whole frame at once. N > 0 = process N x N pixel tiles one at a time (or
+        # detection_tile_workers at a time), bounding peak memory; see find_key_bboxes_tiled
+        self.detection_tile_size = 0
+        self.detection_tile_workers = 1
+
+        # Row/column clustering before OCR (see key_clustering.organize_key_boxes)
+        self.cluster_keys = True # False: plain (y, x) sort, every box is OCR'd
+        self.dedupe_iou_threshold = 0.6
+        self.dedupe_containment_threshold = 0.9
+        self.row_gap_factor = 0.5
+        self.outlier_height_range = (0.5, 2.5)
+        self.last_clustering_stats = None
+
+    def detection_params(self):
+        """
+        Returns every parameter that affects detect_keys output, for cache keys and reports.
+        """
+        return {
+            "gaussian_blur_ksize": list(self.gaussian_blur_ksize),
+            "adaptive_thresh_block_size": self.adaptive_thresh_block_size,
+            "adaptive_thresh_c": self.adaptive_thresh_c,
+            "contour_min_area": self.contour_min_area,
+            "contour_max_area": self.contour_max_area,
+            "contour_min_aspect_ratio": self.contour_min_aspect_ratio,
+            "contour_max_aspect_ratio": self.contour_max_aspect_ratio,
+            "detection_method": self.detection_method,
+            "detection_pyramid_level": self.detection_pyramid_level,
+            "detection_refine_full_res": self.detection_refine_full_res,
+            "detection_refine_max_fraction": self.detection_refine_max_fraction,
+            "detection_tile_size": self.detection_tile_size,
+        }
+
+    def clustering_params(self):
+        # Parameters of the row/column stage in refine_and_identify_keys (part of the keys cache key)
+        return {
+            "cluster_keys": self.cluster_keys,
+            "dedupe_iou_threshold": self.dedupe_iou_threshold,
+            "dedupe_containment_threshold": self.dedupe_containment_threshold,
+            "row_gap_factor": self.row_gap_factor,
+            "outlier_height_range": list(self.outlier_height_range),
+        }
+
+    def open_image(self, image_path):
+        """
+        Reads an image file once and hashes its bytes without decoding them (see EncodedImage).
+
+        Args:
+            image_path (str): Path to the keyboard image.
+
+        Returns:
+            EncodedImage: The file's bytes and content hash, or None if the file cannot be read.
+        """
+        try:
+            with instrumentation.span("detect.read"), open(image_path, "rb") as f:
+                image_bytes = f.read()
+        except OSError as e:
+            print(f"Error: Could not read image file {image_path}: {e}")
+            return None
+        return EncodedImage(image_bytes)
+
+    def load_image(self, image_path):
+        """
+        Reads an image file once, returning both the decoded image and a hash of its bytes.
+        Use open_image instead when the detection cache may make decoding unnecessary.
+
+        Args:
+            image_path (str): Path to the keyboard image.
+
+        Returns:
+            tuple: (image_cv, image_hash), or (None, None) if the file cannot be read or decoded.
+        """
+        encoded = self.open_image(image_path)
+        if encoded is None:
+            return None, None
+        if encoded.decode() is None:
+            print(f"Error: Could not load image from {image_path}")
+            return None, None
+        return encoded.image, encoded.image_hash
+
+    def decode_image(self, image_bytes):
+        """
+        Same as load_image for encoded image bytes already in memory (e.g. an upload).
+
+        Returns:
+            tuple: (image_cv, image_hash), or (None, None) if the bytes cannot be decoded.
+        """
+        encoded = EncodedImage(image_bytes)
+        if encoded.decode() is None:
+            return None, None
+        return encoded.image, encoded.image_hash
 
     def detect_keys(self, image_path):
         """
@@ -32,168 +663,619 @@ class KeyDetector:
             list: A list of tuples, where each tuple is (x, y, w, h) for a detected key's bounding box.
                   Returns an empty list if the image cannot be loaded or no keys are found.
         """
-        image = cv2.imread(image_path)
-        if image is None:
+        encoded = self.open_image(image_path)
+        if encoded is None:
+            return []
+        bboxes = self.detect_keys_in_image(encoded) # Decodes only on a detection-cache miss
+        if encoded.decode_failed:
             print(f"Error: Could not load image from {image_path}")
+        return bboxes
+
+    def detect_keys_in_image(self, image, image_hash=None, roi=None):
+        """
+        Same as detect_keys, for an image that is already in memory (see open_image and load_image).
+
+        Args:
+            image: Color image loaded by OpenCV, or an EncodedImage (decoded only on a cache miss).
+            image_hash (str, optional): Content hash from load_image; enables the detection cache.
+                Defaults to the EncodedImage's hash.
+            roi (tuple, optional): (x, y, w, h) region to restrict detection to, e.g. the area around
+                a changed key. Boxes are in full-image coordinates; keys crossing the ROI edge come
+                back clipped to it, so pad the ROI by a key's size when re-detecting.
+
+        Returns:
+            list: A list of (x, y, w, h) tuples (empty if an EncodedImage cannot be decoded).
+        """
+        image_hash = image_hash_for(image, image_hash)
+        if roi is not None:
+            image = decoded_image(image) # Clipping needs the image size
+            if image is None:
+                return []
+            roi = clip_roi(roi, image.shape)
+            if roi is None:
+                return []
+
+        cache_key = None
+        if self.detection_cache is not None and image_hash is not None:
+            cache_params = self.detection_params()
+            if roi is not None:
+                cache_params["roi"] = list(roi)
+            cache_key = make_detection_key("bboxes", image_hash, cache_params)
+            cached_bboxes = self.detection_cache.get(cache_key)
+            if cached_bboxes is not None:
+                instrumentation.count("detect.cache_hits")
+                return [tuple(bbox) for bbox in cached_bboxes]
+            instrumentation.count("detect.cache_misses")
+
+        image = decoded_image(image)
+        if image is None:
             return []
+        with instrumentation.span("detect.find_key_bboxes", width=image.shape[1], height=image.shape[0]):
+            potential_keys_bboxes = self.find_key_bboxes(image, roi)
+        if cache_key is not None:
+            self.detection_cache.put(cache_key, potential_keys_bboxes)
+        return potential_keys_bboxes
 
-        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        blurred_image = cv2.GaussianBlur(gray_image, self.gaussian_blur_ksize, 0)
+    def find_key_bboxes(self, image, roi=None):
+        # Blur, adaptive threshold and contour filtering on a decoded image (no caching)
+        if roi is not None or self.detection_tile_size > 0:
+            return self.find_key_bboxes_tiled(image, roi)
+        if self.detection_pyramid_level > 0:
+            return self.find_key_bboxes_multiscale(image)
+        return self.find_key_bboxes_full_frame(image)
+
+    def find_key_bboxes_full_frame(self, image):
+        # Level-0 detection: one full-resolution pass over the whole image
+        with instrumentation.span("detect.grayscale"):
+            gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        thresholded_image = self.threshold_image(gray_image, self.gaussian_blur_ksize, self.adaptive_thresh_block_size)
+        rects = self.extract_rects(thresholded_image)
+        if rects is None:
+            return []
+        return self.filter_key_rects(rects)
+
+    def threshold_image(self, gray_image, blur_ksize, block_size):
+        with instrumentation.span("detect.blur"):
+            blurred_image = cv2.GaussianBlur(gray_image, blur_ksize, 0) if blur_ksize[0] > 1 else gray_image
         
-        thresholded_image = cv2.adaptiveThreshold(
-            blurred_image, 255, 
-            cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY_INV, 
-            self.adaptive_thresh_block_size, 
-            self.adaptive_thresh_c
-        )
+        with instrumentation.span("detect.threshold"):
+            thresholded_image = cv2.adaptiveThreshold(
+                blurred_image, 255, 
+                cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                cv2.THRESH_BINARY_INV, 
+                block_size, 
+                self.adaptive_thresh_c
+            )
+        return thresholded_image
+
+    @instrumentation.timed("detect.contours")
+    def extract_rects(self, thresholded_image):
+        """
+        Returns an (N, 4) array of candidate (x, y, w, h) rects, or None on an unexpected OpenCV result.
+        """
+        if self.detection_method == "components":
+            # Single C++ pass for all component rects. Unlike RETR_EXTERNAL contours this also reports
+            # regions nested inside holes of other regions, and in raster order.
+            _, _, stats, _ = cv2.connectedComponentsWithStats(thresholded_image, connectivity=8)
+            return stats[1:, :4] # Row 0 is the background
 
         contours_tuple = cv2.findContours(thresholded_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
+
         if len(contours_tuple) == 2: 
             contours = contours_tuple[0]
         elif len(contours_tuple) == 3: 
             contours = contours_tuple[1]
         else:
             print("Error: Unexpected return format from cv2.findContours")
+            return None
+        return contour_bounding_rects(contours)
+
+    def key_rect_mask(self, rects, min_area=None, max_area=None):
+        """
+        Boolean mask of the (N, 4) (x, y, w, h) rects within the area and aspect-ratio bounds.
+
+        Args:
+            rects: Array-like of shape (N, 4).
+            min_area, max_area (optional): Override the configured area bounds (used for downscaled images).
+        """
+        min_area = self.contour_min_area if min_area is None else min_area
+        max_area = self.contour_max_area if max_area is None else max_area
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        w, h = rects[:, 2], rects[:, 3]
+        area = w * h
+        nonzero = (w != 0) & (h != 0)
+        aspect_ratio = np.divide(w, h, out=np.zeros(len(rects)), where=nonzero)
+
+        return (nonzero &
+                (area >= min_area) &
+                (area <= max_area) &
+                (aspect_ratio >= self.contour_min_aspect_ratio) &
+                (aspect_ratio <= self.contour_max_aspect_ratio))
+
+    @instrumentation.timed("detect.filter")
+    def filter_key_rects(self, rects, min_area=None, max_area=None):
+        """
+        Applies the area and aspect-ratio bounds (key_rect_mask) to an (N, 4) array of (x, y, w, h)
+        rects using boolean masks instead of a per-contour Python loop.
+
+        Returns:
+            list: The (x, y, w, h) tuples that pass, in input order.
+        """
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        return [tuple(rect) for rect in rects[self.key_rect_mask(rects, min_area, max_area)].tolist()]
+
+    def find_key_bboxes_multiscale(self, image):
+        """
+        Coarse-to-fine detection: candidates are found on a downscaled pyramid level with the
+        pixel thresholds scaled to match, then refined at full resolution. Overlapping candidate
+        windows (box plus threshold context) are merged into regions on the downscaled grid and
+        each region is thresholded once, so neighbouring keys share one pass.
+
+        The pyramid pays off when keys cover a small part of a large frame (a keyboard photographed
+        on a desk, high-resolution scans): only the candidate regions are processed at full
+        resolution. When the candidate windows cover more than detection_refine_max_fraction of the
+        frame (dense boards), refining would cost as much as level 0, so the image is detected at
+        full resolution instead (find_key_bboxes_full_frame, same boxes as level 0) and the pyramid
+        only adds the downscaled pass (+25-35% over level 0 on the synthetic grid boards). On a
+        keyboard covering 5% of a 6000 x 4000 frame, levels 1 and 2 are 3-6x faster than level 0.
+        detection_refine_full_res = False skips refinement (boxes accurate to ~2**N px). At high
+        levels keys can blur together and be missed, so pick the level with pyramid_level_for.
+
+        Returns:
+            list: Full-resolution (x, y, w, h) tuples without duplicates, in candidate order (level-0
+                order after the full-resolution fallback).
+        """
+        scale = 0.5 ** self.detection_pyramid_level
+        image_h, image_w = image.shape[:2]
+        factor = 2 ** self.detection_pyramid_level
+        with instrumentation.span("detect.pyramid_resize", level=self.detection_pyramid_level):
+            # Gray first, and cropped to a multiple of the factor: INTER_AREA has a fast path for
+            # integer ratios, and the < factor px dropped at the right/bottom edge hold no key
+            small_h, small_w = max(image_h // factor, 1), max(image_w // factor, 1)
+            gray = cv2.cvtColor(image[:small_h * factor, :small_w * factor], cv2.COLOR_BGR2GRAY)
+            gray_small = cv2.resize(gray, (small_w, small_h), interpolation=cv2.INTER_AREA)
+
+        # Scale the pixel thresholds; kernel and block sizes must stay odd (block size >= 3)
+        blur = max(int(round(self.gaussian_blur_ksize[0] * scale)) | 1, 1)
+        block_size = max(int(round(self.adaptive_thresh_block_size * scale)) | 1, 3)
+        rects = self.extract_rects(self.threshold_image(gray_small, (blur, blur), block_size))
+        if rects is None:
             return []
+        candidates = np.array(self.filter_key_rects(rects, self.contour_min_area * scale * scale,
+                                                    self.contour_max_area * scale * scale), dtype=np.int64).reshape(-1, 4)
 
-        potential_keys_bboxes = []
-        for contour in contours:
-            x, y, w, h = cv2.boundingRect(contour)
-            
-            if w == 0 or h == 0:
-                continue
+        # Candidates in full-resolution coordinates
+        boxes = np.empty_like(candidates)
+        boxes[:, :2] = candidates[:, :2] / scale
+        boxes[:, 2:] = np.ceil(candidates[:, 2:] / scale)
+        boxes[:, 2] = np.minimum(boxes[:, 2], image_w - boxes[:, 0])
+        boxes[:, 3] = np.minimum(boxes[:, 3], image_h - boxes[:, 1])
 
-            area = w * h
-            aspect_ratio = w / h 
+        if self.detection_refine_full_res and len(boxes):
+            # Mark every candidate window on the downscaled grid (within the candidates' bounds); the
+            # mask's connected components are the regions
+            margin = int(np.ceil(2 / scale)) + self.adaptive_thresh_block_size # Covers rounding plus threshold context
+            small_margin = int(np.ceil(margin * scale))
+            ox, oy = max(int(candidates[:, 0].min()) - small_margin, 0), max(int(candidates[:, 1].min()) - small_margin, 0)
+            window_mask = np.zeros((int((candidates[:, 1] + candidates[:, 3]).max()) + small_margin - oy,
+                                    int((candidates[:, 0] + candidates[:, 2]).max()) + small_margin - ox), dtype=np.uint8)
+            for cx, cy, cw, ch in (candidates - np.array([ox, oy, 0, 0])).tolist():
+                window_mask[max(cy - small_margin, 0):cy + ch + small_margin, max(cx - small_margin, 0):cx + cw + small_margin] = 1
+            if np.count_nonzero(window_mask) > self.detection_refine_max_fraction * small_h * small_w:
+                with instrumentation.span("detect.refine_full_frame", candidates=len(candidates)):
+                    return self.find_key_bboxes_full_frame(image)
 
-            if (area >= self.contour_min_area and
-                area <= self.contour_max_area and
-                aspect_ratio >= self.contour_min_aspect_ratio and
-                aspect_ratio <= self.contour_max_aspect_ratio):
-                potential_keys_bboxes.append((x, y, w, h))
-        
-        return potential_keys_bboxes
+            _, labels, stats, _ = cv2.connectedComponentsWithStats(window_mask, connectivity=4)
+            stats[:, 0] += ox
+            stats[:, 1] += oy
+            candidate_regions = labels[candidates[:, 1] - oy, candidates[:, 0] - ox]
+            refined = boxes.copy()
+            for region, (sx, sy, sw, sh) in enumerate(stats[1:, :4].tolist(), start=1):
+                x, y = int(sx / scale), int(sy / scale)
+                w, h = min(int(np.ceil((sx + sw) / scale)), image_w) - x, min(int(np.ceil((sy + sh) / scale)), image_h) - y
+                members = np.flatnonzero(candidate_regions == region)
+                with instrumentation.span("detect.refine_region", width=w, height=h, candidates=len(members)):
+                    gray_crop = cv2.cvtColor(image[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY)
+                    crop_rects = self.extract_rects(self.threshold_image(gray_crop, self.gaussian_blur_ksize, self.adaptive_thresh_block_size))
+                    matches = np.array(self.filter_key_rects(crop_rects) if crop_rects is not None else [],
+                                       dtype=np.int64).reshape(-1, 4) + np.array([x, y, 0, 0])
+                # The full-resolution box that overlaps each candidate most; the scaled box otherwise
+                best = best_overlap_indices(boxes[members], matches)
+                found = best >= 0
+                refined[members[found]] = matches[best[found]]
+            boxes = refined
 
-    def refine_and_identify_keys(self, image_cv, bboxes):
+        refined_bboxes, seen = [], set()
+        for bbox in map(tuple, boxes.tolist()):
+            if bbox not in seen:
+                seen.add(bbox)
+                refined_bboxes.append(bbox)
+        return refined_bboxes
+
+    def find_key_bboxes_tiled(self, image, roi=None):
         """
-        Refines detected bounding boxes using heuristics (sorting, simplified row clustering)
-        and performs OCR on each ROI to identify key labels.
+        Full-resolution detection over tiles of detection_tile_size pixels (the whole ROI is one tile
+        when the size is 0), so only one tile's gray/blurred/thresholded intermediates are alive per
+        worker instead of full-frame ones.
+
+        Each tile is thresholded with enough surrounding context for the blur and adaptive threshold
+        windows, so its binary image matches the full-frame one. Regions touching an inner tile border
+        are stitched with their continuations in the neighbouring tiles (see stitch_border_pieces).
+        For "contours", a region is kept only if it is outside every other region's outline, as with
+        RETR_EXTERNAL: the 4-connected background just above its top row (its witness) must reach the
+        ROI border, with background components stitched across the seams the same way. Nesting thus
+        follows the real outlines, not bounding boxes, and the result equals find_key_bboxes for any
+        tile size (benchmark_suite checks the sample, synthetic boards, concave shapes and noise).
+
+        An ROI is treated like the image border: outlines it cuts open are not known to enclose
+        anything, so keys inside a keyboard frame the ROI crosses are reported even though full-frame
+        "contours" detection would not report them.
 
         Args:
-            image_cv: The original color image loaded by OpenCV.
+            image: Color image loaded by OpenCV.
+            roi (tuple, optional): (x, y, w, h) already clipped to the image; defaults to the whole image.
+
+        Returns:
+            list: (x, y, w, h) tuples in full-image coordinates, in tile order.
+        """
+        image_h, image_w = image.shape[:2]
+        roi = (0, 0, image_w, image_h) if roi is None else roi
+        rx, ry, rw, rh = roi
+        tile_size = self.detection_tile_size or max(rw, rh)
+        context = self.adaptive_thresh_block_size // 2 + self.gaussian_blur_ksize[0] // 2 + 1
+        tiles = tile_grid(roi, tile_size)
+
+        def detect_tile(tile):
+            x0, y0, x1, y1 = tile
+            cx0, cy0 = max(x0 - context, 0), max(y0 - context, 0)
+            cx1, cy1 = min(x1 + context, image_w), min(y1 + context, image_h)
+            with instrumentation.span("detect.tile", width=x1 - x0, height=y1 - y0):
+                gray_crop = cv2.cvtColor(image[cy0:cy1, cx0:cx1], cv2.COLOR_BGR2GRAY)
+                thresholded = self.threshold_image(gray_crop, self.gaussian_blur_ksize, self.adaptive_thresh_block_size)
+                binary = np.ascontiguousarray(thresholded[y0 - cy0:y1 - cy0, x0 - cx0:x1 - cx0])
+                if len(tiles) == 1:
+                    rects = self.extract_rects(binary)
+                    rects = np.zeros((0, 4), dtype=np.int64) if rects is None else rects
+                    return np.asarray(rects, dtype=np.int64).reshape(-1, 4) + np.array([x0, y0, 0, 0]), None
+                # Component labels (not contours) are needed to link regions across the seams
+                _, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+            rects = stats[:, :4].astype(np.int64) + np.array([x0, y0, 0, 0]) # Row 0 is the background
+
+            # Touching a tile border that is not the ROI border means the region may continue next door
+            inner_edges = {"left": x0 > rx, "top": y0 > ry, "right": x1 < rx + rw, "bottom": y1 < ry + rh}
+            on_border = (((rects[:, 0] == x0) & inner_edges["left"]) |
+                         ((rects[:, 1] == y0) & inner_edges["top"]) |
+                         ((rects[:, 0] + rects[:, 2] == x1) & inner_edges["right"]) |
+                         ((rects[:, 1] + rects[:, 3] == y1) & inner_edges["bottom"]))
+            on_border[0] = False
+            local = self.key_rect_mask(rects) & ~on_border
+            local[0] = False
+            if not contours and not on_border.any():
+                return rects[local], None
+
+            pieces = {name: edge.copy() for name, edge in
+                      (("left", labels[:, 0]), ("top", labels[0, :]), ("right", labels[:, -1]), ("bottom", labels[-1, :]))
+                      if inner_edges[name]}
+            pieces["rects"] = rects
+            if not contours:
+                return rects[local], pieces
+
+            # RETR_EXTERNAL only reports regions outside every other region's outline, i.e. regions whose
+            # surrounding background reaches the ROI border. The pixel above a region's top row is in that
+            # background, so it is the region's witness; background is linked across tiles like regions
+            with instrumentation.span("detect.tile_background"):
+                bg_count, bg_labels = cv2.connectedComponents((binary == 0).view(np.uint8), connectivity=4)
+            bg_edges = {"left": bg_labels[:, 0], "top": bg_labels[0, :], "right": bg_labels[:, -1], "bottom": bg_labels[-1, :]}
+            pieces.update(("bg_" + name, edge.copy()) for name, edge in bg_edges.items() if inner_edges[name])
+            pieces["bg_count"] = bg_count
+            pieces["bg_outside"] = np.unique(np.concatenate(
+                [edge for name, edge in bg_edges.items() if not inner_edges[name]] + [np.zeros(0, dtype=np.int32)]))
+            witness = np.full(len(rects), NO_WITNESS, dtype=np.int64)
+            for label in np.flatnonzero(local | on_border).tolist():
+                left, top, width = stats[label, 0], stats[label, 1], stats[label, 2]
+                if top == 0:
+                    witness[label] = NO_WITNESS if inner_edges["top"] else OUTSIDE
+                else:
+                    x = left + int(np.argmax(labels[top, left:left + width] == label))
+                    witness[label] = bg_labels[top - 1, x]
+            pieces["witness"] = witness
+            pieces["local"] = np.flatnonzero(local)
+            return np.zeros((0, 4), dtype=np.int64), pieces
+
+        contours = self.detection_method == "contours"
+        if self.detection_tile_workers > 1 and len(tiles) > 1:
+            # OpenCV releases the GIL, so threads overlap; peak memory grows with the worker count
+            with ThreadPoolExecutor(max_workers=self.detection_tile_workers) as executor:
+                results = list(executor.map(detect_tile, tiles))
+        else:
+            results = [detect_tile(tile) for tile in tiles]
+
+        rects = np.concatenate([tile_rects for tile_rects, _ in results])
+        pieces = [tile_pieces for _, tile_pieces in results]
+        if not any(tile_pieces is not None for tile_pieces in pieces):
+            return self.filter_key_rects(rects)
+
+        columns = len(range(rx, rx + rw, tile_size))
+        with instrumentation.span("detect.tile_stitch"):
+            if contours:
+                # Global background node id = tile offset + label; nodes linked to the ROI border are outside
+                bg_offsets = np.cumsum([0] + [tile_pieces["bg_count"] for tile_pieces in pieces[:-1]]).tolist()
+                find = union_find(seam_label_pairs(pieces, columns, bg_offsets, "bg_"))
+                outside = {find(label + offset) for tile_pieces, offset in zip(pieces, bg_offsets)
+                           for label in tile_pieces["bg_outside"].tolist() if label > 0}
+                for tile_pieces, offset in zip(pieces, bg_offsets):
+                    witness = tile_pieces["witness"]
+                    tile_pieces["witness"] = np.where(witness > 0, witness + offset, witness)
+
+                def is_outside(witnesses):
+                    return np.array([w == OUTSIDE or (w >= 0 and find(w) in outside) for w in witnesses.tolist()], dtype=bool)
+
+                local_rects = [tile_pieces["rects"][tile_pieces["local"]][is_outside(tile_pieces["witness"][tile_pieces["local"]])]
+                               for tile_pieces in pieces]
+                rects = np.concatenate(local_rects)
+
+            stitched, witnesses = stitch_border_pieces(pieces, columns)
+            if contours and len(stitched):
+                stitched = stitched[is_outside(witnesses)]
+        return self.filter_key_rects(np.concatenate([rects, stitched]))
+
+    def create_ocr_executor(self):
+        """
+        Returns a new executor for the configured OCR mode, or None for the serial mode.
+        """
+        workers = self.ocr_workers or os.cpu_count() or 1
+        if self.ocr_mode == "thread":
+            return ThreadPoolExecutor(max_workers=workers)
+        if self.ocr_mode == "process":
+            return ProcessPoolExecutor(max_workers=workers)
+        return None
+
+    def ocr_cache_config(self):
+        # Cache entries are only valid for the OCR settings that produced them
+        if self.ocr_mode == "mosaic":
+            return f"mosaic|{self.mosaic_padding}|{OCR_CONFIG_MOSAIC}|{OCR_CONFIG_PSM10}|{OCR_CONFIG_PSM7}"
+        return f"{OCR_CONFIG_PSM10}|{OCR_CONFIG_PSM7}"
+
+    def iter_ocr_labels(self, thresholded_rois, executor=None):
+        """
+        Yields the OCR label for each ROI, in input order.
+
+        With an ocr_cache, cached ROIs are answered from it and only misses are sent to Tesseract;
+        new results are written back as they arrive, except failures (None, OCR_FAILED), which are
+        retried on the next run.
+        """
+        if self.ocr_cache is None:
+            yield from self.run_ocr(thresholded_rois, executor)
+            return
+
+        config = self.ocr_cache_config()
+        cache_keys = [OCRCache.make_key(roi, config) for roi in thresholded_rois]
+        cached_labels = self.ocr_cache.get_many(cache_keys)
+        misses = sum(1 for label in cached_labels if label is None)
+        instrumentation.count("ocr.cache_hits", len(cached_labels) - misses)
+        instrumentation.count("ocr.cache_misses", misses)
+        fresh_labels = self.run_ocr(
+            [roi for roi, label in zip(thresholded_rois, cached_labels) if label is None], executor)
+        try:
+            for cache_key, label in zip(cache_keys, cached_labels):
+                if label is None:
+                    label = next(fresh_labels)
+                    if label is not None and label != OCR_FAILED: # Failures are not cached
+                        self.ocr_cache.put(cache_key, label)
+                yield label
+        finally:
+            self.ocr_cache.flush()
+
+    def run_ocr(self, thresholded_rois, executor=None):
+        """
+        Yields ocr_key_roi results for each ROI, in input order, using the configured OCR mode.
+
+        With an executor all ROIs are submitted at once and results are yielded as soon as the
+        next one in order is ready.
+        """
+        if self.ocr_mode == "mosaic":
+            labels, self.last_ocr_stats = ocr_key_rois_mosaic(thresholded_rois, padding=self.mosaic_padding)
+            yield from labels
+            return
+
+        if executor is None:
+            for thresholded_roi in thresholded_rois:
+                yield ocr_key_roi(thresholded_roi)
+            return
+
+        futures = [executor.submit(ocr_key_roi, thresholded_roi) for thresholded_roi in thresholded_rois]
+        for future in futures:
+            yield future.result()
+
+    def refine_and_identify_keys(self, image_cv, bboxes, progress_callback=None, cancel_check=None, image_hash=None):
+        """
+        Refines detected bounding boxes (duplicate/nested box removal, outlier removal and
+        row/column clustering, see cluster_keys) and performs OCR on each ROI to identify key labels.
+        Keys get "row" and "column" indices when clustering is enabled.
+
+        Args:
+            image_cv: The original color image loaded by OpenCV, or an EncodedImage (decoded only on
+                a cache miss). May be None when image_hash is given and the keys are cached.
             bboxes (list): The raw list of (x, y, w, h) from detect_keys.
+            progress_callback (callable, optional): Called as progress_callback(done, total, key_data)
+                after each bbox is processed. key_data is None for skipped ROIs.
+            cancel_check (callable, optional): Polled before each ROI; when it returns True the loop
+                stops and the keys identified so far are returned.
+            image_hash (str, optional): Content hash from load_image; enables the detection cache.
 
         Returns:
             list: A list of dictionaries, where each dictionary represents an identified key.
         """
-        if image_cv is None:
+        if image_cv is None and image_hash is None:
             print("Error: Input image_cv is None in refine_and_identify_keys.")
             return []
         if not bboxes:
             print("No bounding boxes provided to refine_and_identify_keys.")
             return []
+        return list(self.iter_identified_keys(image_cv, bboxes, progress_callback, cancel_check, image_hash))
 
-        # Sort bboxes by y-coordinate primarily, then x-coordinate
-        bboxes.sort(key=lambda b: (b[1], b[0]))
+    def keys_cache_key(self, image_hash, bboxes):
+        # Detection-cache key for the identified keys of one image, or None when caching is off
+        if self.detection_cache is None or image_hash is None:
+            return None
+        cache_params = dict(self.detection_params(), **self.clustering_params(), ocr=self.ocr_cache_config(),
+                            bboxes=sorted(list(b) for b in bboxes))
+        return make_detection_key("keys", image_hash, cache_params)
 
-        identified_keys = []
-        
-        # Simplified row clustering and processing (basic example, more robust logic could be added)
-        # For this implementation, we'll process them in sorted order, which approximates row-by-row.
-        # A more complex clustering could group by y-coordinate similarity.
-        # Let's calculate an average key height from the first few bboxes for row delta.
-        # This is a very rough heuristic.
-        avg_height_sample = [b[3] for b in bboxes[:min(len(bboxes), 5)] if b[3] > 0]
-        average_key_height = np.mean(avg_height_sample) if avg_height_sample else 30 # Fallback
-        
-        current_row_y_start = -1
-        y_delta_threshold = average_key_height * 0.7 # Allow some variance in y for a row
+    def prepare_rois(self, image_cv, bboxes):
+        """
+        Orders the boxes for OCR (row/column clustering, see cluster_keys) and thresholds each ROI.
 
-        for i, bbox in enumerate(bboxes):
-            x, y, w, h = bbox
+        Returns:
+            tuple: (organized, thresholded_rois) where organized is a list of (bbox, row, column)
+                and thresholded_rois holds the matching ROI (None for empty ones).
+        """
+        if self.cluster_keys:
+            # Dedupe nested/overlapping boxes, drop outliers and assign rows/columns, so fewer ROIs reach OCR
+            with instrumentation.span("refine.cluster", boxes=len(bboxes)):
+                organized, self.last_clustering_stats = organize_key_boxes(
+                    bboxes, self.dedupe_iou_threshold, self.dedupe_containment_threshold,
+                    self.row_gap_factor, self.outlier_height_range)
+        else:
+            # Sort bboxes by y-coordinate primarily, then x-coordinate
+            organized = [(tuple(b), None, None) for b in sorted(bboxes, key=lambda b: (b[1], b[0]))]
+            self.last_clustering_stats = None
 
-            if y > current_row_y_start + y_delta_threshold : # Simple new row detection
-                 current_row_y_start = y
-            # Further row-based processing could occur here if needed.
+        # Preprocess every ROI up front (cheap), so OCR can be fanned out to a pool in one go
+        thresholded_rois = [preprocess_key_roi(image_cv, bbox) for bbox, _, _ in organized]
+        return organized, thresholded_rois
+
+    def identify_keys_batch(self, images):
+        """
+        refine_and_identify_keys for several images at once: the ROIs of all images go through
+        one OCR pass (one pool, or shared mosaics in the "mosaic" mode) instead of one per image.
 
-            # Extract ROI from the original color image
-            roi = image_cv[y:y+h, x:x+w]
+        Args:
+            images (list): (image_cv, bboxes, image_hash) tuples as in refine_and_identify_keys;
+                image_cv may be an EncodedImage and image_hash may be None.
 
-            if roi.size == 0: # Check if ROI is empty
-                print(f"Warning: Empty ROI at x={x}, y={y}, w={w}, h={h}. Skipping.")
+        Returns:
+            list: One list of key dictionaries per input image, in input order.
+        """
+        results = [None] * len(images)
+        pending = [] # (image index, organized, thresholded_rois, cache_key)
+        for index, (image_cv, bboxes, image_hash) in enumerate(images):
+            results[index] = []
+            if not bboxes:
+                continue
+            cache_key = self.keys_cache_key(image_hash_for(image_cv, image_hash), bboxes)
+            cached_keys = self.detection_cache.get(cache_key) if cache_key is not None else None
+            if cached_keys is not None:
+                instrumentation.count("refine.cache_hits")
+                results[index] = cached_keys
                 continue
+            image_cv = decoded_image(image_cv)
+            if image_cv is None:
+                continue
+            organized, thresholded_rois = self.prepare_rois(image_cv, bboxes)
+            pending.append((index, organized, thresholded_rois, cache_key))
 
-            # Preprocess ROI for OCR
-            gray_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            # Apply Otsu's thresholding
-            _, thresholded_roi = cv2.threshold(gray_roi, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU) # Invert for white text on black bg if needed
-                                                                                                    # Or THRESH_BINARY if black text on white.
-                                                                                                    # For typical keyboard images (dark text on light keys),
-                                                                                                    # THRESH_BINARY or THRESH_BINARY_INV + bitwise_not might be better.
-                                                                                                    # Let's assume keys are lighter than text, so THRESH_BINARY_INV
-            
-            # Optional: Invert if text is white on dark keys (common for some keyboard designs)
-            # if np.mean(gray_roi) < 128: # Heuristic for dark background
-            #    thresholded_roi = cv2.bitwise_not(thresholded_roi)
+        all_rois = [roi for _, _, rois, _ in pending for roi in rois if roi is not None]
+        if not all_rois:
+            for index, _, _, _ in pending:
+                results[index] = []
+            return results
 
+        executor = self.create_ocr_executor()
+        try:
+            with instrumentation.span("refine.batch_ocr", images=len(pending), rois=len(all_rois)):
+                labels = iter(list(self.iter_ocr_labels(all_rois, executor)))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
 
-            # Convert processed ROI to PIL Image
-            try:
-                pil_image = Image.fromarray(thresholded_roi)
-            except Exception as e:
-                print(f"Error converting ROI to PIL Image: {e}. ROI shape: {thresholded_roi.shape}, dtype: {thresholded_roi.dtype}")
-                continue
+        for index, organized, thresholded_rois, cache_key in pending:
+            keys, ocr_failed = [], False
+            for (bbox, row, column), roi in zip(organized, thresholded_rois):
+                label_text = next(labels) if roi is not None else None
+                if label_text == OCR_FAILED: # Kept as "Unknown", but the layout must not be cached
+                    ocr_failed, label_text = True, ""
+                if label_text is not None:
+                    keys.append(make_key_data(bbox, label_text, row, column))
+            if cache_key is not None and not ocr_failed:
+                self.detection_cache.put(cache_key, keys)
+            results[index] = keys
+        return results
 
+    def iter_identified_keys(self, image_cv, bboxes, progress_callback=None, cancel_check=None, image_hash=None):
+        """
+        Streaming variant of refine_and_identify_keys: yields each key dictionary as soon as its
+        OCR finishes (in row-major order), without building the full list.
 
-            # Perform OCR
-            # PSM 6: Assume a single uniform block of text.
-            # PSM 7: Treat the image as a single text line.
-            # PSM 10: Treat the image as a single character. (Often good for single keycaps)
-            # Let's try PSM 10 for individual keys, or PSM 7 if that's too restrictive.
-            # PSM 6 is often better for blocks of text.
-            ocr_config = r'--oem 3 --psm 10 -c tessedit_char_whitelist=0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ`~!@#$%^&*()-_=+[]{};:\'",<.>/?\| '
-            try:
-                label_text = pytesseract.image_to_string(pil_image, config=ocr_config).strip()
-            except pytesseract.TesseractError as e:
-                print(f"Pytesseract error during OCR: {e}")
-                label_text = ""
-            except Exception as e: # Catch any other pytesseract/PIL issues
-                print(f"Unexpected error during OCR: {e}")
-                label_text = ""
-
-
-            # Clean up common OCR misinterpretations for single characters or typical key labels
-            if len(label_text) > 3 and label_text not in ["Shift", "Enter", "Space", "Ctrl", "Alt", "Tab", "Caps", "Backspace"]: # Arbitrary length for 'too long'
-                # If it's a long string and not a known multi-char key, maybe it's noise.
-                # Or, try a different PSM mode if PSM 10 is too restrictive.
-                # For now, we'll just take it or leave it based on PSM 10.
-                pass 
-            
-            # If label_text is empty, maybe try PSM 7
-            if not label_text:
-                try:
-                    ocr_config_psm7 = r'--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ`~!@#$%^&*()-_=+[]{};:\'",<.>/?\| '
-                    label_text = pytesseract.image_to_string(pil_image, config=ocr_config_psm7).strip()
-                except: # Ignore errors on retry
-                    pass
-
-
-            key_data = {
-                "key_id": f"detected_{x}_{y}_{w}_{h}", # Unique ID based on geometry
-                "label": label_text if label_text else "Unknown",
-                "position": {"x": x, "y": y, "width": w, "height": h},
-                "type": "detected", 
-                "font_color": "#FF0000", # Red text for detected
-                "background_color": "#00FF00", # Green background for detected
-                "group": "detected_group", 
-                "characters": [label_text.lower()] if label_text else ["unknown"]
-            }
-            identified_keys.append(key_data)
-            
-        return identified_keys
+        Takes the same arguments as refine_and_identify_keys. Stopping iteration early behaves
+        like cancel_check: pending OCR work is cancelled and nothing is cached. Keys whose OCR
+        failed are yielded as "Unknown", and the layout is then not cached either.
+
+        Yields:
+            dict: One identified key in the MANUAL_LAYOUT schema.
+        """
+        if not bboxes:
+            return
+
+        cache_key = self.keys_cache_key(image_hash_for(image_cv, image_hash), bboxes)
+        if cache_key is not None:
+            cached_keys = self.detection_cache.get(cache_key)
+            if cached_keys is not None:
+                instrumentation.count("refine.cache_hits")
+                for i, key_data in enumerate(cached_keys):
+                    if progress_callback is not None:
+                        progress_callback(i + 1, len(cached_keys), key_data)
+                    yield key_data
+                return
+
+        image_cv = decoded_image(image_cv) # Pixels are only needed on a cache miss
+        if image_cv is None:
+            print("Error: No decodable image for iter_identified_keys and no cached keys.")
+            return
+
+        identified_keys = [] # Only kept when the result is going to be cached
+        cancelled = ocr_failed = False
+
+        organized, thresholded_rois = self.prepare_rois(image_cv, bboxes)
+        bboxes = [bbox for bbox, _, _ in organized]
+
+        executor = self.create_ocr_executor()
+        try:
+            label_results = self.iter_ocr_labels([roi for roi in thresholded_rois if roi is not None], executor)
+
+            for i, bbox in enumerate(bboxes):
+                if cancel_check is not None and cancel_check():
+                    print(f"Key identification cancelled after {i} of {len(bboxes)} ROIs.")
+                    cancelled = True
+                    break
+
+                _, row, column = organized[i]
+
+                if thresholded_rois[i] is None:
+                    label_text = None
+                else:
+                    with instrumentation.span("refine.wait_for_label"): # Time the loop blocks on OCR
+                        label_text = next(label_results) # Results arrive in bbox order regardless of the OCR mode
+                if label_text == OCR_FAILED:
+                    ocr_failed, label_text = True, ""
+                if label_text is None: # Empty ROI or PIL conversion failure, already reported
+                    if progress_callback is not None:
+                        progress_callback(i + 1, len(bboxes), None)
+                    continue
+
+                key_data = make_key_data(bbox, label_text, row, column)
+                if cache_key is not None:
+                    identified_keys.append(key_data)
+                if progress_callback is not None:
+                    progress_callback(i + 1, len(bboxes), key_data)
+                yield key_data
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        # Partial results (cancelled, or the consumer stopped iterating) and OCR failures are never cached
+        if cache_key is not None and not cancelled and not ocr_failed:
+            self.detection_cache.put(cache_key, identified_keys)
 
 
 if __name__ == '__main__':
@@ -205,22 +1287,23 @@ if __name__ == '__main__':
         print(f"Test image '{image_file}' not found. Skipping direct test run.")
     else:
         print(f"Attempting to detect keys in image: {image_file}")
-        # First, get raw bounding boxes
-        raw_bboxes = detector.detect_keys(image_file)
+        # Read and hash once; both stages decode the same EncodedImage at most once
+        image_cv = detector.open_image(image_file)
+        raw_bboxes = detector.detect_keys_in_image(image_cv) if image_cv is not None else []
         print(f"detect_keys found {len(raw_bboxes)} raw bounding boxes.")
 
         if raw_bboxes:
-            # Load the image in OpenCV format for refine_and_identify_keys
-            image_cv_for_ocr = cv2.imread(image_file)
-            if image_cv_for_ocr is None:
-                print(f"Error: Could not re-load image {image_file} for OCR.")
-            else:
-                print("Running refine_and_identify_keys...")
-                identified_keys_list = detector.refine_and_identify_keys(image_cv_for_ocr, raw_bboxes)
-                print(f"refine_and_identify_keys processed {len(identified_keys_list)} keys:")
-                for i, key_info in enumerate(identified_keys_list):
-                    print(f"  {i+1}: Label='{key_info['label']}', Pos={key_info['position']}")
+            print("Running refine_and_identify_keys...")
+            identified_keys_list = detector.refine_and_identify_keys(image_cv, raw_bboxes)
+            print(f"refine_and_identify_keys processed {len(identified_keys_list)} keys:")
+            for i, key_info in enumerate(identified_keys_list):
+                print(f"  {i+1}: Label='{key_info['label']}', Pos={key_info['position']}")
         else:
             print("No raw bounding boxes found, skipping refine_and_identify_keys.")
+
+    if instrumentation.enabled: # KEYBOARD_SIMULATOR_PROFILE=1
+        print("\nTimings:")
+        for line in instrumentation.summary_lines():
+            print(f"  {line}")
             
     print("\nKeyDetector direct test finished.")
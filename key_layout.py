@@ -0,0 +1,225 @@
+import numpy as np
+
+from character_index import CharacterIndex
+
+ARRAY_FIELDS = {"key_id", "label", "position", "type", "font_color", "background_color", "group", "characters"}
+DEFAULT_FONT_COLOR = "#000000"
+DEFAULT_BACKGROUND_COLOR = "#FFFFFF"
+
+
+def parse_hex_color(color):
+    """
+    Parses "#RGB", "#RRGGBB" or "#AARRGGBB" (QColor's conventions) into a packed 0xAARRGGBB int,
+    the same layout as Qt's QRgb, so QColor.fromRgba() can use it directly.
+
+    Returns:
+        int: Packed color, or None if the string is not a hex color (e.g. an SVG color name).
+    """
+    if not isinstance(color, str) or not color.startswith("#"):
+        return None
+    digits = color[1:]
+    try:
+        value = int(digits, 16)
+    except ValueError:
+        return None
+    if len(digits) == 3:
+        r, g, b = (value >> 8) & 0xF, (value >> 4) & 0xF, value & 0xF
+        return 0xFF000000 | (r * 17) << 16 | (g * 17) << 8 | (b * 17)
+    if len(digits) == 6:
+        return 0xFF000000 | value
+    if len(digits) == 8:
+        return value
+    return None
+
+
+class KeyLayout:
+    def __init__(self):
+        """
+        Compact, array-backed key layout.
+
+        Geometry is an int32 (N, 4) array of (x, y, width, height); colors are pre-parsed packed
+        0xAARRGGBB uint32 values; ids, labels and the remaining fields are parallel lists. Lookups
+        by key_id are O(1). Use from_dicts()/to_dicts() to convert losslessly from/to the
+        MANUAL_LAYOUT dict schema (field order, missing fields and extra fields are preserved).
+        """
+        self.geometry = np.zeros((0, 4), dtype=np.int32)
+        self.font_rgba = np.zeros(0, dtype=np.uint32)
+        self.background_rgba = np.zeros(0, dtype=np.uint32)
+        self.key_ids = []
+        self.labels = []
+        self.types = []
+        self.groups = []
+        self.characters = [] # Tuples
+        self.font_colors = [] # Original strings, None if the field was absent
+        self.background_colors = []
+        self.extras = [] # dict of non-standard fields per key, or None
+        self.field_orders = [] # Interned tuples of field names, shared between keys
+        self._field_order_index = {}
+        self._indices_by_id = {}
+        self._character_index = None # CharacterIndex, built on first use and kept in sync afterwards
+
+    @classmethod
+    def from_dicts(cls, layout):
+        key_layout = cls()
+        key_layout.extend(layout)
+        return key_layout
+
+    def __len__(self):
+        return len(self.key_ids)
+
+    def __getitem__(self, index):
+        return self.to_dict(index)
+
+    def __iter__(self):
+        return (self.to_dict(i) for i in range(len(self)))
+
+    def _intern_field_order(self, key_data):
+        order = tuple(key_data.keys())
+        if order not in self._field_order_index:
+            self._field_order_index[order] = order
+        return self._field_order_index[order]
+
+    def _unpack(self, key_data):
+        if not isinstance(key_data, dict):
+            raise ValueError(f"Key entry must be an object, got {type(key_data).__name__}")
+        pos = key_data.get("position")
+        if not isinstance(pos, dict):
+            raise ValueError(f"Key {key_data.get('key_id')!r} has no position object")
+        font_color = key_data.get("font_color")
+        background_color = key_data.get("background_color")
+        font_rgba = parse_hex_color(font_color if font_color is not None else DEFAULT_FONT_COLOR)
+        background_rgba = parse_hex_color(background_color if background_color is not None else DEFAULT_BACKGROUND_COLOR)
+        extras = {k: v for k, v in key_data.items() if k not in ARRAY_FIELDS}
+        if list(pos.keys()) != ["x", "y", "width", "height"] or any(type(v) is not int for v in pos.values()):
+            extras["position"] = dict(pos) # Geometry array holds the int32 view; the original is kept verbatim
+        if "characters" in key_data and not isinstance(key_data["characters"], list):
+            extras["characters"] = key_data["characters"]
+        return (
+            (int(pos["x"]), int(pos["y"]), int(pos["width"]), int(pos["height"])),
+            font_rgba if font_rgba is not None else 0xFF000000,
+            background_rgba if background_rgba is not None else 0xFFFFFFFF,
+            {
+                "key_id": key_data.get("key_id"),
+                "label": key_data.get("label"),
+                "type": key_data.get("type"),
+                "group": key_data.get("group"),
+                "characters": tuple(key_data["characters"]) if "characters" in key_data else None,
+                "font_color": font_color,
+                "background_color": background_color,
+                "extras": extras or None,
+                "field_order": self._intern_field_order(key_data),
+            },
+        )
+
+    def _store_fields(self, index, fields):
+        self.key_ids[index] = fields["key_id"]
+        self.labels[index] = fields["label"]
+        self.types[index] = fields["type"]
+        self.groups[index] = fields["group"]
+        self.characters[index] = fields["characters"]
+        self.font_colors[index] = fields["font_color"]
+        self.background_colors[index] = fields["background_color"]
+        self.extras[index] = fields["extras"]
+        self.field_orders[index] = fields["field_order"]
+
+    def extend(self, layout):
+        """
+        Appends key dictionaries (MANUAL_LAYOUT schema).
+        """
+        unpacked = [self._unpack(key_data) for key_data in layout]
+        if not unpacked:
+            return
+        start = len(self)
+        self.geometry = np.concatenate([self.geometry, np.array([u[0] for u in unpacked], dtype=np.int32)])
+        self.font_rgba = np.concatenate([self.font_rgba, np.array([u[1] for u in unpacked], dtype=np.uint32)])
+        self.background_rgba = np.concatenate([self.background_rgba, np.array([u[2] for u in unpacked], dtype=np.uint32)])
+        for column in (self.key_ids, self.labels, self.types, self.groups, self.characters,
+                       self.font_colors, self.background_colors, self.extras, self.field_orders):
+            column.extend([None] * len(unpacked))
+        for offset, (_, _, _, fields) in enumerate(unpacked):
+            self._store_fields(start + offset, fields)
+            self._indices_by_id.setdefault(fields["key_id"], []).append(start + offset)
+            if self._character_index is not None:
+                self._character_index.add_key(start + offset, fields["characters"])
+
+    def rebuild_indexes(self):
+        """
+        Recomputes the key_id lookup and field-order interning; call after filling the parallel
+        columns directly (e.g. when loading a binary layout).
+        """
+        self._field_order_index = {}
+        self.field_orders = [self._field_order_index.setdefault(order, order) for order in self.field_orders]
+        self._indices_by_id = {}
+        for index, key_id in enumerate(self.key_ids):
+            self._indices_by_id.setdefault(key_id, []).append(index)
+        self._character_index = None
+
+    def append(self, key_data):
+        self.extend([key_data])
+
+    def replace(self, index, key_data):
+        """
+        Replaces the key at index in place, keeping the key_id lookup in sync.
+        """
+        geometry, font_rgba, background_rgba, fields = self._unpack(key_data)
+        old_id = self.key_ids[index]
+        self.geometry[index] = geometry
+        self.font_rgba[index] = font_rgba
+        self.background_rgba[index] = background_rgba
+        self._store_fields(index, fields)
+        if old_id != fields["key_id"]:
+            self._indices_by_id[old_id].remove(index)
+            if not self._indices_by_id[old_id]:
+                del self._indices_by_id[old_id]
+            indices = self._indices_by_id.setdefault(fields["key_id"], [])
+            indices.append(index)
+            indices.sort()
+        if self._character_index is not None:
+            self._character_index.replace_key(index, fields["characters"])
+
+    def character_index(self):
+        """
+        Returns the CharacterIndex (character -> key and modifiers) for this layout. It is built
+        once and updated incrementally by extend()/append()/replace().
+        """
+        if self._character_index is None:
+            self._character_index = CharacterIndex(self)
+        return self._character_index
+
+    def index_of(self, key_id):
+        """
+        Returns the index of the first key with this key_id, or -1.
+        """
+        indices = self._indices_by_id.get(key_id)
+        return indices[0] if indices else -1
+
+    def indices_of(self, key_id):
+        return self._indices_by_id.get(key_id, [])
+
+    def rect(self, index):
+        x, y, w, h = self.geometry[index].tolist()
+        return x, y, w, h
+
+    def to_dict(self, index):
+        """
+        Rebuilds the original dictionary for one key (same fields, values and field order).
+        """
+        x, y, w, h = self.geometry[index].tolist()
+        values = {
+            "key_id": self.key_ids[index],
+            "label": self.labels[index],
+            "position": {"x": x, "y": y, "width": w, "height": h},
+            "type": self.types[index],
+            "font_color": self.font_colors[index],
+            "background_color": self.background_colors[index],
+            "group": self.groups[index],
+            "characters": list(self.characters[index]) if self.characters[index] is not None else None,
+        }
+        extras = self.extras[index] or {}
+        key_data = {field: extras[field] if field in extras else values[field] for field in self.field_orders[index]}
+        if "position" in extras:
+            key_data["position"] = dict(extras["position"])
+        return key_data
+
+    def to_dicts(self):
+        return [self.to_dict(i) for i in range(len(self))]
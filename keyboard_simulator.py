@@ -1,11 +1,14 @@
 import sys
 import json # Added for JSON export
 import os # Added for os.path.exists
-import cv2 # Added for loading image for OCR
+import time # Press-feedback deadlines
+STARTUP_TIME = time.perf_counter() # Reference point for --measure-startup (taken before the heavy imports)
+import argparse
+import importlib.util
 
-from PyQt6.QtWidgets import QApplication, QMainWindow, QStatusBar, QMenuBar, QMenu, QLabel, QFileDialog, QMessageBox # Added QMessageBox
-from PyQt6.QtGui import QAction, QPixmap, QPainter, QColor, QFont # QRect is from QtCore
-from PyQt6.QtCore import Qt, QRect, QPoint, QTimer # Added QPoint, QTimer. QRect was already here.
+from PyQt6.QtWidgets import QApplication, QMainWindow, QStatusBar, QLabel, QFileDialog, QMessageBox, QStyle, QInputDialog # Added QMessageBox
+from PyQt6.QtGui import QAction, QPixmap, QPainter # QRect is from QtCore
+from PyQt6.QtCore import Qt, QRect, QPoint, QTimer, QThread, pyqtSignal # Added QPoint, QTimer. QRect was already here.
 
 # Attempt to import the layout; handle if not found
 try:
@@ -14,17 +17,87 @@ except ImportError:
     MANUAL_LAYOUT = [] # Default to empty list if not found
     print("Warning: manual_keyboard_layout.py not found or MANUAL_LAYOUT not defined. Initial layout will be empty.")
 
-# Attempt to import KeyDetector; handle if not found
-try:
-    from key_detector import KeyDetector
-except ImportError:
-    KeyDetector = None # Placeholder if not found
-    print("Warning: key_detector.py not found or KeyDetector class not defined. Detection features will be unavailable.")
+# The detection stack (key_detector -> cv2, pytesseract, PIL) is most of the import time, so it is
+# imported on first use (or by the background warm-up) instead of here. The caches are stdlib-only.
+from ocr_cache import OCRCache
+from detection_cache import DetectionCache
+
+DETECTION_MODULES = ("key_detector", "cv2", "pytesseract", "PIL")
+_key_detector_module = None # key_detector once imported, False if the import failed
+
+def detection_available():
+    # Cheap check that the detection stack is installed, without importing it
+    return _key_detector_module is not False and all(importlib.util.find_spec(name) is not None for name in DETECTION_MODULES)
+
+def load_key_detector():
+    """
+    Imports key_detector on first call (safe from any thread) and returns the KeyDetector class,
+    or None if the detection stack can't be imported.
+    """
+    global _key_detector_module
+    if _key_detector_module is None:
+        try:
+            import key_detector
+            _key_detector_module = key_detector
+        except ImportError as e:
+            _key_detector_module = False
+            print(f"Warning: key_detector could not be imported ({e}). Detection features will be unavailable.")
+    return _key_detector_module.KeyDetector if _key_detector_module else None
+
+from layout_index import LayoutIndex # Grid index for key hit-testing
+from key_layout import KeyLayout # Array-backed view of current_layout for drawing and hit-testing
+from binary_layout import save_layout_binary, load_key_layout_binary, BINARY_LAYOUT_EXTENSION # .kbl export/import
+from layout_io import atomic_output_path, save_layout_json_atomic, load_keys_ndjson # Atomic layout writes
+from typing_replay import ReplayEngine, text_to_events, load_keystroke_log # Typing replay on the display
+from instrumentation import instrumentation # Timing spans/counters, no-ops unless enabled
+from overlay_renderer import build_key_style, paint_key, pressed_highlight_color # Key drawing shared with headless previews
+
+DEFAULT_AUTOSAVE_PATH = os.path.join(os.path.expanduser("~"), ".keyboard_simulator", "autosave_layout.json")
+AUTOSAVE_DELAY_MS = 1000 # Layout changes within this window are written once
+PRESS_FEEDBACK_SECONDS = 0.2 # How long a clicked key stays highlighted
+FRAME_INTERVAL_MS = 16 # Press-state changes are applied (and repainted) at most once per frame
+STARTUP_REPORT_TIMEOUT_MS = 30000 # --measure-startup gives up (and exits non-zero) if nothing is reported by then
 
 class KeyboardDisplayLabel(QLabel):
+    first_painted = pyqtSignal() # Emitted once, after the first paint of the keyboard pixmap
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_window = parent # To call MainWindow methods
+        self.display_pixmap = None # Painted directly so key presses only repaint their dirty rect
+        self.has_painted = False
+
+    def set_display_pixmap(self, pixmap):
+        # Unlike setPixmap(), no copy is kept, so MainWindow can patch the pixmap in place
+        self.display_pixmap = pixmap
+        self.updateGeometry()
+        self.update()
+
+    def pixmap_offset(self):
+        # Same placement QLabel uses for its own pixmap
+        return QStyle.alignedRect(self.layoutDirection(), self.alignment(),
+                                  self.display_pixmap.size(), self.contentsRect()).topLeft()
+
+    def update_pixmap_rect(self, rect: QRect):
+        if self.display_pixmap is not None:
+            self.update(rect.translated(self.pixmap_offset()))
+
+    def sizeHint(self):
+        if self.display_pixmap is not None:
+            return self.display_pixmap.size()
+        return super().sizeHint()
+
+    def paintEvent(self, event):
+        if self.display_pixmap is None:
+            super().paintEvent(event)
+            return
+        painter = QPainter(self)
+        target = event.rect()
+        painter.drawPixmap(target, self.display_pixmap, target.translated(-self.pixmap_offset()))
+        painter.end()
+        if not self.has_painted:
+            self.has_painted = True
+            self.first_painted.emit()
 
     def mousePressEvent(self, event):
         if self.parent_window:
@@ -33,15 +106,182 @@ class KeyboardDisplayLabel(QLabel):
         super().mousePressEvent(event)
 
 
+class KeyDetectionWorker(QThread):
+    # Runs detect_keys + refine_and_identify_keys off the GUI thread
+    stage_changed = pyqtSignal(str)
+    progress = pyqtSignal(int, int) # (processed ROIs, total ROIs)
+    key_identified = pyqtSignal(object) # Key dict, emitted as soon as each key's OCR finishes
+    detection_finished = pyqtSignal(object, bool) # (identified keys list, cancelled); object keeps dicts unconverted
+    detection_failed = pyqtSignal(str)
+    image_loaded = pyqtSignal(object) # Decoded image, kept by MainWindow as the base for the next incremental run
+    incremental_report = pyqtSignal(object) # Stats dict from redetect_changed_keys
+
+    def __init__(self, image_path, ocr_cache=None, detection_cache=None, previous_image=None, previous_layout=None,
+                 parent=None):
+        super().__init__(parent)
+        self.image_path = image_path
+        self.ocr_cache = ocr_cache
+        self.detection_cache = detection_cache
+        self.previous_image = previous_image # Set (with previous_layout) to only re-detect changed regions
+        self.previous_layout = previous_layout
+
+    def run(self):
+        KeyDetector = load_key_detector() # Imported here on the first run unless the warm-up already did
+        if KeyDetector is None:
+            self.detection_failed.emit("KeyDetector module is not available.")
+            return
+        detector = KeyDetector(ocr_mode="thread", ocr_cache=self.ocr_cache, # Tesseract runs as subprocesses, so threads parallelize OCR
+                               detection_cache=self.detection_cache)
+        self.stage_changed.emit(f"Running advanced key detection on {self.image_path}...")
+
+        # Load image with OpenCV once; both stages reuse it and its content hash
+        image_cv, image_hash = detector.load_image(self.image_path)
+        if image_cv is None:
+            self.detection_failed.emit(f"Error: Could not load {self.image_path} with OpenCV for detection.")
+            return
+        self.image_loaded.emit(image_cv)
+
+        if self.previous_image is not None:
+            from incremental_detection import redetect_changed_keys # The detection stack is loaded by now
+            self.stage_changed.emit(f"Comparing {self.image_path} with the previously detected image...")
+            layout, stats = redetect_changed_keys(
+                detector, self.previous_image, image_cv, self.previous_layout, image_hash,
+                progress_callback=self.report_progress,
+                cancel_check=self.isInterruptionRequested,
+            )
+            self.incremental_report.emit(stats)
+            self.detection_finished.emit(layout, self.isInterruptionRequested())
+            return
+
+        raw_bboxes = detector.detect_keys_in_image(image_cv, image_hash)
+        if self.isInterruptionRequested():
+            self.detection_finished.emit([], True)
+            return
+        if not raw_bboxes:
+            self.detection_failed.emit("No initial key regions found by detect_keys.")
+            return
+
+        print(f"Initial detection found {len(raw_bboxes)} raw bounding boxes.")
+        self.stage_changed.emit(f"Initial detection found {len(raw_bboxes)} raw boxes. Refining with OCR...")
+
+        identified_keys_list = detector.refine_and_identify_keys(
+            image_cv, raw_bboxes,
+            progress_callback=self.report_progress,
+            cancel_check=self.isInterruptionRequested,
+            image_hash=image_hash,
+        )
+        self.detection_finished.emit(identified_keys_list, self.isInterruptionRequested())
+
+    def report_progress(self, done, total, key_data):
+        if key_data is not None:
+            self.key_identified.emit(key_data)
+        self.progress.emit(done, total)
+
+
+class LayoutSaveWorker(QThread):
+    # Writes a layout snapshot off the GUI thread through a temp file + rename (JSON or .kbl)
+    saved = pyqtSignal(str, int, float) # (path, size written, seconds)
+    save_failed = pyqtSignal(str)
+
+    def __init__(self, layout, path, binary=False, parent=None):
+        super().__init__(parent)
+        self.layout = layout # list of key dicts, or a KeyLayout for binary exports; never mutated
+        self.path = path
+        self.binary = binary
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            if self.binary:
+                with atomic_output_path(self.path) as temp_path:
+                    size = save_layout_binary(self.layout, temp_path)
+            else:
+                size = save_layout_json_atomic(self.layout, self.path)
+        except Exception as e: # Nothing was replaced; the previous file is intact
+            self.save_failed.emit(f"Error exporting layout to {self.path}: {e}")
+            return
+        self.saved.emit(self.path, size, time.perf_counter() - start)
+
+
+class LayoutLoadWorker(QThread):
+    # Parses a layout file and builds its KeyLayout off the GUI thread
+    loaded = pyqtSignal(object, object, str) # (layout dicts, KeyLayout, path)
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+
+    def run(self):
+        try:
+            if self.path.lower().endswith(BINARY_LAYOUT_EXTENSION):
+                key_layout = load_key_layout_binary(self.path) # Memory-mapped; no JSON parsing of the key table
+                layout = key_layout.to_dicts()
+            else:
+                if self.path.lower().endswith(".ndjson"):
+                    layout = load_keys_ndjson(self.path)
+                else:
+                    with open(self.path) as f:
+                        layout = json.load(f)
+                key_layout = KeyLayout.from_dicts(layout)
+        except Exception as e: # Untrusted file: any failure must reach the GUI, not abort the process
+            self.load_failed.emit(f"Error importing layout: {e}")
+            return
+        self.loaded.emit(layout, key_layout, self.path)
+
+
+class DetectionWarmupWorker(QThread):
+    # Imports the detection stack in the background so the first detection run starts immediately
+    def run(self):
+        load_key_detector()
+
+
 class MainWindow(QMainWindow):
 
-    def __init__(self):
+    def __init__(self, warmup=True):
         super().__init__()
+        self.warmup_enabled = warmup # Import the detection stack in the background after the first paint
+        self.warmup_worker = None
+        self.startup_marks = {} # name -> seconds since STARTUP_TIME, see mark_startup()
+        self.startup_report_callback = None # Set by --measure-startup
+        self.detection_loaded_at_first_paint = None # Unknown until the first paint
+        self.image_load_error = None # Set when Keyboard_white.jpg can't be loaded (no first paint will follow)
 
         self.setWindowTitle("High-Fidelity Keyboard Simulator")
         self.current_layout = list(MANUAL_LAYOUT) # Load initial layout
-        self.pressed_keys_visual_feedback = [] # For visual feedback on click
+        self.key_layout = KeyLayout.from_dicts(self.current_layout) # Rebuilt whenever current_layout changes
+        self.layout_index = LayoutIndex(self.key_layout)
+        self.pressed_keys_visual_feedback = [] # Keys currently drawn pressed (held keys + unexpired clicks)
+        self.held_keys = {} # key_id -> None for keys held down by press_key() (insertion-ordered)
+        self.press_deadlines = {} # key_id -> time.monotonic() at which a click highlight expires
+        self.rollover_limit = None # Max simultaneously held keys (None = N-key rollover)
+        self.frame_timer = QTimer(self) # Single frame tick that applies all pending press-state changes
+        self.frame_timer.setInterval(FRAME_INTERVAL_MS)
+        self.frame_timer.timeout.connect(self.frame_tick)
+        self.overlay_pixmap = None # Cached base image + un-pressed overlays, see build_overlay_cache()
+        self.pressed_color = pressed_highlight_color() # Semi-transparent orange
+        self.key_styles = [] # Pre-built QColor/QFont per key, parallel to current_layout
         self.last_clicked_key_id = None # Store ID of last clicked key
+        self.detection_worker = None # KeyDetectionWorker while a detection run is in progress
+        self.ocr_cache = None # OCRCache, opened on first detection run
+        self.detection_cache = None # DetectionCache, opened on first detection run
+        self.detection_base_image = None # Image current_layout was detected on; enables incremental re-detection
+        self.pending_detection_image = None # Image of the running/last detection, until its layout is applied
+        self.last_incremental_stats = None # Stats of the last incremental run, None after a full run
+        self.replay_engine = None # ReplayEngine while a typing replay is running
+        self.layout_save_workers = set() # Running export LayoutSaveWorkers (kept referenced until finished)
+        self.layout_load_worker = None # LayoutLoadWorker while an import is running
+        self.autosave_path = DEFAULT_AUTOSAVE_PATH
+        self.autosave_worker = None # LayoutSaveWorker of the running autosave
+        self.autosave_pending = False # The layout changed again while autosave_worker was writing
+        self.autosave_timer = QTimer(self) # Debounce: restarted on every layout change
+        self.autosave_timer.setSingleShot(True)
+        self.autosave_timer.setInterval(AUTOSAVE_DELAY_MS)
+        self.autosave_timer.timeout.connect(self.autosave_layout)
+        self.replay_timer = QTimer(self) # Re-armed for each next due event
+        self.replay_timer.setSingleShot(True)
+        self.replay_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.replay_timer.timeout.connect(self.replay_tick)
 
         # Create Status Bar first
         self.setStatusBar(QStatusBar(self))
@@ -59,6 +299,17 @@ class MainWindow(QMainWindow):
         export_layout_action = QAction("Export Key Layout (JSON)", self)
         export_layout_action.triggered.connect(self.export_key_layout_json)
         file_menu.addAction(export_layout_action)
+        export_binary_action = QAction("Export Key Layout (Binary)", self)
+        export_binary_action.triggered.connect(self.export_key_layout_binary)
+        file_menu.addAction(export_binary_action)
+        import_layout_action = QAction("Import Key Layout...", self)
+        import_layout_action.triggered.connect(self.import_key_layout)
+        file_menu.addAction(import_layout_action)
+        self.autosave_action = QAction("Autosave Layout", self)
+        self.autosave_action.setCheckable(True)
+        self.autosave_action.setToolTip(f"Write the layout to {self.autosave_path} shortly after each change.")
+        self.autosave_action.toggled.connect(self.toggle_autosave)
+        file_menu.addAction(self.autosave_action)
         file_menu.addSeparator() 
         exit_action = QAction("Exit", self)
         exit_action.triggered.connect(self.close)
@@ -67,21 +318,62 @@ class MainWindow(QMainWindow):
         # Tools Menu
         tools_menu = menu_bar.addMenu("Tools")
         self.run_detection_action = QAction("Run Advanced Key Detection", self) 
-        if KeyDetector is None: 
+        if not detection_available(): 
             self.run_detection_action.setEnabled(False)
             self.run_detection_action.setToolTip("KeyDetector module not loaded. Detection unavailable.")
         self.run_detection_action.triggered.connect(self.run_advanced_key_detection) 
         tools_menu.addAction(self.run_detection_action)
+        self.cancel_detection_action = QAction("Cancel Key Detection", self)
+        self.cancel_detection_action.setEnabled(False) # Only enabled while a detection run is active
+        self.cancel_detection_action.triggered.connect(self.cancel_advanced_key_detection)
+        tools_menu.addAction(self.cancel_detection_action)
+        self.incremental_detection_action = QAction("Incremental Re-detection", self)
+        self.incremental_detection_action.setCheckable(True)
+        self.incremental_detection_action.setChecked(True)
+        self.incremental_detection_action.setToolTip(
+            "Only re-detect keys in regions of the image that changed since the applied detected layout.")
+        tools_menu.addAction(self.incremental_detection_action)
+        clear_ocr_cache_action = QAction("Clear OCR and Detection Caches", self)
+        clear_ocr_cache_action.triggered.connect(self.clear_ocr_cache)
+        tools_menu.addAction(clear_ocr_cache_action)
+        tools_menu.addSeparator()
+        replay_text_action = QAction("Replay Typing...", self)
+        replay_text_action.triggered.connect(self.replay_typing_text)
+        tools_menu.addAction(replay_text_action)
+        replay_log_action = QAction("Replay Keystroke Log...", self)
+        replay_log_action.triggered.connect(self.replay_keystroke_log)
+        tools_menu.addAction(replay_log_action)
+        self.stop_replay_action = QAction("Stop Typing Replay", self)
+        self.stop_replay_action.setEnabled(False)
+        self.stop_replay_action.triggered.connect(self.stop_typing_replay)
+        tools_menu.addAction(self.stop_replay_action)
+        tools_menu.addSeparator()
+        instrumentation_menu = tools_menu.addMenu("Instrumentation")
+        self.instrumentation_action = QAction("Enable Instrumentation", self)
+        self.instrumentation_action.setCheckable(True)
+        self.instrumentation_action.setChecked(instrumentation.enabled)
+        self.instrumentation_action.toggled.connect(self.toggle_instrumentation)
+        instrumentation_menu.addAction(self.instrumentation_action)
+        export_stats_action = QAction("Export Timing Histograms (JSON)...", self)
+        export_stats_action.triggered.connect(self.export_instrumentation_json)
+        instrumentation_menu.addAction(export_stats_action)
+        export_trace_action = QAction("Export Chrome Trace...", self)
+        export_trace_action.triggered.connect(self.export_instrumentation_trace)
+        instrumentation_menu.addAction(export_trace_action)
+        reset_instrumentation_action = QAction("Reset Instrumentation", self)
+        reset_instrumentation_action.triggered.connect(instrumentation.reset)
+        instrumentation_menu.addAction(reset_instrumentation_action)
 
         # Image Loading and Display
         self.image_label = KeyboardDisplayLabel(self) # Use custom QLabel subclass
+        self.image_label.first_painted.connect(self.handle_first_paint)
         self.base_pixmap = QPixmap("Keyboard_white.jpg") # Store original pixmap
 
         if self.base_pixmap.isNull():
             self.handle_image_load_error()
         else:
             self.pixmap = self.base_pixmap.copy() # Working pixmap for drawing
-            self.image_label.setPixmap(self.pixmap)
+            self.image_label.set_display_pixmap(self.pixmap)
             self.setCentralWidget(self.image_label)
             self.setFixedSize(self.pixmap.width(), self.pixmap.height())
             self.statusBar().showMessage(f"Image loaded: Keyboard_white.jpg ({self.pixmap.width()}x{self.pixmap.height()})")
@@ -91,6 +383,7 @@ class MainWindow(QMainWindow):
         error_message = "Error: Could not load image 'Keyboard_white.jpg'."
         self.statusBar().showMessage(error_message)
         print(error_message)
+        self.image_load_error = error_message
         self.setFixedSize(600, 400) # Default size if image fails
         self.image_label.setText(error_message) # Display error on the label
         self.setCentralWidget(self.image_label)
@@ -98,59 +391,109 @@ class MainWindow(QMainWindow):
             self.run_detection_action.setEnabled(False)
             self.run_detection_action.setToolTip("Image 'Keyboard_white.jpg' not loaded. Detection unavailable.")
 
+    def mark_startup(self, name):
+        self.startup_marks[name] = time.perf_counter() - STARTUP_TIME
+
+    def handle_first_paint(self):
+        self.mark_startup("first_paint")
+        self.detection_loaded_at_first_paint = "cv2" in sys.modules
+        if self.warmup_enabled and _key_detector_module is None and detection_available():
+            self.warmup_worker = DetectionWarmupWorker(self)
+            self.warmup_worker.finished.connect(self.detection_warmup_finished)
+            self.warmup_worker.start(QThread.Priority.LowPriority)
+        self.check_startup_report()
+
+    def detection_warmup_finished(self):
+        self.mark_startup("detection_warmed_up")
+        self.warmup_worker.deleteLater()
+        self.warmup_worker = None
+        self.check_startup_report()
+
+    def check_startup_report(self, error=None):
+        # --measure-startup: report once the first paint happened and any warm-up has finished,
+        # or right away with an error when startup can't get there
+        if self.startup_report_callback is not None and (error is not None or self.warmup_worker is None):
+            callback, self.startup_report_callback = self.startup_report_callback, None
+            callback(dict(self.startup_marks), error)
+
+    def invalidate_overlay_cache(self):
+        # Call when current_layout or base_pixmap changes; press/release never invalidates
+        self.overlay_pixmap = None
+
+    def build_key_style(self, key_layout, index):
+        # Same drawing rules as the headless preview renderer
+        return build_key_style(key_layout, index, self.pressed_color)
+
+    def paint_key(self, painter, style, pressed):
+        paint_key(painter, style, pressed)
+
+    @instrumentation.timed("gui.build_overlay_cache")
+    def build_overlay_cache(self):
+        # Render the un-pressed overlay once per layout/base image; presses only patch their own rect
+        self.key_styles = [self.build_key_style(self.key_layout, i) for i in range(len(self.key_layout))]
+
+        self.overlay_pixmap = self.base_pixmap.copy()
+        painter = QPainter(self.overlay_pixmap)
+        for style in self.key_styles:
+            self.paint_key(painter, style, pressed=False)
+        painter.end()
+
+    def repaint_key_rect(self, painter, rect: QRect):
+        # Restore one dirty rect. If no pressed key touches it, the cached overlay is already correct;
+        # otherwise redraw every key overlapping it, in layout order, on top of the base image.
+        overlapping = self.layout_index.keys_in_rect(rect.x(), rect.y(), rect.width(), rect.height())
+        pressed = [self.key_layout.key_ids[i] in self.pressed_keys_visual_feedback for i in overlapping]
+
+        painter.save()
+        painter.setClipRect(rect)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        painter.drawPixmap(rect, self.base_pixmap if any(pressed) else self.overlay_pixmap, rect)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+        if any(pressed):
+            for i, is_pressed in zip(overlapping, pressed):
+                self.paint_key(painter, self.key_styles[i], is_pressed)
+        painter.restore()
+
+    @instrumentation.timed("gui.draw_key_overlays")
     def draw_key_overlays(self):
         if self.base_pixmap.isNull(): # Check base_pixmap as self.pixmap might be a copy
             self.statusBar().showMessage("Cannot draw overlays: Base pixmap is not loaded.")
             return
 
-        # Make a fresh copy from the base image to draw on
-        self.pixmap = self.base_pixmap.copy()
-        
-        painter = QPainter(self.pixmap)
+        if self.overlay_pixmap is None:
+            self.build_overlay_cache()
 
-        if not self.current_layout:
-            # self.statusBar().showMessage("No layout data to draw.") # Can be noisy
+        # Start from the cached un-pressed overlay and patch in any pressed keys
+        self.pixmap = self.overlay_pixmap.copy()
+        if self.pressed_keys_visual_feedback:
+            painter = QPainter(self.pixmap)
+            for key_id in self.pressed_keys_visual_feedback:
+                for i in self.key_layout.indices_of(key_id):
+                    self.repaint_key_rect(painter, self.key_styles[i]["rect"])
             painter.end()
-            self.image_label.setPixmap(self.pixmap) # Show clean image if no layout
+        self.image_label.set_display_pixmap(self.pixmap) # Update display
+
+    @instrumentation.timed("gui.set_pressed_keys")
+    def set_pressed_keys(self, key_ids):
+        # Repaint only the rects of keys whose pressed state actually changed
+        changed = set(self.pressed_keys_visual_feedback).symmetric_difference(key_ids)
+        self.pressed_keys_visual_feedback = list(key_ids)
+        if self.base_pixmap.isNull() or not changed:
+            return
+        if self.overlay_pixmap is None:
+            self.draw_key_overlays()
             return
-        
-        # Status bar message can be part of the calling function if needed, to avoid repetition
-        # self.statusBar().showMessage(f"Drawing {len(self.current_layout)} key overlays...")
-        for key_data in self.current_layout:
-            pos = key_data["position"]
-            label_text = key_data["label"]
-            font_color_hex = key_data.get("font_color", "#000000") 
-            bg_color_hex = key_data.get("background_color", "#FFFFFF")
-            key_id = key_data.get("key_id", "")
-
-            key_rect = QRect(pos['x'], pos['y'], pos['width'], pos['height'])
-
-            # Determine background color based on press feedback
-            if key_id in self.pressed_keys_visual_feedback:
-                final_bg_color = QColor("#FFA500") # Orange highlight
-                final_bg_color.setAlpha(150) # Semi-transparent highlight
-            else:
-                final_bg_color = QColor(bg_color_hex)
-                final_bg_color.setAlpha(128) # Default alpha for normal state
-            
-            painter.fillRect(key_rect, final_bg_color)
-
-            # Text drawing
-            font_color = QColor(font_color_hex)
-            painter.setPen(font_color)
-            
-            font = QFont("SF Pro Rounded", -1)
-            font.setPointSizeF(pos['height'] * 0.35) 
-            if font.pointSizeF() < 6:
-                font.setPointSizeF(6)
-            painter.setFont(font)
-            
-            painter.drawText(key_rect, Qt.AlignmentFlag.AlignCenter, label_text)
 
+        painter = QPainter(self.pixmap)
+        dirty_rects = []
+        for key_id in changed:
+            for i in self.key_layout.indices_of(key_id):
+                rect = self.key_styles[i]["rect"]
+                self.repaint_key_rect(painter, rect)
+                dirty_rects.append(rect)
         painter.end()
-        self.image_label.setPixmap(self.pixmap) # Update display
-        # self.statusBar().showMessage("Key overlays drawn successfully.") # Can be noisy if called often
-
+        for rect in dirty_rects:
+            self.image_label.update_pixmap_rect(rect)
 
         # Note: Initial call to setFixedSize(800,600) or set_initial_size is removed.
         # The size is now determined by the image or a default if image loading fails.
@@ -160,9 +503,16 @@ class MainWindow(QMainWindow):
     # def set_initial_size(self, width, height):
     #     self.resize(width, height)
 
-    # Override closeEvent if further customization is needed
-    # def closeEvent(self, event):
-    #     event.ignore() 
+    def set_current_layout(self, layout, key_layout=None):
+        # Single entry point for replacing the layout so derived state (hit-test index) stays in sync.
+        # key_layout can be passed when it was already built (e.g. loaded from a .kbl file).
+        self.current_layout = layout
+        self.key_layout = key_layout if key_layout is not None else KeyLayout.from_dicts(layout)
+        self.layout_index = LayoutIndex(self.key_layout)
+        self.invalidate_overlay_cache()
+        self.draw_key_overlays()
+        if self.autosave_action.isChecked():
+            self.autosave_timer.start() # Restarting the single-shot timer coalesces bursts of changes
 
     def export_key_layout_json(self):
         if not self.current_layout: # Use self.current_layout now
@@ -177,51 +527,263 @@ class MainWindow(QMainWindow):
             self.statusBar().showMessage("Export cancelled.")
             return
 
+        # current_layout is only ever replaced, never mutated, so the worker can serialize it as-is
+        self.start_layout_save(self.current_layout, file_path)
+
+    def export_key_layout_binary(self):
+        if not self.current_layout:
+            self.statusBar().showMessage("No key layout data available to export.")
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Key Layout (Binary)", "keyboard_layout" + BINARY_LAYOUT_EXTENSION,
+            f"Binary key layouts (*{BINARY_LAYOUT_EXTENSION});;All Files (*)"
+        )
+
+        if not file_path:
+            self.statusBar().showMessage("Export cancelled.")
+            return
+
+        self.start_layout_save(self.key_layout, file_path, binary=True)
+
+    def start_layout_save(self, layout, file_path, binary=False):
+        worker = LayoutSaveWorker(layout, file_path, binary, self)
+        worker.saved.connect(lambda path, size, seconds: self.statusBar().showMessage(
+            f"Key layout exported to {path} ({size} bytes in {seconds * 1000:.0f} ms)"))
+        worker.save_failed.connect(self.handle_export_error)
+        worker.finished.connect(lambda: self.layout_save_worker_stopped(worker))
+        self.layout_save_workers.add(worker)
+        self.statusBar().showMessage(f"Exporting key layout to {file_path}...")
+        worker.start()
+
+    def layout_save_worker_stopped(self, worker):
+        self.layout_save_workers.discard(worker)
+        worker.deleteLater()
+
+    def toggle_autosave(self, enabled):
+        if enabled:
+            self.autosave_timer.start()
+            self.statusBar().showMessage(f"Autosaving the layout to {self.autosave_path}")
+        else:
+            self.autosave_timer.stop()
+            self.autosave_pending = False
+
+    def autosave_layout(self):
+        if self.autosave_worker is not None: # Write again once the running save finishes
+            self.autosave_pending = True
+            return
         try:
-            with open(file_path, 'w') as f:
-                json.dump(self.current_layout, f, indent=4) # Use self.current_layout
-            self.statusBar().showMessage(f"Key layout exported to {file_path}")
+            os.makedirs(os.path.dirname(self.autosave_path), exist_ok=True)
+        except OSError as e:
+            self.handle_export_error(f"Autosave failed: {e}")
+            return
+        self.autosave_worker = LayoutSaveWorker(self.current_layout, self.autosave_path, parent=self)
+        self.autosave_worker.save_failed.connect(self.handle_export_error)
+        self.autosave_worker.finished.connect(self.autosave_worker_stopped)
+        self.autosave_worker.start()
+
+    def autosave_worker_stopped(self):
+        self.autosave_worker.deleteLater()
+        self.autosave_worker = None
+        if self.autosave_pending and self.autosave_action.isChecked():
+            self.autosave_pending = False
+            self.autosave_layout()
+
+    def import_key_layout(self):
+        if self.layout_load_worker is not None:
+            self.statusBar().showMessage("A layout import is already running.")
+            return
+
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Import Key Layout", "",
+            f"Key layouts (*.json *.ndjson *{BINARY_LAYOUT_EXTENSION});;JSON files (*.json *.ndjson);;"
+            f"Binary key layouts (*{BINARY_LAYOUT_EXTENSION});;All Files (*)"
+        )
+
+        if not file_path:
+            self.statusBar().showMessage("Import cancelled.")
+            return
+
+        self.layout_load_worker = LayoutLoadWorker(file_path, self)
+        self.layout_load_worker.loaded.connect(self.handle_layout_loaded)
+        self.layout_load_worker.load_failed.connect(self.handle_export_error)
+        self.layout_load_worker.finished.connect(self.layout_load_worker_stopped)
+        self.statusBar().showMessage(f"Importing key layout from {file_path}...")
+        self.layout_load_worker.start()
+
+    def handle_layout_loaded(self, layout, key_layout, file_path):
+        self.set_current_layout(layout, key_layout)
+        self.detection_base_image = None # The imported layout wasn't detected on any known image
+        self.statusBar().showMessage(f"Imported {len(layout)} keys from {file_path}")
+
+    def layout_load_worker_stopped(self):
+        self.layout_load_worker.deleteLater()
+        self.layout_load_worker = None
+
+    def toggle_instrumentation(self, enabled):
+        if enabled:
+            instrumentation.enable()
+            self.statusBar().showMessage("Instrumentation enabled.")
+        else:
+            instrumentation.disable()
+            self.statusBar().showMessage("Instrumentation disabled (collected data is kept until reset).")
+
+    def export_instrumentation_json(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Timing Histograms", "instrumentation.json", "JSON files (*.json);;All Files (*)"
+        )
+        if not file_path:
+            self.statusBar().showMessage("Export cancelled.")
+            return
+        try:
+            instrumentation.export_json(file_path)
+            self.statusBar().showMessage(f"Timing histograms exported to {file_path}")
+        except IOError as e:
+            self.handle_export_error(f"Error exporting instrumentation: {e}")
+
+    def export_instrumentation_trace(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Chrome Trace", "trace.json", "Chrome trace (*.json);;All Files (*)"
+        )
+        if not file_path:
+            self.statusBar().showMessage("Export cancelled.")
+            return
+        try:
+            instrumentation.export_chrome_trace(file_path)
+            self.statusBar().showMessage(f"Chrome trace exported to {file_path} (open in about://tracing or Perfetto)")
         except IOError as e:
-            self.handle_export_error(f"Error exporting layout: {e}")
-        except Exception as e:
-            self.handle_export_error(f"An unexpected error occurred during export: {e}")
+            self.handle_export_error(f"Error exporting instrumentation: {e}")
 
     def handle_export_error(self, message):
         print(message)
         self.statusBar().showMessage(message)
 
+    @instrumentation.timed("gui.key_press")
     def handle_key_press_event(self, click_pos: QPoint):
-        clicked_key_info = None
-        for key_data in self.current_layout:
-            pos = key_data['position']
-            key_rect = QRect(pos['x'], pos['y'], pos['width'], pos['height'])
-            if key_rect.contains(click_pos):
-                clicked_key_info = key_data
-                break
-        
-        if clicked_key_info:
-            self.last_clicked_key_id = clicked_key_info['key_id']
-            self.statusBar().showMessage(f"Key pressed: {clicked_key_info['label']} (ID: {self.last_clicked_key_id})")
-            
-            self.pressed_keys_visual_feedback = [self.last_clicked_key_id]
-            self.draw_key_overlays() # Redraw with highlight
+        clicked_index = self.layout_index.key_index_at(click_pos.x(), click_pos.y())
+
+        if clicked_index >= 0:
+            self.last_clicked_key_id = self.key_layout.key_ids[clicked_index]
+            self.statusBar().showMessage(f"Key pressed: {self.key_layout.labels[clicked_index]} (ID: {self.last_clicked_key_id})")
             
-            QTimer.singleShot(200, self.clear_press_feedback) # Clear feedback after 200ms
+            # Each clicked key keeps its own highlight deadline; the next frame tick draws it
+            self.press_deadlines[self.last_clicked_key_id] = time.monotonic() + PRESS_FEEDBACK_SECONDS
+            self.request_frame()
         else:
             self.statusBar().showMessage(f"Clicked at ({click_pos.x()},{click_pos.y()}), no key found there.")
 
 
+    def press_key(self, key_id):
+        # Programmatic press (typing replay); held until release_key(), alongside any other held keys
+        if key_id in self.held_keys:
+            return
+        if self.rollover_limit is not None and len(self.held_keys) >= self.rollover_limit:
+            return # Like a limited-rollover keyboard, extra simultaneous keys are dropped
+        self.held_keys[key_id] = None
+        self.request_frame()
+
+    def release_key(self, key_id):
+        if key_id in self.held_keys:
+            del self.held_keys[key_id]
+            self.request_frame()
+
+    def request_frame(self):
+        # Coalesce: any number of state changes before the next tick cost one repaint
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    @instrumentation.timed("gui.frame_tick")
+    def frame_tick(self):
+        now = time.monotonic()
+        for key_id in [k for k, deadline in self.press_deadlines.items() if deadline <= now]:
+            del self.press_deadlines[key_id]
+        pressed = list(self.held_keys)
+        pressed.extend(k for k in self.press_deadlines if k not in self.held_keys)
+        self.set_pressed_keys(pressed)
+        if not self.press_deadlines:
+            self.frame_timer.stop() # Idle until the next press; held keys need no ticking
+
+    def replay_typing_text(self):
+        text, ok = QInputDialog.getMultiLineText(self, "Replay Typing", "Text to type ({name} types a named key):")
+        if not ok or not text:
+            return
+        wpm, ok = QInputDialog.getDouble(self, "Replay Typing", "Words per minute:", 60.0, 1.0, 2000.0, 0)
+        if not ok:
+            return
+        events, unmapped = text_to_events(text, self.key_layout, wpm=wpm)
+        if unmapped:
+            print(f"Typing replay: no key for {len(unmapped)} characters: {sorted(set(unmapped))}")
+        self.start_typing_replay(events)
+
+    def replay_keystroke_log(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Replay Keystroke Log", "", "Keystroke logs (*.ndjson *.jsonl *.json);;All Files (*)"
+        )
+        if not file_path:
+            return
+        try:
+            events = load_keystroke_log(file_path, self.key_layout)
+        except (IOError, ValueError, KeyError) as e:
+            self.handle_export_error(f"Error loading keystroke log: {e}")
+            return
+        self.start_typing_replay(events)
+
+    def start_typing_replay(self, events, speed=1.0):
+        """
+        Plays (time, action, key_id) events on the display, driven by the Qt event loop so the
+        window keeps repainting. Returns the ReplayEngine (its summary() has the latency stats).
+        """
+        self.stop_typing_replay()
+        if not events:
+            self.statusBar().showMessage("Nothing to replay: no characters map to keys in this layout.")
+            return None
+        self.replay_engine = ReplayEngine(events, self.press_key, self.release_key, speed)
+        self.replay_engine.start()
+        self.stop_replay_action.setEnabled(True)
+        self.statusBar().showMessage(f"Replaying {len(events)} key events...")
+        self.replay_tick()
+        return self.replay_engine
+
+    def replay_tick(self):
+        if self.replay_engine is None:
+            return
+        wait = self.replay_engine.dispatch_due()
+        if wait is not None:
+            self.replay_timer.start(int(wait * 1000))
+            return
+        summary = self.replay_engine.summary()
+        self.replay_engine = None
+        self.stop_replay_action.setEnabled(False)
+        self.statusBar().showMessage(
+            f"Replay finished: {summary['events']} events, {summary['events_per_second']:.0f} events/s, "
+            f"p99 latency {summary.get('p99_ms', 0):.1f} ms"
+        )
+
+    def stop_typing_replay(self):
+        if self.replay_engine is None:
+            return
+        self.replay_timer.stop()
+        self.replay_engine = None
+        self.stop_replay_action.setEnabled(False)
+        self.clear_press_feedback() # Don't leave keys stuck down
+        self.statusBar().showMessage("Typing replay stopped.")
+
     def clear_press_feedback(self):
-        self.pressed_keys_visual_feedback = []
-        self.draw_key_overlays() # Redraw without highlight
+        self.held_keys.clear()
+        self.press_deadlines.clear()
+        self.frame_timer.stop()
+        self.set_pressed_keys([]) # Restore the released keys from the cached overlay
         # Optionally, clear the status bar or set a default message
         # self.statusBar().showMessage("Ready")
 
 
     def run_advanced_key_detection(self):
-        if KeyDetector is None:
+        if not detection_available():
             self.statusBar().showMessage("KeyDetector module is not available.")
             return
+        if self.detection_worker is not None:
+            self.statusBar().showMessage("Key detection is already running.")
+            return
 
         image_path = "Keyboard_white.jpg"
         if not os.path.exists(image_path) or self.base_pixmap.isNull():
@@ -229,30 +791,106 @@ class MainWindow(QMainWindow):
             print(f"Error: Image file '{image_path}' not found or not loaded for detection.")
             return
 
-        detector = KeyDetector()
-        self.statusBar().showMessage(f"Running advanced key detection on {image_path}...")
-        QApplication.processEvents() 
-
-        # Load image with OpenCV for processing
-        image_cv = cv2.imread(image_path)
-        if image_cv is None:
-            self.statusBar().showMessage(f"Error: Could not load {image_path} with OpenCV for detection.")
-            print(f"Error: Could not load {image_path} with OpenCV for detection.")
+        if self.ocr_cache is None:
+            try:
+                self.ocr_cache = OCRCache()
+            except Exception as e: # Detection still works without the cache
+                print(f"Warning: Could not open OCR cache: {e}")
+        if self.detection_cache is None:
+            try:
+                self.detection_cache = DetectionCache()
+            except Exception as e:
+                print(f"Warning: Could not open detection cache: {e}")
+
+        previous_image = self.detection_base_image if self.incremental_detection_action.isChecked() else None
+        self.pending_detection_image = None
+        self.last_incremental_stats = None
+        self.detection_worker = KeyDetectionWorker(image_path, self.ocr_cache, self.detection_cache,
+                                                   previous_image, list(self.current_layout), self)
+        self.detection_worker.image_loaded.connect(self.set_pending_detection_image)
+        self.detection_worker.incremental_report.connect(self.set_incremental_stats)
+        self.detection_worker.stage_changed.connect(self.statusBar().showMessage)
+        self.detection_worker.progress.connect(self.handle_detection_progress)
+        self.detection_worker.key_identified.connect(self.draw_detection_preview_key)
+        self.detection_worker.detection_finished.connect(self.handle_detection_finished)
+        self.detection_worker.detection_failed.connect(self.handle_detection_failed)
+        self.detection_worker.finished.connect(self.detection_worker_stopped)
+
+        self.run_detection_action.setEnabled(False)
+        self.cancel_detection_action.setEnabled(True)
+        self.detection_worker.start()
+
+    def cancel_advanced_key_detection(self):
+        if self.detection_worker is not None:
+            self.detection_worker.requestInterruption() # Checked before each ROI
+            self.cancel_detection_action.setEnabled(False)
+            self.statusBar().showMessage("Cancelling key detection...")
+
+    def detection_worker_stopped(self):
+        self.detection_worker.deleteLater()
+        self.detection_worker = None
+        self.run_detection_action.setEnabled(True)
+        self.cancel_detection_action.setEnabled(False)
+
+    def clear_ocr_cache(self):
+        if self.detection_worker is not None:
+            self.statusBar().showMessage("Cannot clear the OCR cache while key detection is running.")
             return
-
-        raw_bboxes = detector.detect_keys(image_path) # Still use detect_keys for initial bounding boxes
-        if not raw_bboxes:
-            self.statusBar().showMessage("No initial key regions found by detect_keys.")
+        if self.ocr_cache is None and detection_available():
+            self.ocr_cache = OCRCache()
+        if self.ocr_cache is not None:
+            self.ocr_cache.clear()
+        if self.detection_cache is None and detection_available():
+            self.detection_cache = DetectionCache()
+        if self.detection_cache is not None:
+            self.detection_cache.clear() # Cached identified keys embed OCR labels too
+        self.statusBar().showMessage("OCR and detection caches cleared.")
+
+    def set_pending_detection_image(self, image_cv):
+        self.pending_detection_image = image_cv
+
+    def set_incremental_stats(self, stats):
+        self.last_incremental_stats = stats
+
+    def handle_detection_progress(self, done, total):
+        if self.detection_worker is not None and not self.detection_worker.isInterruptionRequested():
+            self.statusBar().showMessage(f"Identifying keys with OCR: {done}/{total} regions processed...")
+
+    def draw_detection_preview_key(self, key_data):
+        # Stream partial results onto the display; draw_key_overlays() wipes them when detection ends
+        if self.base_pixmap.isNull():
             return
-        
-        print(f"Initial detection found {len(raw_bboxes)} raw bounding boxes.")
-        self.statusBar().showMessage(f"Initial detection found {len(raw_bboxes)} raw boxes. Refining with OCR...")
-        QApplication.processEvents()
+        style = self.build_key_style(KeyLayout.from_dicts([key_data]), 0)
+        painter = QPainter(self.pixmap)
+        self.paint_key(painter, style, pressed=False)
+        painter.end()
+        self.image_label.update_pixmap_rect(style["rect"])
 
-        identified_keys_list = detector.refine_and_identify_keys(image_cv, raw_bboxes)
-        
+    def handle_detection_failed(self, message):
+        self.statusBar().showMessage(message)
+        print(message)
+        self.draw_key_overlays() # Remove any preview overlays
+
+    def handle_detection_finished(self, identified_keys_list, cancelled):
+        self.draw_key_overlays() # Remove the streamed preview; the current layout stays until confirmed
         count = len(identified_keys_list)
-        self.statusBar().showMessage(f"Advanced detection identified {count} keys.")
+        if cancelled:
+            self.statusBar().showMessage(f"Key detection cancelled after identifying {count} keys.")
+            print(f"Key detection cancelled after identifying {count} keys.")
+            return
+
+        stats = self.last_incremental_stats
+        if stats is not None and not stats["full"]:
+            summary = (f"Incremental detection reused {stats['reused']} keys and re-detected {stats['redetected']} "
+                       f"({stats['removed']} replaced) in {stats['regions']} changed regions.")
+        else:
+            summary = f"Advanced detection identified {count} keys."
+        self.statusBar().showMessage(summary)
+        print(summary)
+        if self.ocr_cache is not None:
+            print(f"OCR cache: {self.ocr_cache.stats()}")
+        if self.detection_cache is not None:
+            print(f"Detection cache: {self.detection_cache.stats()}")
         print(f"Advanced detection identified {count} keys:")
         if count > 0:
             for i, key_info in enumerate(identified_keys_list):
@@ -264,19 +902,73 @@ class MainWindow(QMainWindow):
                                          QMessageBox.StandardButton.No)
             
             if reply == QMessageBox.StandardButton.Yes:
-                self.current_layout = identified_keys_list
-                self.draw_key_overlays() # Redraw with the new layout
+                self.set_current_layout(identified_keys_list) # Rebuilds the hit-test index and redraws
+                self.detection_base_image = self.pending_detection_image
                 self.statusBar().showMessage(f"Layout updated with {count} detected keys.")
             else:
                 self.statusBar().showMessage("Detected layout not applied.")
         else:
             self.statusBar().showMessage("No keys identified after OCR refinement.")
 
+    def closeEvent(self, event):
+        if self.warmup_worker is not None:
+            self.warmup_worker.wait() # An import can't be interrupted; it is short anyway
+        self.replay_timer.stop()
+        self.frame_timer.stop()
+        # Don't tear down the window under a running detection thread
+        if self.detection_worker is not None:
+            self.detection_worker.requestInterruption()
+            self.detection_worker.wait()
+        if self.layout_load_worker is not None:
+            self.layout_load_worker.wait()
+        for worker in list(self.layout_save_workers): # Let exports finish their rename
+            worker.wait()
+        if self.autosave_worker is not None:
+            self.autosave_worker.wait()
+        if self.autosave_action.isChecked() and (self.autosave_timer.isActive() or self.autosave_pending):
+            self.autosave_timer.stop()
+            try: # Last change not written yet; write it synchronously, still atomically
+                save_layout_json_atomic(self.current_layout, self.autosave_path)
+            except (IOError, TypeError, ValueError) as e:
+                print(f"Warning: Final autosave failed: {e}")
+        if self.ocr_cache is not None:
+            self.ocr_cache.close()
+        if self.detection_cache is not None:
+            self.detection_cache.close()
+        super().closeEvent(event)
+
 
 def main():
-    app = QApplication(sys.argv)
-    main_window = MainWindow()
+    parser = argparse.ArgumentParser(description="High-Fidelity Keyboard Simulator")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="Print startup timings (time to first paint, warm-up) as JSON and exit.")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Don't import the detection stack in the background after the first paint.")
+    args, qt_args = parser.parse_known_args()
+    imports_done = time.perf_counter() - STARTUP_TIME
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    main_window = MainWindow(warmup=not args.no_warmup)
+    main_window.startup_marks["imports"] = imports_done
+    main_window.mark_startup("window_created")
+
+    if args.measure_startup:
+        def report_startup(marks, error=None):
+            report = {f"{name}_ms": round(seconds * 1000, 1) for name, seconds in marks.items()}
+            report["detection_loaded_at_first_paint"] = main_window.detection_loaded_at_first_paint
+            if error is not None:
+                report["error"] = error
+            print(json.dumps(report, indent=4))
+            app.exit(1 if error is not None else 0)
+        main_window.startup_report_callback = report_startup
+        if main_window.image_load_error is not None:
+            # No pixmap means no first paint; report from inside the event loop so app.exit() applies
+            QTimer.singleShot(0, lambda: main_window.check_startup_report(main_window.image_load_error))
+        QTimer.singleShot(STARTUP_REPORT_TIMEOUT_MS, lambda: main_window.check_startup_report(
+            f"No startup report after {STARTUP_REPORT_TIMEOUT_MS} ms"))
+
     main_window.show()
+    main_window.mark_startup("shown")
     sys.exit(app.exec())
 
 if __name__ == "__main__":
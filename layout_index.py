@@ -0,0 +1,153 @@
+import numpy as np
+
+
+class LayoutIndex:
+    def __init__(self, layout, cell_size=None):
+        """
+        Builds a uniform-grid spatial index over a key layout for fast hit-testing.
+
+        Every key is registered in each grid cell its rectangle overlaps. Cell entries keep
+        the layout order, so a lookup returns the same key as a linear first-match scan.
+
+        Args:
+            layout: A KeyLayout, or a list of key dictionaries in the MANUAL_LAYOUT schema.
+            cell_size (int, optional): Grid cell edge in pixels. Defaults to the median key edge.
+        """
+        self.layout = layout
+        if hasattr(layout, "geometry"): # KeyLayout: geometry is already an (N, 4) array
+            rects = layout.geometry.astype(np.int64)
+        else:
+            rects = np.array(
+                [[k["position"]["x"], k["position"]["y"], k["position"]["width"], k["position"]["height"]] for k in layout],
+                dtype=np.int64,
+            ).reshape(-1, 4)
+        self.rects = rects
+
+        # Same containment rule as QRect.contains(): x <= px < x + w. Zero or negative sizes never match.
+        valid = (rects[:, 2] > 0) & (rects[:, 3] > 0)
+        self.x1 = rects[:, 0]
+        self.y1 = rects[:, 1]
+        self.x2 = rects[:, 0] + rects[:, 2]
+        self.y2 = rects[:, 1] + rects[:, 3]
+
+        if cell_size is None:
+            edges = np.concatenate([rects[valid, 2], rects[valid, 3]])
+            cell_size = int(np.median(edges)) if edges.size else 64
+        self.cell_size = max(int(cell_size), 1)
+
+        if not valid.any():
+            self.origin_x = self.origin_y = 0
+            self.grid_w = self.grid_h = 0
+            self.cell_start = np.zeros(1, dtype=np.int64)
+            self.cell_items = np.zeros(0, dtype=np.int64)
+            self.max_cell_count = 0
+            return
+
+        self.origin_x = int(self.x1[valid].min())
+        self.origin_y = int(self.y1[valid].min())
+        cx1 = (self.x1 - self.origin_x) // self.cell_size
+        cy1 = (self.y1 - self.origin_y) // self.cell_size
+        cx2 = (self.x2 - 1 - self.origin_x) // self.cell_size
+        cy2 = (self.y2 - 1 - self.origin_y) // self.cell_size
+        self.grid_w = int(cx2[valid].max()) + 1
+        self.grid_h = int(cy2[valid].max()) + 1
+
+        # Bucket key indices per cell, then flatten into CSR arrays (cell_start/cell_items).
+        buckets = [[] for _ in range(self.grid_w * self.grid_h)]
+        for i in np.flatnonzero(valid):
+            for cy in range(cy1[i], cy2[i] + 1):
+                row = cy * self.grid_w
+                for cx in range(cx1[i], cx2[i] + 1):
+                    buckets[row + cx].append(i)
+
+        counts = np.array([len(b) for b in buckets], dtype=np.int64)
+        self.cell_start = np.zeros(len(buckets) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.cell_start[1:])
+        self.cell_items = np.fromiter((i for b in buckets for i in b), dtype=np.int64, count=int(counts.sum()))
+        self.max_cell_count = int(counts.max())
+
+    def __len__(self):
+        return len(self.layout)
+
+    def _cell_of(self, px, py):
+        cx = (px - self.origin_x) // self.cell_size
+        cy = (py - self.origin_y) // self.cell_size
+        inside = (px >= self.origin_x) & (py >= self.origin_y) & (cx < self.grid_w) & (cy < self.grid_h)
+        return cy * self.grid_w + cx, inside
+
+    def key_index_at(self, x, y):
+        """
+        Returns the layout index of the first key containing (x, y), or -1 if none does.
+        """
+        cell, inside = self._cell_of(int(x), int(y))
+        if not inside:
+            return -1
+        for i in self.cell_items[self.cell_start[cell]:self.cell_start[cell + 1]]:
+            if self.x1[i] <= x < self.x2[i] and self.y1[i] <= y < self.y2[i]:
+                return int(i)
+        return -1
+
+    def key_at(self, x, y):
+        """
+        Returns the key dictionary at (x, y), or None if the point does not hit a key.
+        """
+        index = self.key_index_at(x, y)
+        return self.layout[index] if index >= 0 else None
+
+    def keys_in_rect(self, x, y, width, height):
+        """
+        Returns the layout indices (ascending) of all keys whose rectangles intersect the given rect.
+        """
+        if self.max_cell_count == 0 or width <= 0 or height <= 0:
+            return np.zeros(0, dtype=np.int64)
+        cx1 = max((x - self.origin_x) // self.cell_size, 0)
+        cy1 = max((y - self.origin_y) // self.cell_size, 0)
+        cx2 = min((x + width - 1 - self.origin_x) // self.cell_size, self.grid_w - 1)
+        cy2 = min((y + height - 1 - self.origin_y) // self.cell_size, self.grid_h - 1)
+        if cx1 > cx2 or cy1 > cy2:
+            return np.zeros(0, dtype=np.int64)
+        chunks = [self.cell_items[self.cell_start[cy * self.grid_w + cx1]:self.cell_start[cy * self.grid_w + cx2 + 1]]
+                  for cy in range(cy1, cy2 + 1)]
+        candidates = np.unique(np.concatenate(chunks))
+        overlaps = ((self.x1[candidates] < x + width) & (x < self.x2[candidates]) &
+                    (self.y1[candidates] < y + height) & (y < self.y2[candidates]))
+        return candidates[overlaps]
+
+    def hit_test(self, points):
+        """
+        Vectorized hit-test for a batch of click coordinates.
+
+        Args:
+            points: Array-like of shape (N, 2) with (x, y) click positions.
+
+        Returns:
+            numpy.ndarray: int64 array of length N with the layout index of the first key hit by
+                           each point, or -1 where no key was hit.
+        """
+        points = np.asarray(points).reshape(-1, 2)
+        px = np.floor(points[:, 0]).astype(np.int64)
+        py = np.floor(points[:, 1]).astype(np.int64)
+        result = np.full(len(points), -1, dtype=np.int64)
+        if self.max_cell_count == 0 or len(points) == 0:
+            return result
+
+        cell, inside = self._cell_of(px, py)
+        pending = np.flatnonzero(inside)
+        cell = cell[pending]
+        start = self.cell_start[cell]
+        count = self.cell_start[cell + 1] - start
+
+        # Walk each cell's candidate list in layout order, one rank at a time for all pending points.
+        for rank in range(self.max_cell_count):
+            has_candidate = count > rank
+            if not has_candidate.any():
+                break
+            pending, start, count = pending[has_candidate], start[has_candidate], count[has_candidate]
+            candidate = self.cell_items[start + rank]
+            qx, qy = px[pending], py[pending]
+            hit = ((self.x1[candidate] <= qx) & (qx < self.x2[candidate]) &
+                   (self.y1[candidate] <= qy) & (qy < self.y2[candidate]))
+            result[pending[hit]] = candidate[hit]
+            miss = ~hit
+            pending, start, count = pending[miss], start[miss], count[miss]
+        return result
@@ -0,0 +1,99 @@
+import contextlib
+import json
+import os
+import secrets
+
+
+def write_keys_ndjson(keys, fp, flush_every=1):
+    """
+    Writes key dictionaries as newline-delimited JSON, one compact object per line.
+
+    Accepts any iterable, including KeyDetector.iter_identified_keys, so each key is written
+    (and flushed for downstream readers) as soon as it is produced and nothing is buffered.
+
+    Args:
+        keys: Iterable of key dictionaries in the MANUAL_LAYOUT schema.
+        fp: Text file object opened for writing.
+        flush_every (int): Flush after this many lines (0 disables explicit flushing).
+
+    Returns:
+        int: Number of keys written.
+    """
+    count = 0
+    for key_data in keys:
+        fp.write(json.dumps(key_data, separators=(",", ":")))
+        fp.write("\n")
+        count += 1
+        if flush_every and count % flush_every == 0:
+            fp.flush()
+    return count
+
+
+def iter_keys_ndjson(fp):
+    """
+    Yields key dictionaries from a newline-delimited JSON stream, skipping blank lines.
+    """
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def load_keys_ndjson(path):
+    with open(path) as f:
+        return list(iter_keys_ndjson(f))
+
+
+@contextlib.contextmanager
+def atomic_output_path(path):
+    """
+    Yields a temporary path next to `path`; when the block succeeds the temporary file is fsynced
+    and renamed over `path` in one step, otherwise it is removed. Readers (and a crash mid-write)
+    only ever see the old file or the complete new one.
+    """
+    # Not mkstemp: its 0600 mode would end up on the renamed file; "x" also reserves the name
+    temp_path = f"{os.path.abspath(path)}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    open(temp_path, "x").close()
+    try:
+        yield temp_path
+        with open(temp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_layout_json(layout, fp, chunk_size=1 << 16):
+    """
+    Streams a layout as compact JSON (no indentation or spaces after separators), writing the
+    encoder's output in chunk_size pieces instead of building the whole document first.
+
+    Returns:
+        int: Number of characters written.
+    """
+    encoder = json.JSONEncoder(separators=(",", ":"))
+    buffer, buffered, written = [], 0, 0
+    for chunk in encoder.iterencode(layout):
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= chunk_size:
+            fp.write("".join(buffer))
+            written += buffered
+            buffer, buffered = [], 0
+    fp.write("".join(buffer))
+    return written + buffered
+
+
+def save_layout_json_atomic(layout, path):
+    """
+    Writes a layout as compact JSON to `path` atomically (see atomic_output_path).
+
+    Returns:
+        int: Number of characters written.
+    """
+    with atomic_output_path(path) as temp_path:
+        with open(temp_path, "w") as f:
+            written = write_layout_json(layout, f)
+    return written
@@ -0,0 +1,115 @@
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from detection_server import DEFAULT_HOST, DEFAULT_PORT
+
+
+def post_image(url, image_bytes, timeout):
+    """
+    Sends one detection request.
+
+    Returns:
+        tuple: (HTTP status, latency in seconds, key count or None).
+    """
+    request = urllib.request.Request(url, data=image_bytes, method="POST",
+                                     headers={"Content-Type": "application/octet-stream"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            keys = json.loads(response.read())
+            return response.status, time.perf_counter() - start, len(keys)
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, time.perf_counter() - start, None
+    except (urllib.error.URLError, TimeoutError):
+        return None, time.perf_counter() - start, None
+
+
+def run_load_test(url, payloads, requests, concurrency, timeout=120.0):
+    """
+    Fires `requests` detection requests from `concurrency` client threads, cycling through the
+    payloads, and summarizes latency (successful requests only) and throughput.
+
+    Returns:
+        dict: Request counts by outcome, requests/s and p50/p90/p99/max latency in milliseconds.
+    """
+    results = []
+    lock = threading.Lock()
+    next_request = iter(range(requests))
+
+    def client():
+        while True:
+            with lock:
+                index = next(next_request, None)
+            if index is None:
+                return
+            outcome = post_image(url, payloads[index % len(payloads)], timeout)
+            with lock:
+                results.append(outcome)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for status, latency, _ in results if status == 200]) * 1000
+    summary = {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "ok": int(len(latencies)),
+        "rejected": sum(1 for status, _, _ in results if status == 503),
+        "errors": sum(1 for status, _, _ in results if status not in (200, 503)),
+        "wall_seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed if elapsed > 0 else None,
+    }
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        summary.update(p50_ms=float(p50), p90_ms=float(p90), p99_ms=float(p99), max_ms=float(latencies.max()))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test a running detection_server.")
+    parser.add_argument("images", nargs="*", default=["Keyboard_white.jpg"], help="Images to send (cycled).")
+    parser.add_argument("--url", default=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}/detect")
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("-c", "--concurrency", nargs="+", type=int, default=[1, 4, 16],
+                        help="Client thread counts; one run per value.")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests before each run.")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.")
+    args = parser.parse_args(argv)
+
+    payloads = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            payloads.append(f.read())
+
+    runs = []
+    for concurrency in args.concurrency:
+        run_load_test(args.url, payloads, args.warmup, 1, args.timeout)
+        summary = run_load_test(args.url, payloads, args.requests, concurrency, args.timeout)
+        runs.append(summary)
+        latency = (f"p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms"
+                   if summary["ok"] else "no successful requests")
+        print(f"concurrency {concurrency:>3}: {summary['ok']}/{summary['requests']} ok, "
+              f"{summary['rejected']} rejected, {summary['errors']} errors, "
+              f"{summary['requests_per_second']:.2f} req/s, {latency}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": args.url, "images": args.images, "runs": runs}, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
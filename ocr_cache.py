@@ -0,0 +1,32 @@
+import hashlib
+import os
+
+from sqlite_lru_store import SQLiteLRUStore
+
+DEFAULT_OCR_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".keyboard_simulator", "ocr_cache.sqlite")
+
+
+class OCRCache(SQLiteLRUStore):
+    TABLE = "ocr_labels"
+    VALUE_COLUMN = "label"
+
+    def __init__(self, path=DEFAULT_OCR_CACHE_PATH, max_entries=100000, commit_every=64):
+        """
+        Persistent, content-addressed cache of OCR labels for thresholded keycap ROIs.
+
+        Entries are keyed by a hash of the ROI pixels (plus shape/dtype) and the OCR config string;
+        labels are stored as-is. Storage, LRU eviction and thread safety come from SQLiteLRUStore.
+
+        Args:
+            path (str): SQLite file. Use ":memory:" for a non-persistent cache.
+            max_entries (int): Size cap; the oldest-used entries beyond it are evicted.
+            commit_every (int): Number of buffered writes before they are committed.
+        """
+        super().__init__(path, max_entries, commit_every)
+
+    @staticmethod
+    def make_key(thresholded_roi, config):
+        digest = hashlib.sha256()
+        digest.update(f"{thresholded_roi.shape}|{thresholded_roi.dtype}|{config}|".encode())
+        digest.update(thresholded_roi.tobytes())
+        return digest.hexdigest()
@@ -0,0 +1,113 @@
+import argparse
+import json
+import time
+
+from key_detector import KeyDetector, OCR_MODES
+from synthetic_keyboard import make_synthetic_keyboard, match_boxes
+
+SYNTHETIC_SCENE = "synthetic:qwerty" # Default scene: known labels, so each mode's accuracy can be checked
+
+
+def run_mode(image_cv, bboxes, mode, workers=None):
+    detector = KeyDetector(ocr_mode=mode, ocr_workers=workers)
+    start = time.perf_counter()
+    keys = detector.refine_and_identify_keys(image_cv, list(bboxes))
+    elapsed = time.perf_counter() - start
+    return keys, elapsed, detector.last_ocr_stats
+
+
+def label_accuracy(keys, ground_truth):
+    # Fraction of ground-truth keys matched (IoU >= 0.5) by a detected key with the same label
+    boxes = [[k["position"]["x"], k["position"]["y"], k["position"]["width"], k["position"]["height"]] for k in keys]
+    correct = sum(keys[d]["label"].strip().casefold() == ground_truth[t]["label"].casefold()
+                  for d, t in match_boxes(boxes, ground_truth)["matches"])
+    return round(correct / len(ground_truth), 4) if ground_truth else None
+
+
+def compare_ocr_modes(image_path=None, modes=("serial", "mosaic"), workers=None, ground_truth=None):
+    """
+    Runs refine_and_identify_keys once per OCR mode on the same bboxes and compares each mode's
+    labels and wall-clock time against the first (reference) mode, and against the true labels
+    when they are known.
+
+    Args:
+        image_path (str, optional): Keyboard image to detect and OCR. Defaults to a synthetic
+            QWERTY scene (make_synthetic_keyboard), whose ground truth is used automatically.
+        modes (tuple): OCR modes to compare; the first one is the reference.
+        workers (int, optional): Pool size for the "thread"/"process" modes.
+        ground_truth (list, optional): Key dicts with true labels and positions for image_path.
+
+    Returns:
+        dict: Report with one entry per mode, or None if the image could not be loaded.
+    """
+    detector = KeyDetector()
+    if image_path is None:
+        image_path = SYNTHETIC_SCENE
+        image_cv, ground_truth = make_synthetic_keyboard("qwerty")
+        image_hash = None
+    else:
+        image_cv, image_hash = detector.load_image(image_path) # Read once; detection reuses the decoded image
+        if image_cv is None:
+            return None
+
+    bboxes = detector.detect_keys_in_image(image_cv, image_hash)
+    report = {"image": image_path, "bboxes": len(bboxes), "reference_mode": modes[0],
+              "ground_truth_keys": len(ground_truth) if ground_truth else None, "modes": {}}
+    if not bboxes:
+        print("No bounding boxes found, nothing to compare.")
+        return report
+
+    reference_keys, reference_time = None, None
+    for mode in modes:
+        keys, elapsed, stats = run_mode(image_cv, bboxes, mode, workers)
+        labels = {k["key_id"]: k["label"] for k in keys}
+        if reference_keys is None:
+            reference_keys, reference_time = labels, elapsed
+
+        mismatches = [
+            {"key_id": key_id, "reference": label, "label": labels.get(key_id)}
+            for key_id, label in reference_keys.items() if labels.get(key_id) != label
+        ]
+        report["modes"][mode] = {
+            "seconds": round(elapsed, 4),
+            "speedup": round(reference_time / elapsed, 2) if elapsed > 0 else None,
+            "keys": len(keys),
+            "agreement": round(1 - len(mismatches) / len(reference_keys), 4) if reference_keys else None,
+            "mismatches": mismatches,
+            "label_accuracy": label_accuracy(keys, ground_truth) if ground_truth else None,
+            "ocr_stats": stats,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare KeyDetector OCR modes for speed and label agreement.")
+    parser.add_argument("image", nargs="?", default=None,
+                        help="Keyboard image (default: a synthetic QWERTY scene with known labels).")
+    parser.add_argument("--ground-truth", default=None,
+                        help="Layout JSON with the true labels and positions for IMAGE (e.g. from synthetic_keyboard.py).")
+    parser.add_argument("--modes", nargs="+", default=["serial", "mosaic"], choices=OCR_MODES,
+                        help="OCR modes to run; the first is the reference for agreement.")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size for thread/process modes.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the full report to this file.")
+    args = parser.parse_args()
+
+    ground_truth = None
+    if args.ground_truth:
+        with open(args.ground_truth) as f:
+            ground_truth = json.load(f)
+    report = compare_ocr_modes(args.image, tuple(args.modes), args.workers, ground_truth)
+    if report is None:
+        raise SystemExit(1)
+
+    print(f"{report['image']}: {report['bboxes']} bounding boxes, reference mode '{report['reference_mode']}'")
+    for mode, result in report["modes"].items():
+        print(f"  {mode:>8}: {result['seconds']:.3f}s (x{result['speedup']}), {result['keys']} keys, "
+              f"agreement {result['agreement']}, label accuracy {result['label_accuracy']}, stats {result['ocr_stats']}")
+        for mismatch in result["mismatches"][:10]:
+            print(f"            {mismatch['key_id']}: '{mismatch['reference']}' -> '{mismatch['label']}'")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Report written to {args.json_path}")
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# QtGui only (no widgets): QImage + QPainter work without a display on the "offscreen" platform
+from PyQt6.QtGui import QColor, QFont, QGuiApplication, QImage, QPainter
+from PyQt6.QtCore import Qt, QRect
+
+from key_layout import KeyLayout
+from binary_layout import load_key_layout_binary, BINARY_LAYOUT_EXTENSION
+from layout_io import load_keys_ndjson
+from batch_paths import collect_files, output_paths_for
+
+DEFAULT_BASE_IMAGE = "Keyboard_white.jpg"
+LAYOUT_EXTENSIONS = (".json", ".ndjson", BINARY_LAYOUT_EXTENSION)
+BACKGROUND_ALPHA = 128 # Un-pressed key backgrounds
+FONT_HEIGHT_FACTOR = 0.35 # Label point size relative to the key height
+MIN_FONT_POINT_SIZE = 6
+
+_worker_base_image = None # Decoded base image per worker process, loaded once by init_worker
+
+
+def pressed_highlight_color():
+    color = QColor("#FFA500") # Orange highlight
+    color.setAlpha(150) # Semi-transparent highlight
+    return color
+
+
+def build_key_style(key_layout, index, pressed_color):
+    """
+    Pre-builds the QRect/QFont/QColors used to paint one key of a KeyLayout. Shared by the
+    simulator window and the headless renderer so both draw keys identically.
+    """
+    x, y, w, h = key_layout.rect(index)
+    font = QFont("SF Pro Rounded", -1)
+    font.setPointSizeF(h * FONT_HEIGHT_FACTOR)
+    if font.pointSizeF() < MIN_FONT_POINT_SIZE:
+        font.setPointSizeF(MIN_FONT_POINT_SIZE)
+
+    # Colors come pre-parsed from KeyLayout; only non-hex names (e.g. "red") go through QColor's parser
+    bg_hex = key_layout.background_colors[index]
+    bg_color = QColor.fromRgba(int(key_layout.background_rgba[index])) if bg_hex is None or bg_hex.startswith("#") else QColor(bg_hex)
+    bg_color.setAlpha(BACKGROUND_ALPHA) # Default alpha for normal state
+    font_hex = key_layout.font_colors[index]
+    font_color = QColor.fromRgba(int(key_layout.font_rgba[index])) if font_hex is None or font_hex.startswith("#") else QColor(font_hex)
+
+    return {
+        "rect": QRect(x, y, w, h),
+        "label": key_layout.labels[index],
+        "font": font,
+        "font_color": font_color,
+        "background_color": bg_color,
+        "pressed_color": pressed_color,
+    }
+
+
+def paint_key(painter, style, pressed):
+    painter.fillRect(style["rect"], style["pressed_color"] if pressed else style["background_color"])
+    painter.setPen(style["font_color"])
+    painter.setFont(style["font"])
+    painter.drawText(style["rect"], Qt.AlignmentFlag.AlignCenter, style["label"])
+
+
+def ensure_gui_application():
+    """
+    Returns the running QGuiApplication, creating one on the "offscreen" platform when there is
+    none (fonts need an application object even when nothing is shown).
+    """
+    app = QGuiApplication.instance()
+    if app is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        app = QGuiApplication(["overlay_renderer"])
+    return app
+
+
+def load_base_image(path=DEFAULT_BASE_IMAGE):
+    """
+    Decodes the base keyboard image once, in the format QPainter draws into fastest.
+
+    Raises:
+        IOError: If the image cannot be read.
+    """
+    image = QImage(path)
+    if image.isNull():
+        raise IOError(f"Could not load base image '{path}'.")
+    return image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+
+
+def load_layout(path):
+    """
+    Loads a layout file (.json, .ndjson or .kbl) into a KeyLayout.
+    """
+    if path.lower().endswith(BINARY_LAYOUT_EXTENSION):
+        return load_key_layout_binary(path)
+    if path.lower().endswith(".ndjson"):
+        return KeyLayout.from_dicts(load_keys_ndjson(path))
+    with open(path) as f:
+        return KeyLayout.from_dicts(json.load(f))
+
+
+def render_overlay(base_image, key_layout, pressed_key_ids=(), pressed_color=None):
+    """
+    Renders a layout over a copy of base_image with the simulator's drawing rules: translucent key
+    backgrounds, labels at 0.35x the key height and the pressed-key highlight. Keys are painted in
+    layout order, so where keys overlap the result matches the window's.
+
+    Args:
+        base_image (QImage): Decoded base image (see load_base_image); left untouched.
+        key_layout (KeyLayout): Layout to draw.
+        pressed_key_ids (iterable): key_ids drawn in the pressed state.
+        pressed_color (QColor, optional): Defaults to pressed_highlight_color().
+
+    Returns:
+        QImage: The rendered preview.
+    """
+    pressed_color = pressed_color or pressed_highlight_color()
+    pressed_key_ids = set(pressed_key_ids)
+    image = base_image.copy()
+    painter = QPainter(image)
+    for i in range(len(key_layout)):
+        paint_key(painter, build_key_style(key_layout, i, pressed_color), key_layout.key_ids[i] in pressed_key_ids)
+    painter.end()
+    return image
+
+
+def init_worker(base_image_path):
+    global _worker_base_image
+    ensure_gui_application()
+    _worker_base_image = load_base_image(base_image_path)
+
+
+def render_layout_file(layout_path, output_path, pressed_key_ids=()):
+    """
+    Renders one layout file to a PNG using the worker's base image.
+
+    Returns:
+        dict: Summary entry with the key count and per-stage timings in seconds.
+    """
+    start = time.perf_counter()
+    key_layout = load_layout(layout_path)
+    loaded = time.perf_counter()
+    image = render_overlay(_worker_base_image, key_layout, pressed_key_ids)
+    rendered = time.perf_counter()
+    if not image.save(output_path, "PNG"):
+        raise IOError(f"Could not write '{output_path}'.")
+    written = time.perf_counter()
+    return {
+        "layout": layout_path, "output": output_path, "keys": len(key_layout), "error": None,
+        "timing": {"load": loaded - start, "render": rendered - loaded, "write": written - rendered, "total": written - start},
+    }
+
+
+def render_batch(layout_paths, output_dir, base_image_path=DEFAULT_BASE_IMAGE, workers=None, pressed_key_ids=()):
+    """
+    Renders every layout to <output_dir>/<stem>.png using a process pool. Each worker decodes the
+    base image once and reuses it for all of its renders.
+
+    Returns:
+        dict: Batch summary with per-layout results (in input order) and overall timing.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = output_paths_for(layout_paths, output_dir, ".png")
+    pressed_key_ids = tuple(pressed_key_ids)
+
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(base_image_path,)) as executor:
+        futures = {executor.submit(render_layout_file, path, outputs[path], pressed_key_ids): path for path in layout_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e: # One broken layout shouldn't sink the batch
+                results[path] = {"layout": path, "output": None, "keys": 0, "error": repr(e)}
+    elapsed = time.perf_counter() - start
+
+    ordered = [results[path] for path in layout_paths]
+    return {
+        "layouts": len(layout_paths),
+        "failed": sum(1 for entry in ordered if entry["error"]),
+        "wall_seconds": elapsed,
+        "renders_per_second": len(layout_paths) / elapsed if elapsed > 0 else None,
+        "base_image": base_image_path,
+        "workers": workers or os.cpu_count(),
+        "results": ordered,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render key layout overlay previews to PNG without a display.")
+    parser.add_argument("inputs", nargs="+", help="Layout directories, files (.json, .ndjson, .kbl) or glob patterns.")
+    parser.add_argument("-o", "--output-dir", default="layout_previews", help="Where preview PNGs are written.")
+    parser.add_argument("-b", "--base-image", default=DEFAULT_BASE_IMAGE, help="Image the overlays are drawn on.")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--pressed", nargs="*", default=[], help="key_ids drawn with the pressed highlight.")
+    parser.add_argument("--summary", default=None, help="Summary JSON path (default: <output-dir>/render_summary.json).")
+    args = parser.parse_args(argv)
+
+    layout_paths = collect_files(args.inputs, LAYOUT_EXTENSIONS)
+    if not layout_paths:
+        print("No layouts found.")
+        return 1
+
+    summary = render_batch(layout_paths, args.output_dir, args.base_image, args.workers, args.pressed)
+    summary_path = args.summary or os.path.join(args.output_dir, "render_summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=4)
+
+    print(f"Rendered {summary['layouts'] - summary['failed']} of {summary['layouts']} layouts in "
+          f"{summary['wall_seconds']:.2f}s ({summary['renders_per_second']:.1f}/s). Summary: {summary_path}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteLRUStore:
+    # Subclasses set the table (and value column) name and override encode_value/decode_value
+    TABLE = None
+    VALUE_COLUMN = "value"
+
+    def __init__(self, path, max_entries, commit_every=1):
+        """
+        Persistent key -> value store in SQLite, evicted least-recently-used first once
+        max_entries is exceeded. Safe to share between threads. OCRCache and DetectionCache
+        only add their key schema and value encoding on top.
+
+        Args:
+            path (str): SQLite file. Use ":memory:" for a non-persistent store.
+            max_entries (int): Size cap; the oldest-used entries beyond it are evicted.
+            commit_every (int): Number of buffered writes (puts and LRU touches) before they are
+                committed; eviction runs at each commit.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pending_writes = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+            f" key TEXT PRIMARY KEY,"
+            f" {self.VALUE_COLUMN} TEXT NOT NULL,"
+            f" last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self.TABLE}_last_used ON {self.TABLE} (last_used)")
+        self._conn.commit()
+        # Monotonic use counter, so LRU order doesn't depend on wall-clock resolution
+        self._clock = self._conn.execute(f"SELECT COALESCE(MAX(last_used), 0) FROM {self.TABLE}").fetchone()[0]
+
+    def encode_value(self, value):
+        return value
+
+    def decode_value(self, stored):
+        return stored
+
+    def get_many(self, keys):
+        """
+        Looks up several keys in one query.
+
+        Returns:
+            list: The cached value for each key, or None where the key is not cached.
+        """
+        if not keys:
+            return []
+        found = {}
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), 500): # Stay below SQLite's bound-parameter limit
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, {self.VALUE_COLUMN} FROM {self.TABLE} WHERE key IN ({placeholders})", chunk).fetchall())
+            if found:
+                self._clock += 1
+                self._conn.executemany(f"UPDATE {self.TABLE} SET last_used = ? WHERE key = ?",
+                                       [(self._clock, key) for key in found])
+                self._note_write(len(found))
+
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return [self.decode_value(found[key]) if key in found else None for key in keys]
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None if it is not cached.
+        """
+        return self.get_many([key])[0]
+
+    def put(self, key, value):
+        stored = self.encode_value(value)
+        with self._lock:
+            self._clock += 1
+            self._conn.execute(f"INSERT OR REPLACE INTO {self.TABLE} (key, {self.VALUE_COLUMN}, last_used) VALUES (?, ?, ?)",
+                               (key, stored, self._clock))
+            self._note_write(1)
+
+    def _note_write(self, count):
+        self._pending_writes += count
+        if self._pending_writes >= self.commit_every:
+            self._commit()
+
+    def _commit(self):
+        # Caller holds the lock
+        excess = self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE key IN (SELECT key FROM {self.TABLE} ORDER BY last_used LIMIT ?)", (excess,))
+            self.evictions += excess
+        self._conn.commit()
+        self._pending_writes = 0
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.TABLE}")
+            self._conn.commit()
+            self._pending_writes = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
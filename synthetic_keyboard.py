@@ -0,0 +1,157 @@
+import argparse
+import json
+
+import cv2
+import numpy as np
+
+# QWERTY-like rows of (label, width in key units). Widths stay <= 4 units so every key passes
+# KeyDetector's default aspect-ratio filter.
+QWERTY_ROWS = [
+    [("`", 1), ("1", 1), ("2", 1), ("3", 1), ("4", 1), ("5", 1), ("6", 1), ("7", 1), ("8", 1), ("9", 1),
+     ("0", 1), ("-", 1), ("=", 1), ("Backspace", 2)],
+    [("Tab", 1.5), ("Q", 1), ("W", 1), ("E", 1), ("R", 1), ("T", 1), ("Y", 1), ("U", 1), ("I", 1), ("O", 1),
+     ("P", 1), ("[", 1), ("]", 1), ("\\", 1.5)],
+    [("Caps", 1.75), ("A", 1), ("S", 1), ("D", 1), ("F", 1), ("G", 1), ("H", 1), ("J", 1), ("K", 1), ("L", 1),
+     (";", 1), ("'", 1), ("Enter", 2.25)],
+    [("Shift", 2.25), ("Z", 1), ("X", 1), ("C", 1), ("V", 1), ("B", 1), ("N", 1), ("M", 1), (",", 1), (".", 1),
+     ("/", 1), ("Shift", 2.75)],
+    [("Ctrl", 1.5), ("Alt", 1.5), ("Space", 4), ("Alt", 1.5), ("Ctrl", 1.5)],
+]
+
+GRID_LABELS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+def synthetic_rows(layout="qwerty", rows=None, columns=None):
+    """
+    Returns rows of (label, width units): the QWERTY preset (first `rows` rows), or a rows x
+    columns grid of 1-unit keys for large key counts.
+    """
+    if layout == "qwerty":
+        return QWERTY_ROWS[:rows or len(QWERTY_ROWS)]
+    if layout == "grid":
+        return [[(GRID_LABELS[(r * columns + c) % len(GRID_LABELS)], 1) for c in range(columns)] for r in range(rows)]
+    raise ValueError(f"Unknown synthetic layout {layout!r} (expected 'qwerty' or 'grid')")
+
+
+def make_synthetic_keyboard(layout="qwerty", rows=None, columns=None, key_size=64, seed=0, noise=0.005):
+    """
+    Draws a keyboard image with a known layout: light keycaps with dark outlines and dark labels
+    on a mid-gray case, with slight per-key shading and speckle noise.
+
+    Args:
+        layout (str): "qwerty" or "grid" (see synthetic_rows).
+        key_size (int): Pixel size of a 1-unit key; the image resolution follows from it.
+        seed (int): RNG seed; the same arguments always give the same image.
+        noise (float): Fraction of pixels replaced with random values.
+
+    Returns:
+        tuple: (image, ground_truth) where image is a BGR uint8 array and ground_truth is a list
+            of key dictionaries in the MANUAL_LAYOUT schema (positions in image pixels).
+    """
+    rng = np.random.default_rng(seed)
+    key_rows = synthetic_rows(layout, rows, columns)
+    gap = max(key_size // 8, 4)
+    margin = key_size // 2
+    row_widths = [sum(int(round(units * key_size)) + gap for _, units in row) - gap for row in key_rows]
+    width = max(row_widths) + 2 * margin
+    height = len(key_rows) * (key_size + gap) - gap + 2 * margin
+
+    image = np.full((height, width, 3), 150, dtype=np.uint8)
+    font_scale = key_size / 90
+    thickness = max(key_size // 32, 1)
+    ground_truth = []
+    y = margin
+    for row_index, row in enumerate(key_rows):
+        x = margin
+        for column_index, (label, units) in enumerate(row):
+            w = int(round(units * key_size))
+            shade = int(rng.integers(215, 245))
+            cv2.rectangle(image, (x, y), (x + w - 1, y + key_size - 1), (shade, shade, shade), -1)
+            cv2.rectangle(image, (x, y), (x + w - 1, y + key_size - 1), (40, 40, 40), thickness)
+            (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+            cv2.putText(image, label, (x + (w - text_w) // 2, y + (key_size + text_h) // 2),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, (20, 20, 20), thickness, cv2.LINE_AA)
+            ground_truth.append({
+                "key_id": f"synthetic_{row_index}_{column_index}",
+                "label": label,
+                "position": {"x": x, "y": y, "width": w, "height": key_size},
+                "type": "synthetic",
+                "font_color": "#141414",
+                "background_color": "#{0:02X}{0:02X}{0:02X}".format(shade),
+                "group": f"row_{row_index}",
+                "characters": [label.lower()],
+            })
+            x += w + gap
+        y += key_size + gap
+
+    if noise:
+        speckle = rng.random((height, width)) < noise
+        image[speckle] = rng.integers(0, 255, (int(speckle.sum()), 3), dtype=np.uint8)
+    return image, ground_truth
+
+
+def box_iou_matrix(boxes_a, boxes_b):
+    # Pairwise IoU of two (N, 4) / (M, 4) arrays of (x, y, w, h)
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    ix = np.minimum(a[:, None, 0] + a[:, None, 2], b[None, :, 0] + b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    iy = np.minimum(a[:, None, 1] + a[:, None, 3], b[None, :, 1] + b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    intersection = np.clip(ix, 0, None) * np.clip(iy, 0, None)
+    union = (a[:, None, 2] * a[:, None, 3]) + (b[None, :, 2] * b[None, :, 3]) - intersection
+    return np.where(union > 0, intersection / np.where(union > 0, union, 1), 0.0)
+
+
+def match_boxes(detected, ground_truth, iou_threshold=0.5):
+    """
+    Greedily matches detected (x, y, w, h) boxes to ground-truth key dicts by IoU.
+
+    Returns:
+        dict: precision, recall, f1, true/false positive and false negative counts, mean IoU of
+            matches, and "matches" as (detected index, ground-truth index) pairs.
+    """
+    truth_boxes = [[k["position"]["x"], k["position"]["y"], k["position"]["width"], k["position"]["height"]]
+                   for k in ground_truth]
+    matches, ious = [], []
+    if len(detected) and truth_boxes:
+        iou = box_iou_matrix(detected, truth_boxes)
+        pairs = np.argwhere(iou >= iou_threshold)
+        order = np.argsort(-iou[pairs[:, 0], pairs[:, 1]], kind="stable")
+        used_detected, used_truth = set(), set()
+        for d, t in pairs[order].tolist():
+            if d not in used_detected and t not in used_truth:
+                used_detected.add(d)
+                used_truth.add(t)
+                matches.append((d, t))
+                ious.append(float(iou[d, t]))
+    tp = len(matches)
+    precision = tp / len(detected) if len(detected) else 0.0
+    recall = tp / len(truth_boxes) if truth_boxes else 0.0
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "true_positives": tp,
+        "false_positives": len(detected) - tp,
+        "false_negatives": len(truth_boxes) - tp,
+        "mean_iou": float(np.mean(ious)) if ious else None,
+        "matches": matches,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic keyboard image and its ground-truth layout.")
+    parser.add_argument("image", help="Output image path (e.g. synthetic.png).")
+    parser.add_argument("layout_json", help="Output ground-truth layout JSON path.")
+    parser.add_argument("--layout", default="qwerty", choices=("qwerty", "grid"))
+    parser.add_argument("--rows", type=int, default=None)
+    parser.add_argument("--columns", type=int, default=20, help="Keys per row for --layout grid.")
+    parser.add_argument("--key-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    image, ground_truth = make_synthetic_keyboard(args.layout, args.rows or (5 if args.layout == "qwerty" else 10),
+                                                  args.columns, args.key_size, args.seed)
+    cv2.imwrite(args.image, image)
+    with open(args.layout_json, "w") as f:
+        json.dump(ground_truth, f, indent=4)
+    print(f"Wrote {args.image} ({image.shape[1]}x{image.shape[0]}, {len(ground_truth)} keys) and {args.layout_json}")
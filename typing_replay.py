@@ -0,0 +1,232 @@
+import json
+import random
+import time
+
+import numpy as np
+
+from key_layout import KeyLayout
+
+PRESS = "press"
+RELEASE = "release"
+
+MODIFIER_LEAD = 0.015 # Seconds a modifier goes down before (and up after) the key it modifies
+
+
+def tokenize_text(text):
+    """
+    Splits text into typed characters; "{name}" types a named key (e.g. "{escape}", "{f1}") and
+    "{{" is a literal brace.
+    """
+    i = 0
+    while i < len(text):
+        if text[i] == "{":
+            if text.startswith("{{", i):
+                yield "{"
+                i += 2
+                continue
+            end = text.find("}", i + 1)
+            if end > i + 1:
+                yield text[i + 1:end]
+                i = end + 1
+                continue
+        yield text[i]
+        i += 1
+
+
+def text_to_events(text, key_layout, wpm=60.0, hold=0.08, jitter=0.25, seed=0):
+    """
+    Turns text into a timed press/release schedule.
+
+    Args:
+        text (str): Text to type (see tokenize_text for named keys).
+        key_layout (KeyLayout): Layout whose "characters" lists decide which key types what.
+            Shifted characters ("Q", "~") also press the layout's shift key around the keystroke.
+        wpm (float): Typing speed in words per minute (5 characters per word).
+        hold (float): Seconds each key stays down.
+        jitter (float): Relative standard deviation of the gaps between keystrokes, for a
+            realistic uneven rhythm (0 for a metronome).
+        seed (int): Seed for the jitter, so a schedule is reproducible.
+
+    Returns:
+        tuple: (events, unmapped) where events is a time-sorted list of (time, action, key_id)
+            tuples and unmapped lists the characters no key produces (they are skipped).
+    """
+    character_index = key_layout.character_index()
+    rng = random.Random(seed)
+    interval = 60.0 / (wpm * 5)
+    events, unmapped, now = [], [], 0.0
+    release_at = {} # key_id -> index of its pending release in events
+
+    def press(key_id, down, up):
+        previous = release_at.get(key_id)
+        if previous is not None and events[previous][0] > down:
+            events[previous] = (down, RELEASE, key_id) # Repeated key typed faster than the hold: release first
+        events.append((down, PRESS, key_id))
+        release_at[key_id] = len(events)
+        events.append((up, RELEASE, key_id))
+
+    for character in tokenize_text(text):
+        entry = character_index.resolve(character)
+        if entry is None:
+            unmapped.append(character)
+            continue
+        key_index, modifiers = entry
+        modifier_ids = character_index.modifier_key_ids(modifiers)
+        lead = MODIFIER_LEAD if modifier_ids else 0.0
+        for modifier_id in modifier_ids:
+            press(modifier_id, now, now + lead + hold + lead)
+        press(key_layout.key_ids[key_index], now + lead, now + lead + hold)
+        now += max(interval * (1 + rng.gauss(0, jitter)), interval * 0.2) if jitter else interval
+    events.sort(key=lambda event: (event[0], event[1] == PRESS)) # Releases before presses at the same instant
+    return events, unmapped
+
+
+def save_keystroke_log(events, path):
+    # One {"time", "action", "key_id"} object per line (NDJSON), like the --format ndjson layouts
+    with open(path, "w") as f:
+        for event_time, action, key_id in events:
+            f.write(json.dumps({"time": event_time, "action": action, "key_id": key_id}) + "\n")
+
+
+def load_keystroke_log(path, key_layout=None):
+    """
+    Loads a recorded keystroke log (NDJSON, or a JSON array of the same objects). Entries may name
+    the key by "key_id" or by the typed "char" (resolved through key_layout's characters).
+
+    Returns:
+        list: Time-sorted (time, action, key_id) tuples; entries whose key can't be resolved are dropped.
+    """
+    with open(path) as f:
+        content = f.read()
+    stripped = content.lstrip()
+    if stripped.startswith("["):
+        entries = json.loads(stripped)
+    else:
+        entries = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    character_index = key_layout.character_index() if key_layout is not None else None
+    events = []
+    for entry in entries:
+        key_id = entry.get("key_id")
+        if key_id is None and "char" in entry and character_index is not None:
+            resolved = character_index.resolve(entry["char"])
+            key_id = key_layout.key_ids[resolved[0]] if resolved else None
+        if key_id is None or entry.get("action") not in (PRESS, RELEASE):
+            continue
+        events.append((float(entry["time"]), entry["action"], key_id))
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+class HeadlessKeyboard:
+    def __init__(self, key_layout):
+        """
+        Press/release sink without a display: tracks the pressed keys and their rects the way
+        MainWindow does, so the replay engine can be exercised and benchmarked without Qt.
+        """
+        self.key_layout = key_layout
+        self.pressed = {} # key_id -> list of (x, y, w, h) rects
+        self.press_count = 0
+
+    def press_key(self, key_id):
+        if key_id not in self.pressed:
+            self.pressed[key_id] = [self.key_layout.rect(i) for i in self.key_layout.indices_of(key_id)]
+        self.press_count += 1
+
+    def release_key(self, key_id):
+        self.pressed.pop(key_id, None)
+
+
+class ReplayEngine:
+    def __init__(self, events, press, release, speed=1.0):
+        """
+        Replays (time, action, key_id) events through press/release callables.
+
+        speed scales the timeline (2.0 plays twice as fast); 0 dispatches every event as soon as
+        possible, which measures the sink's throughput ceiling. The engine never sleeps by itself
+        in dispatch_due(), so it can be driven either by run() (blocking, headless) or by a GUI
+        timer calling dispatch_due() and re-arming for the returned delay.
+
+        Latency of an event is measured from when it was due until its callable returned, so it
+        includes scheduling lag as well as handling time. With speed 0 nothing is "due", so the
+        latency is just the handling time of each event.
+        """
+        self.events = events
+        self.press = press
+        self.release = release
+        self.speed = speed
+        self.position = 0
+        self.latencies = []
+        self.start_time = None
+        self.end_time = None
+
+    def start(self, now=None):
+        self.position = 0
+        self.latencies = []
+        self.start_time = time.perf_counter() if now is None else now
+        self.end_time = None
+
+    def due_time(self, event):
+        return self.start_time + (event[0] / self.speed if self.speed else 0.0)
+
+    @property
+    def finished(self):
+        return self.position >= len(self.events)
+
+    def dispatch_due(self, now=None):
+        """
+        Dispatches every event that is due.
+
+        Returns:
+            float: Seconds until the next event is due, or None when the replay is finished.
+        """
+        now = time.perf_counter() if now is None else now
+        while self.position < len(self.events):
+            event = self.events[self.position]
+            due = self.due_time(event)
+            if due > now:
+                return due - now
+            (self.press if event[1] == PRESS else self.release)(event[2])
+            handled = time.perf_counter()
+            self.latencies.append(handled - (due if self.speed else now))
+            now = handled
+            self.position += 1
+        self.end_time = now
+        return None
+
+    def run(self):
+        self.start()
+        while True:
+            wait = self.dispatch_due()
+            if wait is None:
+                return self.summary()
+            time.sleep(wait)
+
+    def summary(self):
+        return latency_summary(self.latencies, (self.end_time or time.perf_counter()) - self.start_time)
+
+
+def latency_summary(latencies, elapsed):
+    """
+    Returns:
+        dict: Event count, sustained events/s and latency percentiles in milliseconds.
+    """
+    summary = {"events": len(latencies), "seconds": elapsed,
+               "events_per_second": len(latencies) / elapsed if elapsed > 0 else None}
+    if latencies:
+        values = np.asarray(latencies) * 1000
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        summary.update(p50_ms=float(p50), p90_ms=float(p90), p99_ms=float(p99), max_ms=float(values.max()))
+    return summary
+
+
+def replay_text_headless(text, layout, speed=0, **timing):
+    """
+    Convenience wrapper: types text on a HeadlessKeyboard and returns the latency summary.
+    """
+    key_layout = layout if isinstance(layout, KeyLayout) else KeyLayout.from_dicts(layout)
+    events, unmapped = text_to_events(text, key_layout, **timing)
+    keyboard = HeadlessKeyboard(key_layout)
+    summary = ReplayEngine(events, keyboard.press_key, keyboard.release_key, speed).run()
+    summary["unmapped"] = len(unmapped)
+    return summary